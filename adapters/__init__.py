@@ -17,5 +17,6 @@ from . import (
     pytorch_vit,
     pytorch_yolo,
     tensorflow_generic,
+    onnx_generic,
     classic
 )
@@ -2,10 +2,13 @@
 from __future__ import annotations
 
 import json
+import logging
 import os
 from abc import ABC, abstractmethod
 from typing import Any, Dict, Iterable, List, Optional
 
+logger = logging.getLogger(__name__)
+
 _STRATEGIES = {}
 
 _STRATEGY_MAP = {
@@ -15,6 +18,12 @@ _STRATEGY_MAP = {
     'select_sparsity': ('strategies.prune.structured', 'select_sparsity'),
 }
 
+# 中间产物保存策略：final_only 只保存最后一步，every_op 每步都保存，none 不保存（由导出步骤输出模型）
+CHECKPOINT_POLICIES = ("final_only", "every_op", "none")
+
+# 非结构化剪枝后的稀疏产物编码（none 表示只保存稠密 .pt）
+SPARSE_EXPORT_FORMATS = ("bitmask", "csr", "nm", "none")
+
 _FAMILY_KEYWORDS = {
     'yolo': ['yolo'],
     'resnet': ['resnet'],
@@ -30,6 +39,15 @@ _FAMILY_KEYWORDS = {
     'cnn': ['conv','cnn'],
 }
 
+# 检查点嗅探时只认可这些有辨识度的state_dict键签名（每组子串需同时出现），
+# 'conv'/'layer' 等通用子串命中不作结论，交给完整加载检测
+_KEY_SIGNATURES = {
+    'vit': [('class_token', 'encoder.layers.encoder_layer_'), ('cls_token', 'blocks.0.attn.qkv')],
+    'transformer': [('transformer_encoder.layers.', 'input_projection.')],
+    'resnet': [('layer1.0.conv1.', 'layer4.', 'fc.weight')],
+    'van': [('spatial_gating_unit.conv_spatial',)],
+}
+
 
 def _get_strategy(name: str):
     """延迟加载策略模块"""
@@ -66,6 +84,9 @@ def _try_import_strategy(module_path: str, func_name: str):
 class ModelAdapter(ABC):
     """模型适配器基类"""
 
+    # load() 直接使用完整模型对象时为True：识别阶段已加载的nn.Module可由 adopt() 直接接管
+    ADOPTS_FULL_MODULE = False
+
     def __init__(self, model_dir: str, artifacts_dir: str, family: Optional[str] = None, model_file: Optional[str] = None) -> None:
         self.model_dir = model_dir
         self.artifacts_dir = artifacts_dir
@@ -74,11 +95,26 @@ class ModelAdapter(ABC):
         self._operations: List[str] = []
         self.family = family
         self.model_file = model_file
+        self.checkpoint_policy = "final_only"
+        self.legacy_serialization = False
+        self._final_operation = True
+        self.sparse_export: Optional[Dict[str, str]] = None
+        self.auto_fuse = True
 
     @abstractmethod
     def load(self) -> None:
         """加载模型到内存"""
 
+    def adopt(self, model: Any) -> bool:
+        """接管其他adapter（识别阶段）已加载的模型，成功返回True
+
+        只有 ADOPTS_FULL_MODULE 为True（load() 对完整模型对象不做额外处理）的adapter接管，其余由 load() 正常加载
+        """
+        if not self.ADOPTS_FULL_MODULE or not hasattr(model, "forward"):
+            return False
+        self.model = model
+        return True
+
     def apply_quant(self, cfg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """量化模型"""
         if self.model is None:
@@ -92,7 +128,12 @@ class ModelAdapter(ABC):
             return {"status": "fallback"}
 
         try:
-            qc = {k: self._get_cfg(cfg, k) for k in ("precision", "bits", "auto", "calib_dir", "calib_num")}
+            qc = {k: self._get_cfg(cfg, k) for k in ("precision", "bits", "auto", "calib_dir", "calib_num", "target_backend",
+                                                  "max_error", "max_fp32_ratio", "group_size", "smooth_alpha",
+                                                  "train_data_dir", "val_data_dir", "epochs", "batch_size", "lr",
+                                                  "num_workers", "freeze_observer_epoch", "freeze_bn_epoch",
+                                                  "early_stop_patience", "max_steps", "val_max_batches")}
+            qc["artifacts_dir"] = self.artifacts_dir
             new_model, info = qa_func(self.model, qc, self.family)
             self.model = new_model
             if qc.get("auto", False):
@@ -158,6 +199,39 @@ class ModelAdapter(ABC):
             pass
         return None
 
+    def _detect_from_checkpoint(self) -> Optional[str]:
+        """只解析.pt/.pth的pickle流识别family，不加载张量
+
+        完整模型只按顶层模型类的类名（不含模块路径）匹配，未命中返回None；
+        纯state_dict只接受 _KEY_SIGNATURES 中的键签名，其余返回None（回退到完整加载）
+        """
+        weight = self._find_weight(extensions=(".pt", ".pth"))
+        if not weight:
+            return None
+        from utils.checkpoint import sniff_checkpoint, model_class_names
+        sniffed = sniff_checkpoint(weight)
+        if not sniffed:
+            return None
+
+        classes = model_class_names(sniffed["globals"])
+        if classes:
+            # 其余类（子模块、辅助类）和模块路径不参与匹配，避免 vanilla_cnn.Net 被识别为van、内含LSTM层被识别为lstm
+            class_name = classes[0].rsplit(".", 1)[-1].lower()
+            for family, keywords in _FAMILY_KEYWORDS.items():
+                if any(kw in class_name for kw in keywords):
+                    if family == 'lstm' and 'rnn' in class_name:
+                        continue
+                    if family == 'rnn' and 'lstm' in class_name:
+                        continue
+                    return family
+            return None
+
+        keys = " ".join(k for k in sniffed["strings"] if not k.startswith(("torch", "_")))
+        for family, signatures in _KEY_SIGNATURES.items():
+            if any(all(part in keys for part in signature) for signature in signatures):
+                return family
+        return None
+
     def _detect_from_keys(self, keys_str: str) -> Optional[str]:
         """从state_dict键名识别family"""
         keys_lower = keys_str.lower()
@@ -206,20 +280,36 @@ class ModelAdapter(ABC):
                 prune_cfg = dict(cfg)
                 prune_cfg["target_sparsity"] = amount
                 res = prune_func(self.model, prune_cfg, self.family)
+                if res and res.get("status") == "skipped":
+                    # 模型未被修改（如N:M模式无可处理的层），不保存
+                    return res
                 if res:
-                    operation_name = "pruned_auto" if is_auto_mode else f"pruned_{int(amount*100)}pct"
+                    self._configure_sparse_export(cfg, res.get("chosen_strategy"))
+                    # 按延时/大小搜索时以实际选中的稀疏度命名
+                    chosen = float(res.get("target_sparsity") or amount)
+                    operation_name = "pruned_auto" if is_auto_mode else f"pruned_{int(chosen*100)}pct"
                     save_info = self._save_model(operation_name)
                     if save_info:
                         res.update(save_info)
+                    # 逐层方案、搜索记录等完整剪枝信息写入 prune_report.json
+                    report_func = _try_import_strategy('strategies.common', 'write_report')
+                    if report_func:
+                        report_func(self.artifacts_dir, res, "prune_report.json")
                     return res
-            except Exception:
-                pass
+            except Exception as e:
+                # 剪枝可能已部分修改模型，不再回退到其它剪枝方式，直接报告真实原因
+                logger.error(f"Pruning failed: {e}", exc_info=True)
+                return {"target_sparsity": amount, "status": "failed", "reason": str(e)}
 
         ptype = str(self._get_cfg(cfg, "type", "structured")).lower()
+        if ptype == "nm_sparse":
+            return {"status": "skipped", "reason": "no Linear/Conv2d layer fits the N:M pattern"}
         fallback_func = _get_strategy('apply_unstructured' if ptype in ["unstructured", "global_unstructured"] else 'apply_structured')
         if fallback_func:
             try:
                 res = fallback_func(self.model, target_sparsity=amount)
+                if res:
+                    self._configure_sparse_export(cfg, ptype)
                 operation_name = "pruned_auto" if is_auto_mode else f"pruned_{int(amount*100)}pct"
                 save_info = self._save_model(operation_name)
                 if save_info:
@@ -231,6 +321,82 @@ class ModelAdapter(ABC):
 
         return {"target_sparsity": amount, "status": "fallback"}
 
+    def _configure_sparse_export(self, cfg: Dict[str, Any], ptype: Optional[str]) -> None:
+        """非结构化/N:M剪枝后，保存模型时额外写出稀疏产物（sparse_format/sparse_values）"""
+        ptype = str(ptype or "").lower()
+        if ptype not in ("unstructured", "global_unstructured", "nm_sparse"):
+            return
+        nm = None
+        if ptype == "nm_sparse":
+            from strategies.prune.nm_sparse import parse_nm
+            nm = parse_nm(self._get_cfg(cfg, "pattern"), self._get_cfg(cfg, "n"), self._get_cfg(cfg, "m"))
+        layout = str(self._get_cfg(cfg, "sparse_format", "nm" if nm else "bitmask")).lower()
+        if layout not in SPARSE_EXPORT_FORMATS or (layout == "nm" and not nm):
+            logger.warning(f"Invalid sparse_format: {layout}, using bitmask")
+            layout = "bitmask"
+        values = str(self._get_cfg(cfg, "sparse_values", "fp32")).lower()
+        if values not in ("fp32", "int8"):
+            logger.warning(f"Invalid sparse_values: {values}, using fp32")
+            values = "fp32"
+        self.sparse_export = None if layout == "none" else {"layout": layout, "values": values}
+        if self.sparse_export and nm:
+            self.sparse_export["nm"] = nm
+
+    def _save_sparse(self, model_path: str) -> Optional[Dict[str, Any]]:
+        """在 .pt 旁写出稀疏产物（<name>.sparse.safetensors），模型无法编码时跳过"""
+        try:
+            from utils.sparse_format import DEFAULT_NM, save_sparse_model, SPARSE_SUFFIX
+            sparse_path = model_path[:-len(".pt")] + SPARSE_SUFFIX
+            info = save_sparse_model(self.model, sparse_path, layout=self.sparse_export["layout"],
+                                     values=self.sparse_export["values"],
+                                     nm=self.sparse_export.get("nm") or DEFAULT_NM)
+            info["sparse_size_mb"] = round(os.path.getsize(sparse_path) / (1024 * 1024), 2)
+            return info
+        except Exception as e:
+            logger.warning(f"Sparse export skipped: {e}")
+            return None
+
+    def apply_fuse(self, cfg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Conv-BN融合（BN折叠进卷积权重）"""
+        if self.model is None:
+            return {"status": "skipped", "reason": "model not loaded"}
+        fuse_func = _try_import_strategy('strategies.fuse', 'fuse_conv_bn')
+        if not fuse_func:
+            return {"status": "skipped", "reason": "fusion not available"}
+        self.model, info = fuse_func(self.model)
+        if not info:
+            return {"status": "skipped", "reason": "no Conv2d+BatchNorm2d pairs to fuse"}
+        save_info = self._save_model("fused")
+        if save_info:
+            info.update(save_info)
+        return info
+
+    def _fuse_before_export(self) -> None:
+        """TorchScript/ONNX导出前自动融合CNN类模型的Conv-BN（auto_fuse=False时跳过）"""
+        if not self.auto_fuse or getattr(self.model, "_conv_bn_fused", False):
+            return
+        fuse_func = _try_import_strategy('strategies.fuse', 'fuse_conv_bn')
+        families = _try_import_strategy('strategies.fuse', 'FUSE_FAMILIES') or ()
+        if fuse_func and str(self.family or "").lower() in families:
+            try:
+                self.model, info = fuse_func(self.model)
+                if info:
+                    logger.info(f"Fused Conv-BN before export: {info}")
+            except Exception as e:
+                logger.warning(f"Conv-BN fusion before export skipped: {e}")
+
+    def _save_weight_only(self, model_path: str) -> Optional[Dict[str, Any]]:
+        """在 .pt 旁写出仅权重量化产物（<name>.woq.safetensors）"""
+        try:
+            from strategies.quant.weight_only import save_weight_only_model, WOQ_SUFFIX
+            woq_path = model_path[:-len(".pt")] + WOQ_SUFFIX
+            info = save_weight_only_model(self.model, woq_path)
+            info["woq_size_mb"] = round(os.path.getsize(woq_path) / (1024 * 1024), 2)
+            return info
+        except Exception as e:
+            logger.warning(f"Weight-only export skipped: {e}")
+            return None
+
     def apply_distill(self, cfg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """蒸馏模型"""
         if self.model is None:
@@ -284,7 +450,7 @@ class ModelAdapter(ABC):
 
         size_after = 0.0
         if artifacts:
-            pytorch_files = [p for p in artifacts if p.endswith((".pt", ".pth")) and os.path.exists(p)]
+            pytorch_files = [p for p in artifacts if p.endswith((".pt", ".pth", ".safetensors")) and os.path.exists(p)]
             if pytorch_files:
                 optimized_files = [p for p in pytorch_files if any(kw in os.path.basename(p).lower() for kw in ["quantized", "pruned", "distilled"])]
                 target_files = optimized_files if optimized_files else pytorch_files
@@ -292,7 +458,9 @@ class ModelAdapter(ABC):
                 # 取最新生成的文件
                 if target_files:
                     try:
-                        latest_file = max(target_files, key=lambda x: os.path.getmtime(x) if os.path.exists(x) else 0)
+                        # 同一步骤写出的稀疏产物（.sparse.safetensors）优先于稠密 .pt
+                        latest_file = max(target_files, key=lambda x: (os.path.getmtime(x) if os.path.exists(x) else 0,
+                                                                       x.endswith(".safetensors")))
                         size_after = os.path.getsize(latest_file) / (1024 * 1024)
                     except Exception:
                         # Fallback：如果获取修改时间失败，仍然取最大的
@@ -369,25 +537,55 @@ class ModelAdapter(ABC):
         return False
 
     def _save_model(self, operation: str) -> Optional[Dict[str, Any]]:
-        """保存PyTorch模型 - 压缩后保存完整模型"""
+        """保存PyTorch模型 - 压缩后保存完整模型
+
+        按 checkpoint_policy 决定是否落盘：final_only 时只有最后一步（_final_operation）保存，
+        文件名包含之前所有步骤；默认使用zip序列化（legacy_serialization=True 时使用旧格式）
+        """
         if self.model is None:
             return None
 
+        self._operations.append(operation)
+        policy = self.checkpoint_policy if self.checkpoint_policy in CHECKPOINT_POLICIES else "final_only"
+        if policy == "none" or (policy == "final_only" and not self._final_operation):
+            return {"operations": list(self._operations), "checkpoint": "skipped"}
+
         try:
             import torch
-            self._operations.append(operation)
             filename = f"model_{operation}.pt" if len(self._operations) == 1 else f"model_{'_'.join(self._operations)}.pt"
             model_path = os.path.join(self.artifacts_dir, filename)
-            torch.save(self.model, model_path, _use_new_zipfile_serialization=False)
-            return {
+            to_save = self.model
+            if getattr(self.model, "_fp16_storage", False):
+                # FP16存储/FP32计算：只有落盘的副本是FP16，内存中的模型（后续导出、评估）保持FP32
+                from strategies.quant.ptq import fp16_storage_copy
+                to_save = fp16_storage_copy(self.model)
+            torch.save(to_save, model_path, _use_new_zipfile_serialization=not self.legacy_serialization)
+            info = {
                 "pytorch_path": model_path,
                 "outputs": [model_path],
                 "pytorch_size_mb": round(os.path.getsize(model_path) / (1024 * 1024), 2),
                 "operations": list(self._operations)
             }
+            sparse_info = self._save_sparse(model_path) if self.sparse_export else None
+            if sparse_info:
+                info.update(sparse_info)
+                info["outputs"].append(sparse_info["sparse_path"])
+            woq_info = self._save_weight_only(model_path) if getattr(self.model, "_weight_only", None) else None
+            if woq_info:
+                info.update(woq_info)
+                info["outputs"].append(woq_info["woq_path"])
+            return info
         except Exception:
             return None
 
+    def flush_checkpoint(self) -> Optional[Dict[str, Any]]:
+        """final_only 下之前的步骤均未落盘、最后一步又回退时，保存当前模型（文件名沿用已执行的步骤）"""
+        if self.model is None or not self._operations:
+            return None
+        operation = self._operations.pop()
+        self._final_operation = True
+        return self._save_model(operation)
+
     def cleanup(self) -> None:
         """释放适配器持有的资源，确保长期运行时不会泄漏内存"""
         try:
@@ -399,38 +597,47 @@ class ModelAdapter(ABC):
     def _load_teacher(self, teacher_dir: str) -> Any:
         """加载教师模型"""
         try:
-            import torch
             weight = self._find_weight_in_dir(teacher_dir)
             if not weight:
                 return None
-            try:
-                model = torch.load(weight, map_location='cpu', weights_only=False)
-            except TypeError:
-                model = torch.load(weight, map_location='cpu')
+            model = self._load_weight_file(weight)
             return model.get('model', model) if isinstance(model, dict) else model
         except Exception:
             return None
 
-    def _load_weight_file(self, weight_path: str) -> Any:
-        """加载权重文件，支持多种格式"""
+    def _load_weight_file(self, weight_path: str, weights_only: bool = False, pickle_module: Any = None) -> Any:
+        """加载权重文件，支持多种格式（所有PyTorch适配器统一入口）
+
+        .pt/.pth 为zip格式时使用 torch.load(mmap=True)，.safetensors 直接mmap，
+        张量页按需读入，多个工作进程加载同一模型时共享page cache；
+        开启 MODEL_CACHE_MAX_MB 时，同一进程内重复加载纯state_dict命中缓存（共享mmap张量）。
+        fp16_storage 模型（FP16存储）加载后转回FP32。
+        .pt/.pth/.safetensors 的加载异常直接抛出，由各适配器决定回退方式
+        """
         ext = weight_path.lower().split('.')[-1]
+        if ext in ['pt', 'pth']:
+            from utils.checkpoint import load_torch_checkpoint
+            from utils.model_cache import get_model_cache
+            obj = get_model_cache().get_or_load(
+                weight_path,
+                lambda: load_torch_checkpoint(weight_path, weights_only=weights_only, pickle_module=pickle_module),
+                weights_only, getattr(pickle_module, "__name__", None)
+            )
+            if getattr(obj, "_fp16_storage", False):
+                from strategies.quant.ptq import restore_fp16_storage
+                obj = restore_fp16_storage(obj)
+            return obj
+        if ext == 'safetensors':
+            from utils.checkpoint import load_safetensors
+            from utils.model_cache import get_model_cache
+            from utils.sparse_format import is_sparse_artifact, load_sparse_state_dict
+            loader = load_sparse_state_dict if is_sparse_artifact(weight_path) else load_safetensors
+            return get_model_cache().get_or_load(weight_path, lambda: loader(weight_path))
         try:
-            if ext in ['pt', 'pth']:
-                import torch
-                try:
-                    return torch.load(weight_path, map_location='cpu', weights_only=False)
-                except TypeError:
-                    return torch.load(weight_path, map_location='cpu')
-            elif ext == 'pkl':
+            if ext == 'pkl':
                 import pickle
                 with open(weight_path, 'rb') as f:
                     return pickle.load(f)
-            elif ext == 'safetensors':
-                try:
-                    from safetensors.torch import load_file
-                    return load_file(weight_path)
-                except ImportError:
-                    return None
             elif ext == 'ckpt':
                 try:
                     from mindspore import load_checkpoint  # type: ignore
@@ -449,6 +656,7 @@ class ModelAdapter(ABC):
             import torch
             if hasattr(self.model, 'eval'):
                 self.model.eval()
+            self._fuse_before_export()
             ops = self._operations if self._operations else []
             if not ops:
                 try:
@@ -458,6 +666,10 @@ class ModelAdapter(ABC):
             if ops:
                 base, ext = os.path.splitext(filename)
                 filename = f"{base}_{'_'.join(ops)}{ext}"
+            param = next(self.model.parameters(), None) if hasattr(self.model, "parameters") else None
+            if param is not None and param.dtype in (torch.float16, torch.bfloat16) and \
+                    isinstance(example_input, torch.Tensor) and example_input.is_floating_point():
+                example_input = example_input.to(dtype=param.dtype)
             traced = torch.jit.trace(self.model, example_input)
             traced.save(os.path.join(self.artifacts_dir, filename))
             return os.path.join(self.artifacts_dir, filename)
@@ -474,6 +686,7 @@ class ModelAdapter(ABC):
                 return None
             if hasattr(self.model, 'eval'):
                 self.model.eval()
+            self._fuse_before_export()
             
             # 检测模型数据类型并匹配输入
             model_dtype = None
@@ -495,8 +708,9 @@ class ModelAdapter(ABC):
                 except Exception:
                     ops = []
             
-            # 检查操作历史中是否包含int8量化
-            if not is_int8_quantized and ops:
+            # 检查操作历史中是否包含int8量化（仅权重量化的模型激活为浮点，可以导出）
+            weight_only = bool(getattr(self.model, "_weight_only", None))
+            if not is_int8_quantized and ops and not weight_only:
                 is_int8_quantized = any('int8' in str(op).lower() for op in ops)
             
             if is_int8_quantized:
@@ -524,7 +738,8 @@ class ModelAdapter(ABC):
             torch.onnx.export(
                 self.model, example_input, path,
                 export_params=True, opset_version=opset,
-                do_constant_folding=True,
+                # 仅权重量化：不折叠反量化子图，ONNX中保留INT8/INT4权重
+                do_constant_folding=not weight_only,
                 input_names=input_names, output_names=output_names,
                 dynamic_axes={input_names[0]: {0: 'batch_size'}, output_names[0]: {0: 'batch_size'}}
             )
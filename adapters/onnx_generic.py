@@ -2,7 +2,7 @@
 
 import os
 from typing import Iterable, List, Dict, Any, Optional
-from .base import ModelAdapter
+from .base import ModelAdapter, _try_import_strategy
 from .registry import register
 
 
@@ -62,28 +62,42 @@ class OnnxGenericAdapter(ModelAdapter):
                 except Exception as e:
                     return {"status": "error", "reason": str(e)}
             
-            from onnxruntime.quantization import quantize_dynamic, quantize_static, QuantType
+            from onnxruntime.quantization import quantize_dynamic, QuantType
             
             if prec in ["int8", "int8_static"]:
                 try:
                     model_path = self._find_weight(extensions=(".onnx",))
                     if not model_path:
                         return {"status": "error", "reason": "ONNX model not found"}
-                    
+                    calib_dir = self._get_cfg(cfg, "calib_dir")
+                    if not calib_dir or not os.path.isdir(calib_dir):
+                        # 没有校准数据无法做静态量化，回退到动态量化
+                        res = self.apply_quant(dict(cfg, precision="int8_dynamic"))
+                        if res.get("status") == "success":
+                            res["fallback_reason"] = "int8_static requires calibration_data"
+                        return res
+
+                    quantize_onnx_static = _try_import_strategy("strategies.quant.onnx_static", "quantize_onnx_static")
+                    if not quantize_onnx_static:
+                        return {"status": "error", "reason": "ONNX static quantization not available"}
                     op_name = "quantized_auto" if auto else "quantized_int8"
                     quantized_path = os.path.join(self.artifacts_dir, f"model_{op_name}.onnx")
-                    quantize_static(
+                    info = quantize_onnx_static(
                         model_path,
                         quantized_path,
-                        quant_type=QuantType.QInt8
+                        calib_dir,
+                        calib_num=self._get_cfg(cfg, "calib_num"),
+                        calib_method=self._get_cfg(cfg, "calib_method"),
+                        per_channel=self._get_cfg(cfg, "per_channel"),
                     )
                     self.model = onnx.load(quantized_path)
                     self._operations.append(op_name)
-                    return {
-                        "precision": "int8",
+                    info.update({
+                        "precision": "int8_static",
                         "status": "success",
                         "onnx_path": quantized_path
-                    }
+                    })
+                    return info
                 except ImportError:
                     return {"status": "error", "reason": "onnxruntime not installed"}
                 except Exception as e:
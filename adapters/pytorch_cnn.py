@@ -86,6 +86,8 @@ def _rebuild_custom_cnn(state_dict: dict) -> Optional[nn.Module]:
 class PytorchCNNAdapter(ModelAdapter):
     """CNN适配器 - 自定义CNN/AlexNet/SqueezeNet等"""
 
+    ADOPTS_FULL_MODULE = True
+
     def load(self) -> None:
         weight = self._find_weight()
         if not weight:
@@ -94,9 +96,9 @@ class PytorchCNNAdapter(ModelAdapter):
 
         try:
             try:
-                obj = torch.load(weight, map_location="cpu", weights_only=False)
-            except (TypeError, AttributeError, RuntimeError):
-                obj = torch.load(weight, map_location="cpu", weights_only=True)
+                obj = self._load_weight_file(weight)
+            except (AttributeError, RuntimeError):
+                obj = self._load_weight_file(weight, weights_only=True)
 
             if hasattr(obj, "forward"):
                 self.model = obj
@@ -55,6 +55,8 @@ def _build_gcn_from_state_dict(state_dict: dict) -> Optional[nn.Module]:
 class PytorchGCNAdapter(ModelAdapter):
     """GCN适配器 - 图神经网络模型"""
 
+    ADOPTS_FULL_MODULE = True
+
     def load(self) -> None:
         """加载GCN模型"""
         weight = self._find_weight()
@@ -63,10 +65,7 @@ class PytorchGCNAdapter(ModelAdapter):
             return
 
         try:
-            try:
-                obj = torch.load(weight, map_location="cpu", weights_only=False)
-            except TypeError:
-                obj = torch.load(weight, map_location="cpu")
+            obj = self._load_weight_file(weight)
 
             if hasattr(obj, "forward"):
                 self.model = obj
@@ -3,8 +3,6 @@
 import os
 from typing import Iterable, List
 
-import torch
-
 from .base import ModelAdapter
 from .registry import register
 
@@ -25,17 +23,13 @@ class PytorchGenericAdapter(ModelAdapter):
             # safetensors：通常为纯 state_dict
             if weight.lower().endswith(".safetensors"):
                 try:
-                    from safetensors.torch import load_file
-                    self.model = load_file(weight)
+                    self.model = self._load_weight_file(weight)
                     return
                 except Exception:
                     self.model = None
                     return
 
-            try:
-                obj = torch.load(weight, map_location="cpu", weights_only=False)
-            except TypeError:
-                obj = torch.load(weight, map_location="cpu")
+            obj = self._load_weight_file(weight)
 
             self.model = obj
 
@@ -11,6 +11,8 @@ logger = logging.getLogger(__name__)
 class PyTorchInceptionV4Adapter(ModelAdapter):
     """InceptionV4适配器 - 使用基类通用方法"""
 
+    ADOPTS_FULL_MODULE = True
+
     def load(self) -> None:
         """加载InceptionV4模型"""
         weight = self._find_weight()
@@ -19,13 +21,7 @@ class PyTorchInceptionV4Adapter(ModelAdapter):
             return
 
         try:
-            import torch
-            # 设置 weights_only=False 以支持加载完整模型对象
-            try:
-                obj = torch.load(weight, map_location='cpu', weights_only=False)
-            except TypeError:
-                # 兼容旧版本 PyTorch
-                obj = torch.load(weight, map_location='cpu')
+            obj = self._load_weight_file(weight)
 
             # 直接是模型
             if hasattr(obj, "forward"):
@@ -87,6 +87,8 @@ def _build_lstm_from_state_dict(state_dict: dict):
 class PytorchLSTMAdapter(ModelAdapter):
     """LSTM适配器 - 时间序列预测模型"""
 
+    ADOPTS_FULL_MODULE = True
+
     def load(self) -> None:
         """加载 LSTM 模型（支持保存完整模型或多种 state_dict 包装形式）。"""
         weight = self._find_weight()
@@ -96,10 +98,7 @@ class PytorchLSTMAdapter(ModelAdapter):
             return
 
         try:
-            try:
-                obj = torch.load(weight, map_location="cpu", weights_only=False)
-            except TypeError:
-                obj = torch.load(weight, map_location="cpu")
+            obj = self._load_weight_file(weight)
 
             if hasattr(obj, "forward"):
                 self.model = obj
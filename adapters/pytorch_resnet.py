@@ -12,6 +12,8 @@ logger = logging.getLogger(__name__)
 class PytorchResNetAdapter(ModelAdapter):
     """ResNet适配器 - 使用基类通用方法"""
 
+    ADOPTS_FULL_MODULE = True
+
     def load(self) -> None:
         """加载ResNet模型"""
         weight = self._find_weight()
@@ -20,14 +22,8 @@ class PytorchResNetAdapter(ModelAdapter):
             return
 
         try:
-            import torch
             from collections import OrderedDict
-            # 设置 weights_only=False 以支持加载完整模型对象
-            try:
-                obj = torch.load(weight, map_location="cpu", weights_only=False)
-            except TypeError:
-                # 兼容旧版本 PyTorch（没有 weights_only 参数）
-                obj = torch.load(weight, map_location="cpu")
+            obj = self._load_weight_file(weight)
 
             # 直接是模型
             if hasattr(obj, "forward"):
@@ -72,6 +72,8 @@ def _build_rnn_from_state_dict(state_dict: dict):
 class PytorchRNNAdapter(ModelAdapter):
     """RNN适配器 - 时间序列预测模型"""
 
+    ADOPTS_FULL_MODULE = True
+
     def load(self) -> None:
         """加载 RNN 模型（支持完整模型或多种 state_dict 包装形式）。"""
         weight = self._find_weight()
@@ -80,10 +82,7 @@ class PytorchRNNAdapter(ModelAdapter):
             return
 
         try:
-            try:
-                obj = torch.load(weight, map_location="cpu", weights_only=False)
-            except TypeError:
-                obj = torch.load(weight, map_location="cpu")
+            obj = self._load_weight_file(weight)
 
             if hasattr(obj, "forward"):
                 self.model = obj
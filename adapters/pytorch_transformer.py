@@ -82,19 +82,14 @@ class _TransformerPickleModule:
         return _TransformerPickleModule.Unpickler(io.BytesIO(data), **kwargs).load()
 
 
-def _safe_torch_load(weight: str):
-    """兼容不同版本Torch保存格式，必要时注入自定义pickle"""
-    load_kwargs = {"map_location": "cpu", "weights_only": False}
-    for _ in range(2):
-        try:
-            return torch.load(weight, **load_kwargs)
-        except TypeError:
-            load_kwargs.pop("weights_only", None)
-        except AttributeError as attr_err:
-            if "TransformerModel" in str(attr_err):
-                return torch.load(weight, pickle_module=_TransformerPickleModule, **load_kwargs)
-            raise
-    return torch.load(weight, pickle_module=_TransformerPickleModule, **load_kwargs)
+def _safe_torch_load(adapter: ModelAdapter, weight: str):
+    """通过适配器统一入口加载，__main__中的Transformer类无法解析时注入自定义pickle"""
+    try:
+        return adapter._load_weight_file(weight)
+    except AttributeError as attr_err:
+        if "TransformerModel" in str(attr_err):
+            return adapter._load_weight_file(weight, pickle_module=_TransformerPickleModule)
+        raise
 
 
 def _infer_config_from_state_dict(state_dict: dict) -> dict:
@@ -149,6 +144,8 @@ def _rebuild_transformer(state_dict: dict):
 class PytorchTransformerAdapter(ModelAdapter):
     """Transformer适配器 - 时间序列预测模型"""
 
+    ADOPTS_FULL_MODULE = True
+
     def load(self) -> None:
         """加载Transformer模型（支持完整模型对象或从state_dict重建）"""
         weight = self._find_weight()
@@ -157,7 +154,7 @@ class PytorchTransformerAdapter(ModelAdapter):
             return
 
         try:
-            obj = _safe_torch_load(weight)
+            obj = _safe_torch_load(self, weight)
 
             if hasattr(obj, "forward"):
                 self.model = obj
@@ -246,7 +243,7 @@ class PytorchTransformerAdapter(ModelAdapter):
                         onnx_path,
                         export_params=True,
                         opset_version=14,
-                        do_constant_folding=True,
+                        do_constant_folding=not getattr(self.model, "_weight_only", None),
                         input_names=["input"],
                         output_names=["output"],
                         dynamic_axes={"input": {0: "batch_size"}, "output": {0: "batch_size"}}
@@ -41,6 +41,8 @@ def _build_vae_from_state_dict(state_dict: dict):
 class PytorchVAEAdapter(ModelAdapter):
     """VAE适配器 - 变分自编码器"""
 
+    ADOPTS_FULL_MODULE = True
+
     def load(self) -> None:
         """加载 VAE 模型（完整模型或常见 state_dict 包装）。"""
         weight = self._find_weight()
@@ -49,10 +51,7 @@ class PytorchVAEAdapter(ModelAdapter):
             return
 
         try:
-            try:
-                obj = torch.load(weight, map_location="cpu", weights_only=False)
-            except TypeError:
-                obj = torch.load(weight, map_location="cpu")
+            obj = self._load_weight_file(weight)
 
             if hasattr(obj, "forward"):
                 self.model = obj
@@ -185,6 +185,8 @@ def _build_van_from_state_dict(state_dict: dict) -> VisionAttentionNetwork:
 class PytorchVANAdapter(ModelAdapter):
     """VAN适配器 - Vision Attention Network"""
 
+    ADOPTS_FULL_MODULE = True
+
     def load(self) -> None:
         weight = self._find_weight()
         if not weight:
@@ -193,9 +195,9 @@ class PytorchVANAdapter(ModelAdapter):
 
         try:
             try:
-                obj = torch.load(weight, map_location="cpu", weights_only=False)
-            except (TypeError, AttributeError, RuntimeError):
-                obj = torch.load(weight, map_location="cpu", weights_only=True)
+                obj = self._load_weight_file(weight)
+            except (AttributeError, RuntimeError):
+                obj = self._load_weight_file(weight, weights_only=True)
 
             if hasattr(obj, "forward"):
                 self.model = obj
@@ -11,6 +11,8 @@ logger = logging.getLogger(__name__)
 class PyTorchVGGAdapter(ModelAdapter):
     """VGG适配器 - 使用基类通用方法"""
 
+    ADOPTS_FULL_MODULE = True
+
     def load(self) -> None:
         """加载VGG模型"""
         weight = self._find_weight()
@@ -19,11 +21,7 @@ class PyTorchVGGAdapter(ModelAdapter):
             return
 
         try:
-            import torch
-            try:
-                obj = torch.load(weight, map_location='cpu', weights_only=False)
-            except TypeError:
-                obj = torch.load(weight, map_location='cpu')
+            obj = self._load_weight_file(weight)
 
             # 直接是模型
             if hasattr(obj, "forward"):
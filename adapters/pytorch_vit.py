@@ -12,6 +12,8 @@ logger = logging.getLogger(__name__)
 class PyTorchViTAdapter(ModelAdapter):
     """ViT适配器 - 使用基类通用方法"""
 
+    ADOPTS_FULL_MODULE = True
+
     def load(self) -> None:
         """加载ViT模型"""
         weight = self._find_weight()
@@ -20,8 +22,7 @@ class PyTorchViTAdapter(ModelAdapter):
             return
 
         try:
-            import torch
-            obj = torch.load(weight, map_location='cpu', weights_only=False)
+            obj = self._load_weight_file(weight)
 
             if hasattr(obj, "forward"):
                 self.model = obj
@@ -2,12 +2,14 @@
 import logging
 import os
 import time
+from typing import Dict, Any
 from flask import Blueprint, request, jsonify
 
 from utils.path import PathManager
 from utils.error import create_error_response, create_success_response, APIError, ErrorCode
 from compilers.registry import list_available_compilers, list_supported_hardware
 from core.engine import execute_compile
+from services.jobs import get_job_manager
 
 logger = logging.getLogger(__name__)
 
@@ -19,13 +21,53 @@ _OUTPUT_FORMAT_MAP = {
 }
 
 
+def _run_compile_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """硬件编译任务（在工作进程中执行）"""
+    model_path = payload["model_path"]
+    result_dir = payload["res_dir"]
+    target_lower = payload["target"]
+
+    result = execute_compile({
+        "job_id": payload.get("job_id"),
+        "artifact_path": model_path,
+        "target": target_lower,
+        "options": payload.get("options", {})
+    })
+
+    if "error" in result:
+        return {"result_dir": result_dir, "error": result["error"], "error_code": ErrorCode.COMPRESSION_FAILED}
+
+    input_ext = os.path.splitext(model_path)[1][1:]
+
+    # 计算文件大小
+    size_before = size_after = None
+    try:
+        if os.path.exists(model_path):
+            size_before = round(os.path.getsize(model_path) / (1024 * 1024), 4)
+        outputs = result.get("outputs", [])
+        if outputs and outputs[0].get("path"):
+            out_path = os.path.join(result_dir, target_lower, outputs[0]["path"])
+            if os.path.exists(out_path):
+                size_after = round(os.path.getsize(out_path) / (1024 * 1024), 4)
+    except Exception:
+        pass
+
+    return {
+        "job_id": result.get("job_id", f"compile_{int(time.time())}"),
+        "result_dir": result_dir,
+        "operations": [{"operation": "compile", "from": input_ext, "to": target_lower, "status": "success"}],
+        "outputs": result.get("outputs", []),
+        "metrics": {"size_before_mb": size_before, "size_after_mb": size_after}
+    }
+
+
 @compile_api_bp.post("/compile")
 def compile_model():
     """硬件编译接口
     ---
     tags:
       - 硬件编译
-    summary: 将模型编译为硬件专用格式（TensorRT/Ascend/Cambricon/M9）
+    summary: 提交硬件编译任务（TensorRT/Ascend/Cambricon/M9），立即返回job_id，通过 GET /jobs/<job_id> 查询结果
     parameters:
       - in: body
         name: body
@@ -66,6 +108,12 @@ def compile_model():
                     workspace_size:
                       type: integer
                       description: TensorRT：工作空间大小（MB）
+                calib_dir:
+                  type: string
+                  description: TensorRT INT8：校准图片目录，生成校准表（与 int8_static 共用解码缓存）
+                calib_num:
+                  type: integer
+                  description: TensorRT INT8：最多使用的校准图片数
                 input_shape:
                   type: string
                   description: 输入形状（如 "1,3,224,224"）
@@ -75,7 +123,7 @@ def compile_model():
                   description: Ascend：输入格式
     responses:
       200:
-        description: 硬件编译成功
+        description: 硬件编译任务已提交
         schema:
           type: object
           properties:
@@ -90,20 +138,19 @@ def compile_model():
               properties:
                 job_id:
                   type: string
+                status:
+                  type: string
+                  example: queued
                 result_dir:
                   type: string
-                compiled_files:
-                  type: array
-                  items:
-                    type: string
                 target:
                   type: string
-                input_format:
-                  type: string
                 output_format:
                   type: string
       400:
         description: 请求参数错误
+      503:
+        description: 编译器不可用或任务队列已满
       500:
         description: 服务器内部错误
     """
@@ -170,45 +217,19 @@ def compile_model():
                 f"{target} compiler is not available. Please install the required dependencies."
             )), 503
         
-        # 执行编译
-        compile_data = {
-            "artifact_path": model_path,
+        job = get_job_manager().submit("compile", _run_compile_job, {
+            "model_path": model_path,
+            "res_dir": result_dir,
             "target": target_lower,
             "options": options
-        }
-        
-        result = execute_compile(compile_data)
-        
-        if "error" in result:
-            return jsonify(create_error_response(
-                ErrorCode.COMPRESSION_FAILED,
-                result["error"]
-            )), 500
-        
-        # 构建统一格式响应
-        job_id = result.get("job_id", f"compile_{int(time.time())}")
-        input_ext = os.path.splitext(model_path)[1][1:]
-        output_format = _OUTPUT_FORMAT_MAP.get(target_lower, "unknown")
-        
-        # 计算文件大小
-        size_before = size_after = None
-        try:
-            if os.path.exists(model_path):
-                size_before = round(os.path.getsize(model_path) / (1024 * 1024), 4)
-            outputs = result.get("outputs", [])
-            if outputs and outputs[0].get("path"):
-                out_path = os.path.join(result_dir, target_lower, outputs[0]["path"])
-                if os.path.exists(out_path):
-                    size_after = round(os.path.getsize(out_path) / (1024 * 1024), 4)
-        except Exception:
-            pass
+        })
         
         return jsonify(create_success_response({
-            "job_id": job_id,
+            "job_id": job["job_id"],
+            "status": job["status"],
             "result_dir": result_dir,
-            "operations": [{"operation": "compile", "from": input_ext, "to": target_lower, "status": "success"}],
-            "outputs": result.get("outputs", []),
-            "metrics": {"size_before_mb": size_before, "size_after_mb": size_after}
+            "target": target_lower,
+            "output_format": _OUTPUT_FORMAT_MAP.get(target_lower, "unknown")
         }))
         
     except APIError as e:
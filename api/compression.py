@@ -12,7 +12,9 @@ from utils.path import PathManager
 from utils.error import create_error_response, create_success_response, APIError, ErrorCode
 from compression.capabilities_v2 import get_registry_v2
 from api.method_mapper import MethodMapper
+from adapters.base import CHECKPOINT_POLICIES
 from core.engine import execute_optimize
+from services.jobs import get_job_manager
 
 logger = logging.getLogger(__name__)
 
@@ -64,6 +66,69 @@ def _check_method_availability(operation_requirements: Dict[str, Any], extra_man
     
     return availability
 
+
+def _run_execute_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """压缩任务（在工作进程中执行）：识别模型、校验教师模型后执行优化"""
+    model_dir = payload["model_dir"]
+    result_dir = payload["res_dir"]
+    method = payload.get("method")
+    strategy = payload.get("strategy", {})
+
+    detector = ModelDetector()
+    detection = detector.detect_from_dir(model_dir, keep_adapter=True)
+    framework = detection["framework"]
+    family = detection["family"]
+    preloaded = detection.get("adapter")
+
+    extra_manager = ExtraFilesManager(payload.get("extra_dir"))
+
+    registry = get_registry_v2()
+    operation_requirements = registry.get_all_operation_requirements(framework, family)
+
+    if isinstance(method, str):
+        method_key = _get_method_key(method, operation_requirements)
+        if method_key:
+            method_req = _get_method_requirement(method_key, operation_requirements)
+            if method_req:
+                required = method_req.get("required_extra_files", [])
+                required_check = extra_manager.check_requirements(required)
+                missing_required = [k for k, v in required_check.items() if not v]
+                if missing_required:
+                    logger.warning(f"Method '{method}' requires missing files: {', '.join(missing_required)}")
+
+    strategies = payload.get("strategies")
+    if any(s.get("distill", {}).get("enable", False) for s in (strategies or [strategy])):
+        teacher_dir = extra_manager.get_teacher_model_dir()
+        if teacher_dir:
+            validator = TeacherValidator()
+            validation_result = validator.validate(
+                student_model_dir=model_dir,
+                teacher_model_dir=teacher_dir,
+                student_framework=framework,
+                student_family=family
+            )
+            if not validation_result["valid"]:
+                if preloaded is not None:
+                    preloaded.cleanup()
+                return {
+                    "result_dir": result_dir,
+                    "error": validation_result["reason"],
+                    "error_code": ErrorCode.TEACHER_MODEL_INVALID
+                }
+
+    result = execute_optimize({
+        "job_id": payload.get("job_id"),
+        "framework": framework,
+        "family": family,
+        "model_dir": model_dir,
+        "res_dir": result_dir,
+        "strategy": strategy,
+        "strategies": strategies,
+        "adapter": preloaded
+    })
+    result["result_dir"] = result_dir
+    return result
+
 compression_api_bp = Blueprint('compression_api', __name__)
 
 
@@ -182,7 +247,7 @@ def execute_compression():
     ---
     tags:
       - 模型压缩
-    summary: 执行模型压缩操作（量化/剪枝/蒸馏）
+    summary: 提交模型压缩任务（量化/剪枝/蒸馏），立即返回job_id，通过 GET /jobs/<job_id> 查询结果
     parameters:
       - in: body
         name: body
@@ -207,9 +272,26 @@ def execute_compression():
               type: string
               description: 压缩方法（如 "fp16", "int8_dynamic", "structured_pruning"）或字典格式的组合配置
               example: fp16
+            checkpoint_policy:
+              type: string
+              enum: [final_only, every_op, none]
+              description: 可选，中间产物保存策略（默认final_only，只保存最后一步的模型）
+            variants:
+              type: array
+              description: 可选，多个变体（代替method），模型只加载一次，每个变体输出到result_dir下的子目录
+              items:
+                type: object
+                properties:
+                  name:
+                    type: string
+                  method:
+                    type: string
+                  method_params:
+                    type: object
+              example: [{"method": "quantize_fp16"}, {"method": "prune_structured", "method_params": {"prune_structured": {"target_sparsity": 0.5}}}]
     responses:
       200:
-        description: 压缩操作成功完成
+        description: 压缩任务已提交
         schema:
           type: object
           properties:
@@ -224,24 +306,16 @@ def execute_compression():
               properties:
                 job_id:
                   type: string
-                  example: j_abc123
+                  example: j_optimize_abc123
+                status:
+                  type: string
+                  example: queued
                 result_dir:
                   type: string
-                artifacts:
-                  type: array
-                  items:
-                    type: string
-                metrics:
-                  type: object
-                  properties:
-                    size_before_mb:
-                      type: number
-                    size_after_mb:
-                      type: number
-                    compression_ratio:
-                      type: number
       400:
         description: 请求参数错误
+      503:
+        description: 任务队列已满
       500:
         description: 服务器内部错误
     """
@@ -251,6 +325,7 @@ def execute_compression():
         result_dir = data.get("result_dir")
         extra_dir = data.get("extra_dir")
         method = data.get("method")
+        variants = data.get("variants")
         
         if not model_dir:
             return jsonify(create_error_response(
@@ -264,12 +339,31 @@ def execute_compression():
                 "result_dir is required"
             )), 400
         
-        if not method:
+        if not method and not variants:
             return jsonify(create_error_response(
                 ErrorCode.BAD_REQUEST,
                 "method is required"
             )), 400
         
+        if variants is not None and not isinstance(variants, list):
+            return jsonify(create_error_response(
+                ErrorCode.BAD_REQUEST,
+                "variants must be a list"
+            )), 400
+        
+        if variants and any(not (v.get("method") if isinstance(v, dict) else v) for v in variants):
+            return jsonify(create_error_response(
+                ErrorCode.BAD_REQUEST,
+                "each variant requires a method"
+            )), 400
+        
+        checkpoint_policy = data.get("checkpoint_policy")
+        if checkpoint_policy is not None and checkpoint_policy not in CHECKPOINT_POLICIES:
+            return jsonify(create_error_response(
+                ErrorCode.BAD_REQUEST,
+                f"checkpoint_policy must be one of {list(CHECKPOINT_POLICIES)}"
+            )), 400
+        
         try:
             model_dir = PathManager.validate_model_dir(model_dir)
             result_dir = PathManager.validate_result_dir(result_dir, create_if_not_exists=True)
@@ -280,81 +374,49 @@ def execute_compression():
                 str(e)
             )), 400
         
-        detector = ModelDetector()
-        detection = detector.detect_from_dir(model_dir)
-        framework = detection["framework"]
-        family = detection["family"]
-        original_format = detection.get("original_format")
-        
         extra_manager = ExtraFilesManager(extra_dir)
-        
-        registry = get_registry_v2()
-        operation_requirements = registry.get_all_operation_requirements(framework, family)
-        warnings = []
-        
-        if isinstance(method, str):
-            method_key = _get_method_key(method, operation_requirements)
-            if method_key:
-                method_req = _get_method_requirement(method_key, operation_requirements)
-                if method_req:
-                    required = method_req.get("required_extra_files", [])
-                    required_check = extra_manager.check_requirements(required)
-                    missing_required = [k for k, v in required_check.items() if not v]
-                    if missing_required:
-                        warnings.append(f"Method '{method}' requires missing files: {', '.join(missing_required)}")
-        
         mapper = MethodMapper()
-        export_formats = data.get("export_formats")
-        method_params = data.get("method_params")
-        strategy = mapper.convert_to_strategy(
-            method=method,
-            extra_manager=extra_manager,
-            method_params=method_params,
-            export_formats=export_formats
-        )
-        
-        if warnings:
-            logger.warning(f"Warnings for method '{method}': {', '.join(warnings)}")
-        
-        if strategy.get("distill", {}).get("enable", False):
-            teacher_dir = extra_manager.get_teacher_model_dir()
-            if teacher_dir:
-                validator = TeacherValidator()
-                validation_result = validator.validate(
-                    student_model_dir=model_dir,
-                    teacher_model_dir=teacher_dir,
-                    student_framework=framework,
-                    student_family=family
+        strategy = {}
+        strategies = None
+        if variants:
+            strategies = []
+            for variant in variants:
+                if not isinstance(variant, dict):
+                    variant = {"method": variant}
+                variant_strategy = mapper.convert_to_strategy(
+                    method=variant["method"],
+                    extra_manager=extra_manager,
+                    method_params=variant.get("method_params"),
+                    export_formats=variant.get("export_formats") or data.get("export_formats")
                 )
-                if not validation_result["valid"]:
-                    return jsonify(create_error_response(
-                        ErrorCode.TEACHER_MODEL_INVALID,
-                        validation_result["reason"],
-                        validation_result
-                    )), 400
+                if variant.get("name"):
+                    variant_strategy["name"] = variant["name"]
+                strategies.append(variant_strategy)
+        else:
+            strategy = mapper.convert_to_strategy(
+                method=method,
+                extra_manager=extra_manager,
+                method_params=data.get("method_params"),
+                export_formats=data.get("export_formats")
+            )
         
-        optimize_data = {
-            "framework": framework,
-            "family": family,
+        if checkpoint_policy:
+            for item in (strategies or [strategy]):
+                item["checkpoint_policy"] = checkpoint_policy
+        
+        job = get_job_manager().submit("optimize", _run_execute_job, {
             "model_dir": model_dir,
             "res_dir": result_dir,
-            "strategy": strategy
-        }
-        
-        result = execute_optimize(optimize_data)
-        
-        if "error" in result:
-            return jsonify(create_error_response(
-                ErrorCode.COMPRESSION_FAILED,
-                result["error"]
-            )), 500
+            "extra_dir": extra_dir,
+            "method": method,
+            "strategy": strategy,
+            "strategies": strategies
+        })
         
         return jsonify(create_success_response({
-            "job_id": result.get("job_id"),
-            "result_dir": result_dir,
-            "operations": result.get("operations", []),
-            "outputs": result.get("outputs", []),
-            "metrics": result.get("metrics", {})
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "result_dir": result_dir
         }))
         
     except APIError as e:
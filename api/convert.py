@@ -9,6 +9,7 @@ from services.model import ModelDetector
 from utils.path import PathManager
 from utils.error import create_error_response, create_success_response, APIError, ErrorCode
 from adapters.registry import get_adapter
+from services.jobs import get_job_manager
 
 logger = logging.getLogger(__name__)
 
@@ -21,13 +22,134 @@ _FORMAT_MAP = {
 }
 
 
+def _run_convert_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """格式转换任务（在工作进程中执行）"""
+    model_dir = payload["model_dir"]
+    result_dir = payload["res_dir"]
+    model_file = payload.get("model_file")
+    target_formats = payload.get("target_formats", [])
+
+    def _error(code: int, message: str) -> Dict[str, Any]:
+        return {"result_dir": result_dir, "error": message, "error_code": code}
+
+    # 检测模型信息
+    detector = ModelDetector()
+    detection = detector.detect_from_dir(model_dir)
+    framework = detection["framework"]
+    family = detection["family"]
+    original_format = detection.get("original_format")
+
+    # generic时尝试从同级raw目录重新检测
+    if model_file and family == "generic":
+        raw_dir = os.path.join(os.path.dirname(model_dir.rstrip("/\\")), "raw")
+        if os.path.isdir(raw_dir):
+            try:
+                raw_det = detector.detect_from_dir(raw_dir)
+                if raw_det.get("family", "generic") != "generic":
+                    framework, family = raw_det.get("framework", framework), raw_det["family"]
+                    original_format = raw_det.get("original_format", original_format)
+            except Exception:
+                pass
+    logger.info(f"[convert-format] framework={framework}, family={family}")
+
+    if not framework or not family:
+        return _error(ErrorCode.MODEL_NOT_FOUND, f"Cannot detect model framework or family from {model_dir}")
+
+    # 获取adapter
+    adapter_class = get_adapter(framework, family)
+    if not adapter_class:
+        return _error(ErrorCode.ADAPTER_NOT_FOUND, f"No adapter found for framework={framework}, family={family}")
+
+    # 创建adapter实例
+    adapter = adapter_class(model_dir, result_dir, model_file=model_file)
+
+    # 加载模型
+    try:
+        adapter.load()
+        if adapter.model is None:
+            return _error(ErrorCode.MODEL_LOAD_FAILED, "Failed to load model")
+    except Exception as e:
+        logger.error(f"Model load failed: {e}", exc_info=True)
+        return _error(ErrorCode.MODEL_LOAD_FAILED, f"Model load failed: {str(e)}")
+
+    # 执行格式转换
+    try:
+        # 检查是否尝试将INT8模型转换为ONNX（不支持）
+        # 1. 检查指定的 model_file
+        check_files = [model_file] if model_file else []
+        # 2. 如果没指定，检查adapter找到的权重文件
+        if not check_files:
+            weight = adapter._find_weight()
+            if weight:
+                check_files.append(os.path.basename(weight))
+
+        for fname in check_files:
+            if fname and "int8" in fname.lower() and "onnx" in [str(f).lower() for f in target_formats]:
+                return _error(
+                    ErrorCode.EXPORT_FAILED,
+                    f"Cannot convert INT8 quantized model '{fname}' to ONNX. "
+                    "Please convert from the original FP32/FP16 model."
+                )
+
+        # 标准化格式名称
+        normalized_formats = list(dict.fromkeys(
+            _FORMAT_MAP.get(str(f).lower(), str(f).lower()) for f in target_formats
+        ))
+
+        # 执行导出
+        try:
+            artifacts = adapter.export(normalized_formats, normalized_formats)
+        except ValueError as e:
+            if "INT8" in str(e):
+                return _error(ErrorCode.EXPORT_FAILED, str(e))
+            raise
+        if not artifacts:
+            return _error(
+                ErrorCode.EXPORT_FAILED,
+                f"Format conversion failed: no files generated for formats {target_formats}"
+            )
+
+        # 计算文件大小
+        size_before = size_after = None
+        try:
+            src_file = adapter._find_weight()
+            if src_file and os.path.exists(src_file):
+                size_before = round(os.path.getsize(src_file) / (1024 * 1024), 4)
+            if artifacts:
+                size_after = round(os.path.getsize(artifacts[0]) / (1024 * 1024), 4)
+        except Exception:
+            pass
+
+        # 生成outputs列表
+        outputs = []
+        for path in artifacts:
+            rel_path = os.path.relpath(path, result_dir).replace("\\", "/")
+            ext = os.path.splitext(path)[1].lower()
+            out_type = "onnx_model" if ext == ".onnx" else "torchscript_model" if "torchscript" in path.lower() else "converted_model"
+            outputs.append({"type": out_type, "path": rel_path})
+
+        return {
+            "job_id": payload.get("job_id") or f"convert_{int(time.time())}",
+            "result_dir": result_dir,
+            "operations": [{"operation": "convert", "from": original_format, "to": normalized_formats, "status": "success"}],
+            "outputs": outputs,
+            "metrics": {"size_before_mb": size_before, "size_after_mb": size_after}
+        }
+
+    except Exception as e:
+        logger.error(f"Format conversion failed: {e}", exc_info=True)
+        return _error(ErrorCode.EXPORT_FAILED, f"Format conversion failed: {str(e)}")
+    finally:
+        adapter.cleanup()
+
+
 @convert_api_bp.post("/convert-format")
 def convert_format():
     """格式转换接口
     ---
     tags:
       - 格式转换
-    summary: 将模型从一种格式转换为另一种格式
+    summary: 提交格式转换任务，立即返回job_id，通过 GET /jobs/<job_id> 查询结果
     parameters:
       - in: body
         name: body
@@ -56,7 +178,7 @@ def convert_format():
               description: 可选，指定要转换的模型文件（相对于model_dir）
     responses:
       200:
-        description: 格式转换成功
+        description: 格式转换任务已提交
         schema:
           type: object
           properties:
@@ -71,16 +193,15 @@ def convert_format():
               properties:
                 job_id:
                   type: string
+                status:
+                  type: string
+                  example: queued
                 result_dir:
                   type: string
-                artifacts:
-                  type: array
-                  items:
-                    type: string
-                converted_formats:
-                  type: object
       400:
         description: 请求参数错误
+      503:
+        description: 任务队列已满
       500:
         description: 服务器内部错误
     """
@@ -120,40 +241,6 @@ def convert_format():
                 str(e)
             )), 400
         
-        # 检测模型信息
-        detector = ModelDetector()
-        detection = detector.detect_from_dir(model_dir)
-        framework = detection["framework"]
-        family = detection["family"]
-        original_format = detection.get("original_format")
-
-        # generic时尝试从同级raw目录重新检测
-        if model_file and family == "generic":
-            raw_dir = os.path.join(os.path.dirname(model_dir.rstrip("/\\")), "raw")
-            if os.path.isdir(raw_dir):
-                try:
-                    raw_det = detector.detect_from_dir(raw_dir)
-                    if raw_det.get("family", "generic") != "generic":
-                        framework, family = raw_det.get("framework", framework), raw_det["family"]
-                        original_format = raw_det.get("original_format", original_format)
-                except Exception:
-                    pass
-        logger.info(f"[convert-format] framework={framework}, family={family}")
-        
-        if not framework or not family:
-            return jsonify(create_error_response(
-                ErrorCode.MODEL_NOT_FOUND,
-                f"Cannot detect model framework or family from {model_dir}"
-            )), 400
-        
-        # 获取adapter
-        adapter_class = get_adapter(framework, family)
-        if not adapter_class:
-            return jsonify(create_error_response(
-                ErrorCode.ADAPTER_NOT_FOUND,
-                f"No adapter found for framework={framework}, family={family}"
-            )), 400
-        
         # 如果指定了model_file，验证文件存在
         if model_file:
             model_file_path = os.path.join(model_dir, model_file)
@@ -163,91 +250,18 @@ def convert_format():
                     f"Model file not found: {model_file_path}"
                 )), 400
         
-        # 创建adapter实例
-        adapter = adapter_class(model_dir, result_dir, model_file=model_file)
-        
-        # 加载模型
-        try:
-            adapter.load()
-            if adapter.model is None:
-                return jsonify(create_error_response(ErrorCode.MODEL_LOAD_FAILED, "Failed to load model")), 400
-        except Exception as e:
-            logger.error(f"Model load failed: {e}", exc_info=True)
-            return jsonify(create_error_response(ErrorCode.MODEL_LOAD_FAILED, f"Model load failed: {str(e)}")), 400
+        job = get_job_manager().submit("convert", _run_convert_job, {
+            "model_dir": model_dir,
+            "res_dir": result_dir,
+            "model_file": model_file,
+            "target_formats": target_formats
+        })
         
-        # 执行格式转换
-        try:
-            # 检查是否尝试将INT8模型转换为ONNX（不支持）
-            # 1. 检查指定的 model_file
-            check_files = [model_file] if model_file else []
-            # 2. 如果没指定，检查adapter找到的权重文件
-            if not check_files:
-                weight = adapter._find_weight()
-                if weight:
-                    check_files.append(os.path.basename(weight))
-            
-            for fname in check_files:
-                if fname and "int8" in fname.lower() and "onnx" in [str(f).lower() for f in target_formats]:
-                    return jsonify(create_error_response(
-                        ErrorCode.EXPORT_FAILED,
-                        f"Cannot convert INT8 quantized model '{fname}' to ONNX. "
-                        "Please convert from the original FP32/FP16 model."
-                    )), 400
-
-            # 标准化格式名称
-            normalized_formats = list(dict.fromkeys(
-                _FORMAT_MAP.get(str(f).lower(), str(f).lower()) for f in target_formats
-            ))
-            
-            # 执行导出
-            try:
-                artifacts = adapter.export(normalized_formats, normalized_formats)
-            except ValueError as e:
-                if "INT8" in str(e):
-                    return jsonify(create_error_response(ErrorCode.EXPORT_FAILED, str(e))), 400
-                raise
-            if not artifacts:
-                return jsonify(create_error_response(
-                    ErrorCode.EXPORT_FAILED,
-                    f"Format conversion failed: no files generated for formats {target_formats}"
-                )), 400
-            
-            # 构建统一格式的响应
-            job_id = f"convert_{int(time.time())}"
-            
-            # 计算文件大小
-            size_before = size_after = None
-            try:
-                src_file = adapter._find_weight()
-                if src_file and os.path.exists(src_file):
-                    size_before = round(os.path.getsize(src_file) / (1024 * 1024), 4)
-                if artifacts:
-                    size_after = round(os.path.getsize(artifacts[0]) / (1024 * 1024), 4)
-            except Exception:
-                pass
-            
-            # 生成outputs列表
-            outputs = []
-            for path in artifacts:
-                rel_path = os.path.relpath(path, result_dir).replace("\\", "/")
-                ext = os.path.splitext(path)[1].lower()
-                out_type = "onnx_model" if ext == ".onnx" else "torchscript_model" if "torchscript" in path.lower() else "converted_model"
-                outputs.append({"type": out_type, "path": rel_path})
-            
-            return jsonify(create_success_response({
-                "job_id": job_id,
-                "result_dir": result_dir,
-                "operations": [{"operation": "convert", "from": original_format, "to": normalized_formats, "status": "success"}],
-                "outputs": outputs,
-                "metrics": {"size_before_mb": size_before, "size_after_mb": size_after}
-            }))
-            
-        except Exception as e:
-            logger.error(f"Format conversion failed: {e}", exc_info=True)
-            return jsonify(create_error_response(
-                ErrorCode.EXPORT_FAILED,
-                f"Format conversion failed: {str(e)}"
-            )), 500
+        return jsonify(create_success_response({
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "result_dir": result_dir
+        }))
         
     except APIError as e:
         return jsonify(e.to_dict()), e.code
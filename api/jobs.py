@@ -0,0 +1,91 @@
+"""任务查询API接口"""
+import logging
+from flask import Blueprint, jsonify
+
+from services.jobs import get_job_manager
+from utils.error import create_error_response, create_success_response, ErrorCode
+
+logger = logging.getLogger(__name__)
+
+jobs_api_bp = Blueprint('jobs_api', __name__)
+
+
+@jobs_api_bp.get("/jobs/<job_id>")
+def get_job(job_id: str):
+    """查询任务状态
+    ---
+    tags:
+      - 任务管理
+    summary: 查询 /execute、/convert-format、/compile 提交的任务状态与结果
+    parameters:
+      - in: path
+        name: job_id
+        type: string
+        required: true
+        description: 提交任务时返回的job_id
+    responses:
+      200:
+        description: 成功返回任务信息
+        schema:
+          type: object
+          properties:
+            code:
+              type: integer
+              example: 200
+            message:
+              type: string
+              example: success
+            data:
+              type: object
+              properties:
+                job_id:
+                  type: string
+                type:
+                  type: string
+                  enum: [optimize, convert, compile]
+                status:
+                  type: string
+                  enum: [queued, running, succeeded, failed]
+                created_at:
+                  type: number
+                started_at:
+                  type: number
+                finished_at:
+                  type: number
+                result_dir:
+                  type: string
+                operations:
+                  type: array
+                  items:
+                    type: object
+                outputs:
+                  type: array
+                  items:
+                    type: object
+                metrics:
+                  type: object
+                error:
+                  type: string
+                error_code:
+                  type: integer
+      404:
+        description: 任务不存在
+      500:
+        description: 服务器内部错误
+    """
+    try:
+        job = get_job_manager().get(job_id)
+        if job is None:
+            return jsonify(create_error_response(
+                ErrorCode.NOT_FOUND,
+                f"Job not found: {job_id}"
+            )), 404
+
+        return jsonify(create_success_response(job))
+
+    except Exception as e:
+        logger.error(f"Error in get_job: {e}", exc_info=True)
+        return jsonify(create_error_response(
+            ErrorCode.INTERNAL_ERROR,
+            f"Internal error: {str(e)}"
+        )), 500
@@ -3,11 +3,21 @@ import logging
 from typing import Dict, Any, Optional, List, Union
 
 from services.files import ExtraFilesManager
+from strategies.prune.nm_sparse import parse_nm
 
 logger = logging.getLogger(__name__)
 
 # 操作类型前缀
-_OP_PREFIXES = ("quantize_", "prune_", "distill_")
+_OP_PREFIXES = ("quantize_", "prune_", "distill_", "fuse_")
+
+# 原样透传到剪枝配置的可选参数
+_PRUNE_OPTIONS = ("physical", "sparse_format", "sparse_values", "target_latency_ms", "target_size_mb", "max_error",
+                  "max_probes", "layerwise", "flops_reduction", "params_reduction", "sweep_ratios",
+                  "head_sparsity", "ffn_sparsity")
+
+# 原样透传到QAT配置的训练参数
+_QAT_OPTIONS = ("batch_size", "lr", "num_workers", "freeze_observer_epoch", "freeze_bn_epoch",
+                "early_stop_patience", "max_steps", "val_max_batches")
 
 
 class MethodMapper:
@@ -41,6 +51,8 @@ class MethodMapper:
                 strategy["prune"] = self._build_prune(sub, extra_manager, params.get(m, {}))
             elif op == "distill":
                 strategy["distill"] = self._build_distill(sub, extra_manager, params.get(m, {}))
+            elif op == "fuse":
+                strategy["fuse"] = self._build_fuse(sub)
         
         # 过滤未启用项
         strategy = {k: v for k, v in strategy.items() if v.get("enable")}
@@ -63,7 +75,7 @@ class MethodMapper:
         
         if sub == "auto":
             cfg["auto"] = True
-        elif sub in ("fp16", "int8_dynamic", "qat"):
+        elif sub in ("fp16", "bf16", "fp16_storage", "int8_dynamic", "int8_datafree", "qat"):
             cfg["precision"] = sub
             if sub == "qat":
                 train_dir = extra.get_train_data_dir()
@@ -71,17 +83,41 @@ class MethodMapper:
                     raise ValueError("qat requires train_data")
                 cfg["train_data_dir"] = train_dir
                 cfg["epochs"] = overrides.get("epochs", 10)
+                cfg.update({k: overrides[k] for k in _QAT_OPTIONS if overrides.get(k) is not None})
+                val_dir = extra.get_val_data_dir()
+                if val_dir:
+                    cfg["val_data_dir"] = val_dir
+        elif sub == "mixed":
+            cfg["precision"] = "mixed"
+            calib = extra.get_calib_dir()
+            if calib:
+                cfg["calib_dir"] = calib
+            for key in ("max_error", "max_fp32_ratio"):
+                if overrides.get(key) is not None:
+                    cfg[key] = overrides[key]
+        elif sub == "weight_only":
+            bits = int(overrides.get("bits", 8))
+            if bits not in (4, 8):
+                raise ValueError(f"weight_only supports bits 4 or 8, got {bits}")
+            cfg["precision"] = f"weight_only_int{bits}"
+            if overrides.get("group_size") is not None:
+                cfg["group_size"] = int(overrides["group_size"])
         elif sub in ("int8", "int8_static"):
             calib = extra.get_calib_dir()
             if calib:
                 cfg["precision"] = "int8_static"
                 cfg["calib_dir"] = calib
+                for key in ("calib_num", "calib_method", "per_channel", "smooth_alpha"):
+                    if overrides.get(key) is not None:
+                        cfg[key] = overrides[key]
             else:
                 if sub == "int8_static":
                     logger.warning("int8_static fallback to int8_dynamic (no calibration_data)")
                 cfg["precision"] = "int8_dynamic"
         else:
             raise ValueError(f"Unknown quantize method: {sub}")
+        if overrides.get("target_backend"):
+            cfg["target_backend"] = overrides["target_backend"]
         
         return cfg
     
@@ -92,18 +128,34 @@ class MethodMapper:
         if sub == "auto":
             cfg["type"] = "auto"
             cfg["auto"] = True
-        elif sub in ("structured", "unstructured"):
+        elif sub in ("structured", "unstructured", "heads"):
             cfg["type"] = sub
             cfg["target_sparsity"] = overrides.get("target_sparsity", 0.3)
+        elif sub == "nm_sparse":
+            # 模式在API层校验，非法时由调用方返回400
+            n, m = parse_nm(overrides.get("pattern", "2:4"))
+            cfg["type"] = sub
+            cfg["pattern"] = f"{n}:{m}"
+            cfg["target_sparsity"] = 1 - n / m
         else:
             raise ValueError(f"Unknown prune method: {sub}")
+        cfg.update({k: overrides[k] for k in _PRUNE_OPTIONS if k in overrides})
         
+        calib = extra.get_calib_dir()
+        if calib:
+            cfg["calib_dir"] = calib
         val_dir = extra.get_val_data_dir()
         if val_dir:
             cfg["val_data_dir"] = val_dir
         
         return cfg
     
+    def _build_fuse(self, sub: str) -> Dict[str, Any]:
+        """构建融合配置"""
+        if sub != "conv_bn":
+            raise ValueError(f"Unknown fuse method: {sub}")
+        return {"enable": True, "type": sub}
+    
     def _build_distill(self, sub: str, extra: ExtraFilesManager, overrides: Dict) -> Dict[str, Any]:
         """构建蒸馏配置"""
         teacher = extra.get_teacher_model_dir()
@@ -73,15 +73,23 @@ class ExecuteCompressionRequest(BaseModel):
         """验证method参数（扁平字符串模式）"""
         valid_methods = {
             "quantize_fp16",
+            "quantize_bf16",
+            "quantize_fp16_storage",
             "quantize_int8_dynamic",
             "quantize_int8_static",
             "quantize_int8",
+            "quantize_int8_datafree",
             "quantize_qat",
+            "quantize_mixed",
+            "quantize_weight_only",
             "quantize_auto",
             "prune_structured",
             "prune_unstructured",
+            "prune_nm_sparse",
+            "prune_heads",
             "prune_auto",
-            "distill_auto"
+            "distill_auto",
+            "fuse_conv_bn"
         }
         to_check = [v] if isinstance(v, str) else list(v)
         if not to_check:
@@ -20,6 +20,7 @@ from api.compression import compression_api_bp
 from api.upload import upload_api_bp
 from api.convert import convert_api_bp
 from api.compile import compile_api_bp
+from api.jobs import jobs_api_bp
 from config.settings import Config
 from config.swagger import swagger_template, swagger_config
 
@@ -37,6 +38,7 @@ app.register_blueprint(compression_api_bp)
 app.register_blueprint(upload_api_bp)
 app.register_blueprint(convert_api_bp)
 app.register_blueprint(compile_api_bp)
+app.register_blueprint(jobs_api_bp)
 
 if __name__ == '__main__':
     print("=" * 60)
@@ -54,6 +56,7 @@ if __name__ == '__main__':
     print("  POST /list-supported-formats - 列出支持的格式")
     print("  POST /compile              - 硬件编译")
     print("  GET  /list-hardware        - 列出支持的硬件平台")
+    print("  GET  /jobs/<job_id>        - 查询任务状态")
     print("\nSwagger API文档:")
     print(f"  http://{Config.HOST}:{Config.PORT}/apidocs/")
     print("\n按 Ctrl+C 停止服务器\n")
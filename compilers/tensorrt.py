@@ -3,7 +3,7 @@ import os
 import shutil
 import subprocess
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 from .base import HardwareCompiler
 from utils.security import sanitize_input_shape, sanitize_path
 
@@ -31,9 +31,14 @@ class TensorRTCompiler(HardwareCompiler):
         
         if optimization.get("fp16"):
             cmd.append("--fp16")
+        if optimization.get("sparsity"):
+            # 允许对满足2:4模式的权重使用稀疏Tensor Core kernel（prune_nm_sparse 的产物）
+            cmd.append("--sparsity=enable")
         if optimization.get("int8"):
             cmd.append("--int8")
             calib_cache = config.get("calib_cache")
+            if not calib_cache and config.get("calib_dir"):
+                calib_cache = self._build_calibration_cache(model_path, config)
             if calib_cache:
                 safe_calib = sanitize_path(str(calib_cache), os.path.dirname(calib_cache) or ".")
                 if os.path.exists(safe_calib):
@@ -76,5 +81,77 @@ class TensorRTCompiler(HardwareCompiler):
             "speedup": "~5.0x"
         }
 
+    @staticmethod
+    def _parse_input_shape(config: Dict[str, Any]) -> Tuple[int, ...]:
+        """解析 input_shape（"1,3,224,224" 或 "input:1,3,224,224"），默认 (1,3,224,224)"""
+        input_shape = config.get("input_shape")
+        if isinstance(input_shape, str):
+            try:
+                return tuple(map(int, input_shape.split(":")[-1].split(",")))
+            except ValueError:
+                return (1, 3, 224, 224)
+        return tuple(int(v) for v in input_shape) if input_shape else (1, 3, 224, 224)
+
+    def _build_calibration_cache(self, onnx_path: str, config: Dict[str, Any]) -> Optional[str]:
+        """用校准数据（calib_dir，与int8_static共用解码缓存）生成TensorRT INT8校准表
+
+        需要 tensorrt Python包和CUDA，不可用时返回None（trtexec使用默认动态范围）
+        """
+        try:
+            import tensorrt as trt
+            import torch
+            from utils.calibration import get_calibration_set
+        except ImportError as e:
+            logger.warning(f"TensorRT calibration skipped (missing dependency): {e}")
+            return None
+        if not torch.cuda.is_available():
+            logger.warning("TensorRT calibration skipped: CUDA not available")
+            return None
+
+        shape = self._parse_input_shape(config)
+        cache_path = os.path.join(self.output_dir, "calibration.cache")
+        try:
+            calib_dir = sanitize_path(str(config["calib_dir"]), os.path.dirname(str(config["calib_dir"])) or ".")
+            calib_set = get_calibration_set(calib_dir, input_shape=shape, max_samples=config.get("calib_num"))
+            batches = calib_set.batches(batch_size=shape[0], drop_last=True)
+
+            class _Calibrator(trt.IInt8EntropyCalibrator2):
+                def __init__(self):
+                    super().__init__()
+                    self._device_batch = None
+
+                def get_batch_size(self):
+                    return shape[0]
+
+                def get_batch(self, names):
+                    batch = next(batches, None)
+                    if batch is None:
+                        return None
+                    self._device_batch = batch.contiguous().cuda()
+                    return [int(self._device_batch.data_ptr())]
+
+                def read_calibration_cache(self):
+                    return None
+
+                def write_calibration_cache(self, cache):
+                    with open(cache_path, "wb") as f:
+                        f.write(cache)
+
+            trt_logger = trt.Logger(trt.Logger.WARNING)
+            builder = trt.Builder(trt_logger)
+            network = builder.create_network(1 << int(trt.NetworkDefinitionCreationFlag.EXPLICIT_BATCH))
+            parser = trt.OnnxParser(network, trt_logger)
+            with open(onnx_path, "rb") as f:
+                if not parser.parse(f.read()):
+                    raise RuntimeError(f"ONNX parse failed: {parser.get_error(0)}")
+            builder_config = builder.create_builder_config()
+            builder_config.set_flag(trt.BuilderFlag.INT8)
+            builder_config.int8_calibrator = _Calibrator()
+            builder.build_serialized_network(network, builder_config)
+        except Exception as e:
+            logger.warning(f"TensorRT calibration failed, using default dynamic ranges: {e}")
+            return None
+        return cache_path if os.path.exists(cache_path) else None
+
     def is_available(self) -> bool:
         return shutil.which("trtexec") is not None
@@ -74,7 +74,7 @@ class CapabilityRegistryV2:
         methods = cap.get("methods", {})
         operations = {}
         
-        for op_type in ["quantize", "prune", "distill"]:
+        for op_type in ["quantize", "prune", "distill", "fuse"]:
             op_config = methods.get(op_type)
             if isinstance(op_config, dict) and "available" in op_config:
                 operations[op_type] = {
@@ -94,7 +94,7 @@ class CapabilityRegistryV2:
         methods = cap.get("methods", {})
         requirements = {}
 
-        for op_type in ["quantize", "prune", "distill"]:
+        for op_type in ["quantize", "prune", "distill", "fuse"]:
             op_config = methods.get(op_type)
             if isinstance(op_config, dict) and "requirements" in op_config:
                 req_dict = op_config.get("requirements", {})
@@ -128,7 +128,7 @@ class CapabilityRegistryV2:
         methods = cap.get("methods", {})
         available_methods = []
 
-        for op_type in ["quantize", "prune", "distill"]:
+        for op_type in ["quantize", "prune", "distill", "fuse"]:
             op_config = methods.get(op_type)
             if isinstance(op_config, dict) and "available" in op_config:
                 method_list = op_config.get("available", [])
@@ -21,6 +21,9 @@ class Config:
 
     MODELS_DB = STORAGE_DIR / "models_db.json"
     JOBS_DB = STORAGE_DIR / "jobs_db.json"
+    DETECTION_CACHE = STORAGE_DIR / "detection_cache.json"
+    CALIB_CACHE_DIR = STORAGE_DIR / "calib_cache"
+    PRUNE_SENSITIVITY_CACHE_DIR = STORAGE_DIR / "prune_sensitivity"
 
     # 配置文件
     MODEL_CAPABILITIES = CONFIGS_DIR / "model_capabilities.json"
@@ -40,6 +43,30 @@ class Config:
     RECOMMEND_TOP_K = 3
     MIN_CONFIDENCE = 0.5
 
+    # 异步任务队列（/execute、/convert-format、/compile）
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "16"))
+    JOB_START_METHOD = os.getenv("JOB_START_METHOD", "spawn")
+    JOB_HISTORY_LIMIT = int(os.getenv("JOB_HISTORY_LIMIT", "200"))
+
+    # 模型识别结果缓存（按model_dir指纹：路径、文件名、大小、修改时间）
+    DETECTION_CACHE_SIZE = int(os.getenv("DETECTION_CACHE_SIZE", "256"))
+    DETECTION_CACHE_PERSIST = os.getenv("DETECTION_CACHE_PERSIST", "True").lower() == "true"
+
+    # 已加载state_dict缓存（按张量字节数计算，0表示关闭；完整模型对象不缓存）
+    MODEL_CACHE_MAX_MB = int(os.getenv("MODEL_CACHE_MAX_MB", "0"))
+
+    # 校准/训练数据缓存（解码后的uint8数组，int8_static、QAT、TensorRT校准共用）
+    CALIB_WORKERS = int(os.getenv("CALIB_WORKERS", "4"))
+    CALIB_BATCH_SIZE = int(os.getenv("CALIB_BATCH_SIZE", "32"))
+    CALIB_MAX_SAMPLES = int(os.getenv("CALIB_MAX_SAMPLES", "512"))
+    CALIB_CACHE_MAX_MB = int(os.getenv("CALIB_CACHE_MAX_MB", "4096"))
+    # 缓存目录总大小上限，超出时按最近使用时间淘汰（0表示不限制）
+    CALIB_CACHE_TOTAL_MB = int(os.getenv("CALIB_CACHE_TOTAL_MB", "16384"))
+
+    # 逐层剪枝敏感度扫描的并行线程数
+    PRUNE_SENSITIVITY_WORKERS = int(os.getenv("PRUNE_SENSITIVITY_WORKERS", "4"))
+
     MAX_UPLOAD_SIZE = 1024 * 1024 * 1024
     ALLOWED_EXTENSIONS = {".pt", ".pth", ".onnx", ".pb", ".h5"}
 
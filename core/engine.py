@@ -22,8 +22,324 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 ARTIFACTS_DIR = os.path.join(BASE_DIR, "artifacts")
 
 
+def _default_export_format(framework: str) -> str:
+    """根据framework推断默认导出格式"""
+    if framework == "tensorflow":
+        return "pb"
+    if framework == "paddlepaddle":
+        return "paddle_infer"
+    if framework == "onnx":
+        return "onnx"
+    return "pt"
+
+
+def _inject_default_export(strategy: Dict[str, Any], framework: str) -> bool:
+    """未指定导出格式时注入默认格式，返回是否为自动注入"""
+    export_config = strategy.get("export", {})
+    if export_config.get("formats"):
+        return False
+    if "export" not in strategy:
+        strategy["export"] = {}
+    strategy["export"]["formats"] = [_default_export_format(framework)]
+    return True
+
+
+def _variant_name(strategy: Dict[str, Any], index: int) -> str:
+    """生成变体名称（优先使用strategy中的name），用作结果子目录名"""
+    name = strategy.get("name")
+    if not name:
+        parts = []
+        for op_key in ("prune", "fuse", "quantize", "distill"):
+            cfg = strategy.get(op_key) or {}
+            if not cfg.get("enable"):
+                continue
+            if cfg.get("auto"):
+                parts.append(f"{op_key}_auto")
+            elif op_key == "quantize":
+                parts.append(f"quantize_{cfg.get('precision') or cfg.get('bits', 'default')}")
+            elif op_key == "prune":
+                sparsity = cfg.get("target_sparsity")
+                suffix = f"_{int(float(sparsity) * 100)}pct" if isinstance(sparsity, (int, float)) else ""
+                parts.append(f"prune_{cfg.get('type', 'structured')}{suffix}")
+            elif op_key == "fuse":
+                parts.append("fuse_conv_bn")
+            else:
+                parts.append(op_key)
+        name = "_".join(parts) or "export"
+    name = "".join(c if c.isalnum() or c in "-_." else "_" for c in str(name))
+    return f"{index:02d}_{name}"
+
+
+def _summarize_artifacts(paths: List[str], base_dir: str) -> List[Dict[str, Any]]:
+    """生成简明产物列表，方便前端展示"""
+    summary: List[Dict[str, Any]] = []
+    seen = set()
+    for path in paths:
+        if not path:
+            continue
+        rel_path = path
+        try:
+            if os.path.exists(path):
+                rel_path = os.path.relpath(path, base_dir)
+        except ValueError:
+            rel_path = path
+        rel_path = rel_path.replace("\\", "/")
+        name = os.path.basename(path).lower()
+        if name.endswith(".json"):
+            art_type = "metrics"
+        elif name.endswith(".sparse.safetensors"):
+            art_type = "sparse_model"
+        elif "quant" in name:
+            art_type = "quantized_model"
+        elif "distill" in name:
+            art_type = "distilled_model"
+        elif "prune" in name:
+            art_type = "pruned_model"
+        else:
+            art_type = "artifact"
+        if art_type == "metrics":
+            continue
+        key = (art_type, rel_path)
+        if key in seen:
+            continue
+        seen.add(key)
+        summary.append({"type": art_type, "path": rel_path})
+    return summary
+
+
+def _run_strategy(adapter: Any, strategy: Dict[str, Any], family: str, job_id: str,
+                  auto_export_injected: bool, base_dir: str) -> Dict[str, Any]:
+    """在已加载的adapter上执行单个strategy（剪枝→量化→蒸馏→导出→评估）"""
+    artifacts_dir = adapter.artifacts_dir
+    artifacts: List[str] = []
+    executed_ops: List[Dict[str, Any]] = []
+    quant_backend: Optional[str] = None
+    # final_only：记录是否已有步骤落盘、是否有步骤因不是最后一步而跳过保存
+    checkpoints = {"saved": False, "skipped": False}
+
+    # 中间产物保存策略（默认只保存最后一步）
+    adapter.checkpoint_policy = strategy.get("checkpoint_policy") or "final_only"
+    adapter.legacy_serialization = bool(strategy.get("legacy_serialization", False))
+    adapter.sparse_export = None
+    # CNN类模型导出TorchScript/ONNX前自动做Conv-BN融合，strategy["fuse"]["auto"]=False 时关闭
+    adapter.auto_fuse = bool((strategy.get("fuse") or {}).get("auto", True))
+    enabled_ops = [k for k in ("prune", "fuse", "quantize", "distill") if (strategy.get(k) or {}).get("enable")]
+
+    def _apply_operation(op_key: str, cfg: Dict[str, Any], apply_func, error_label: str) -> bool:
+        """统一处理优化操作，只记录真正执行的步骤"""
+        nonlocal quant_backend
+        if not (cfg and cfg.get("enable")):
+            return True
+        entry: Dict[str, Any] = {"operation": op_key}
+        executed_ops.append(entry)
+        adapter._final_operation = op_key == enabled_ops[-1]
+        try:
+            logger.debug(f"Applying {op_key}")
+            result = apply_func(cfg)
+            if result and "outputs" in result:
+                artifacts.extend(result["outputs"])
+            if result and result.get("pytorch_path"):
+                checkpoints["saved"] = True
+            elif result and result.get("checkpoint") == "skipped":
+                checkpoints["skipped"] = True
+            if op_key == "quantize" and result and result.get("backend"):
+                quant_backend = result["backend"]
+            if result and result.get("status") == "failed":
+                entry.update({"status": "failed", "reason": result.get("reason")})
+                return False
+            entry["status"] = "success"
+            return True
+        except Exception as e:
+            entry["status"] = "failed"
+            logger.error(f"{error_label} failed: {e}", exc_info=True)
+            return False
+
+    # 执行优化操作（顺序：剪枝→融合→量化→蒸馏），如果失败则返回错误（资源由调用方清理）
+    try:
+        # 1. 剪枝（先执行，在FP32精度下进行）
+        if not _apply_operation("prune", strategy.get("prune", {}), adapter.apply_prune, "Pruning"):
+            return {"job_id": job_id, "operations": executed_ops, "outputs": [], "metrics": {}, "error": "Pruning failed"}
+        # Conv-BN融合（剪枝后、量化前，融合后的模型只用于推理）
+        if not _apply_operation("fuse", strategy.get("fuse", {}), adapter.apply_fuse, "Fusion"):
+            return {"job_id": job_id, "operations": executed_ops, "outputs": [], "metrics": {}, "error": "Fusion failed"}
+        # 2. 量化（剪枝后再量化，避免量化后再剪枝导致精度类型转换）
+        if not _apply_operation("quantize", strategy.get("quantize", {}), adapter.apply_quant, "Quantization"):
+            return {"job_id": job_id, "operations": executed_ops, "outputs": [], "metrics": {}, "error": "Quantization failed"}
+        # 3. 蒸馏（最后执行）
+        if not _apply_operation("distill", strategy.get("distill", {}), adapter.apply_distill, "Distillation"):
+            return {"job_id": job_id, "operations": executed_ops, "outputs": [], "metrics": {}, "error": "Distillation failed"}
+    except Exception as e:
+        logger.error(f"Unexpected error during optimization: {e}", exc_info=True)
+        return {"job_id": job_id, "operations": executed_ops, "outputs": [], "metrics": {}, "error": f"Optimization failed: {str(e)}"}
+
+    # 最后一步回退（未调用保存）时，前面跳过保存的修改不能丢失：按已执行的步骤保存当前模型
+    if checkpoints["skipped"] and not checkpoints["saved"] and adapter.checkpoint_policy == "final_only":
+        flushed = adapter.flush_checkpoint()
+        if flushed and flushed.get("outputs"):
+            artifacts.extend(flushed["outputs"])
+
+    export_cfg = strategy.get("export", {})
+    formats = export_cfg.get("formats") or []
+    targets = export_cfg.get("targets", [])
+
+    should_export = bool(formats)
+    if auto_export_injected and artifacts:
+        # 若只是自动注入的默认导出，并且已经有操作产物，则不再额外导出原始模型
+        should_export = False
+
+    if should_export:
+        try:
+            logger.debug(f"Exporting to formats: {formats}")
+            export_artifacts = adapter.export(formats=formats, targets=targets)
+            artifacts.extend(export_artifacts)
+        except Exception as e:
+            logger.error(f"Export failed: {e}")
+            return {
+                "job_id": job_id,
+                "operations": executed_ops,
+                "outputs": [],
+                "metrics": {},
+                "error": f"Export failed: {str(e)}"
+            }
+
+    metrics_path: Optional[str] = None
+    try:
+        logger.debug("Evaluating model metrics")
+        metrics = adapter.evaluate(artifacts=artifacts)
+        metrics_path = adapter.write_metrics(metrics)
+        if metrics_path and metrics_path not in artifacts:
+            artifacts.append(metrics_path)
+    except Exception as e:
+        logger.warning(f"Evaluation failed: {e}")
+        metrics = {}
+
+    if latency_eval and not metrics.get("latency_ms_cpu"):
+        try:
+            lat = latency_eval.measure_latency_ms(artifacts_dir, family_hint=str(family))
+            if lat:
+                metrics["latency_ms_cpu"] = lat
+                adapter.write_metrics(metrics)
+        except Exception as e:
+            logger.warning(f"Latency measurement failed: {e}")
+
+    if acc_eval:
+        try:
+            acc = acc_eval(artifacts_dir, family_hint=str(family))
+            if isinstance(acc, dict):
+                metrics.update(acc)
+        except Exception as e:
+            logger.warning(f"Accuracy evaluation failed: {e}")
+
+    for unused_key in ("acc_top1", "acc_top5", "map"):
+        metrics.pop(unused_key, None)
+
+    size_before = metrics.get("size_before_mb")
+    size_after = metrics.get("size_after_mb")
+    ratio = None
+    if isinstance(size_before, (int, float)) and size_before and isinstance(size_after, (int, float)):
+        ratio = round(size_after / size_before, 4)
+    metrics = {
+        "size_before_mb": size_before,
+        "size_after_mb": size_after,
+        "compression_ratio": ratio,
+        "latency_ms_cpu": metrics.get("latency_ms_cpu")
+    }
+    if quant_backend:
+        metrics["quant_backend"] = quant_backend
+
+    if metrics_path:
+        adapter.write_metrics(metrics)
+
+    return {
+        "job_id": job_id,
+        "operations": executed_ops,
+        "outputs": _summarize_artifacts(artifacts, base_dir),
+        "metrics": metrics,
+    }
+
+
+def _run_variants(adapter: Any, strategies: List[Dict[str, Any]], framework: str,
+                  job_id: str, base_dir: str) -> Dict[str, Any]:
+    """在同一次加载的模型上依次生成多个压缩变体
+
+    每个变体使用原始模型的深拷贝（最后一个变体直接使用原始模型），
+    产物写入 res_dir 下各自的子目录
+    """
+    import copy
+
+    base_model = adapter.model
+    base_family = adapter.family
+    variants: List[Dict[str, Any]] = []
+
+    for index, variant_strategy in enumerate(strategies):
+        variant_strategy = copy.deepcopy(variant_strategy or {})
+        name = _variant_name(variant_strategy, index)
+        variant_dir = os.path.join(base_dir, name)
+        os.makedirs(variant_dir, exist_ok=True)
+        auto_export_injected = _inject_default_export(variant_strategy, framework)
+
+        is_last = index == len(strategies) - 1
+        try:
+            adapter.model = base_model if is_last else copy.deepcopy(base_model)
+        except Exception as e:
+            logger.error(f"Failed to copy model for variant {name}: {e}")
+            variants.append({"name": name, "result_dir": variant_dir, "operations": [], "outputs": [],
+                             "metrics": {}, "error": f"Failed to copy model: {str(e)}"})
+            continue
+        if is_last:
+            base_model = None
+        adapter.artifacts_dir = variant_dir
+        adapter.family = base_family
+        adapter._operations = []
+
+        logger.debug(f"Running variant {name}")
+        result = _run_strategy(adapter, variant_strategy, adapter.family or "generic", job_id,
+                               auto_export_injected, base_dir)
+        result.pop("job_id", None)
+        variants.append(dict(result, name=name, result_dir=variant_dir))
+        adapter.model = None
+
+    failed = [v["name"] for v in variants if v.get("error")]
+    result: Dict[str, Any] = {
+        "job_id": job_id,
+        "operations": [dict(op, variant=v["name"]) for v in variants for op in v.get("operations", [])],
+        "outputs": [dict(out, variant=v["name"]) for v in variants for out in v.get("outputs", [])],
+        "metrics": {v["name"]: v.get("metrics", {}) for v in variants},
+        "variants": variants,
+    }
+    if failed and len(failed) == len(variants):
+        result["error"] = f"All variants failed: {', '.join(failed)}"
+    return result
+
+
+def _adopt_preloaded(adapter: Any, preloaded: Any) -> bool:
+    """复用识别阶段已加载的模型，成功返回True（调用方无需再执行adapter.load）
+
+    同类adapter直接接管模型；不同类时由目标adapter的 adopt() 决定（默认不接管，
+    只有 load() 对完整模型对象不做额外处理的family adapter才接受）。
+    state_dict需要按family重建网络结构，仍由adapter.load()处理
+    """
+    model = getattr(preloaded, "model", None)
+    if model is None:
+        return False
+    same_cls = type(preloaded) is type(adapter)
+    if same_cls:
+        adapter.model = model
+    elif not adapter.adopt(model):
+        return False
+    if same_cls and preloaded.family and preloaded.family != "generic":
+        adapter.family = preloaded.family
+    preloaded.model = None
+    logger.debug(f"Reusing model loaded during detection ({type(preloaded).__name__})")
+    return True
+
+
 def execute_optimize(data: Dict[str, Any]) -> Dict[str, Any]:
-    """执行模型优化（量化、剪枝、蒸馏、导出）"""
+    """执行模型优化（量化、剪枝、蒸馏、导出）
+
+    data["strategies"] 为列表时，模型只检测、加载一次，按列表生成多个变体；
+    data["adapter"] 为识别阶段已加载模型的adapter时直接复用，不再重复加载
+    """
     data = compat_preprocess(data)
 
     framework = data.get("framework", "pytorch")
@@ -31,33 +347,22 @@ def execute_optimize(data: Dict[str, Any]) -> Dict[str, Any]:
     model_dir = data.get("model_dir")
     model_id = data.get("model_id", f"m_{uuid.uuid4().hex[:6]}")
     version_id = data.get("version_id", f"v_{int(time.time())}")
+    job_id = data.get("job_id") or f"j_{model_id}_{version_id}"
 
     if not model_dir:
         model_dir = os.path.join(ARTIFACTS_DIR, model_id, version_id, "raw")
 
     artifacts_dir = data.get("res_dir") or os.path.join(ARTIFACTS_DIR, model_id, version_id, "optimized")
     os.makedirs(artifacts_dir, exist_ok=True)
-    
+
+    strategies = data.get("strategies")
+    if strategies is not None and not isinstance(strategies, list):
+        strategies = [strategies]
+
     strategy = data.get("strategy", {})
-    export_config = strategy.get("export", {})
-    user_specified_export = bool(export_config.get("formats"))
     auto_export_injected = False
-    if not user_specified_export:
-        # 如果没有指定格式，根据framework推断默认格式
-        if "export" not in strategy:
-            strategy["export"] = {}
-        if framework == "pytorch":
-            default_format = "pt"
-        elif framework == "tensorflow":
-            default_format = "pb"
-        elif framework == "paddlepaddle":
-            default_format = "paddle_infer"
-        elif framework == "onnx":
-            default_format = "onnx"
-        else:
-            default_format = "pt"
-        strategy["export"]["formats"] = [default_format]
-        auto_export_injected = True
+    if not strategies:
+        auto_export_injected = _inject_default_export(strategy, framework)
         data["strategy"] = strategy
 
     try:
@@ -65,7 +370,7 @@ def execute_optimize(data: Dict[str, Any]) -> Dict[str, Any]:
     except Exception as e:
         logger.error(f"Failed to get adapter: {e}")
         return {
-            "job_id": f"j_{model_id}_{version_id}",
+            "job_id": job_id,
             "operations": [],
             "outputs": [],
             "metrics": {},
@@ -74,7 +379,7 @@ def execute_optimize(data: Dict[str, Any]) -> Dict[str, Any]:
     if not AdapterCls:
         logger.error(f"No adapter found for framework={framework}, family={family}")
         return {
-            "job_id": f"j_{model_id}_{version_id}",
+            "job_id": job_id,
             "operations": [],
             "outputs": [],
             "metrics": {},
@@ -88,11 +393,12 @@ def execute_optimize(data: Dict[str, Any]) -> Dict[str, Any]:
         adapter = AdapterCls(model_dir=model_dir, artifacts_dir=artifacts_dir, family=str(family))
 
         try:
-            adapter.load()
+            if not _adopt_preloaded(adapter, data.get("adapter")):
+                adapter.load()
             if adapter.model is None:
                 logger.error("Model failed to load - adapter.model is None")
                 return {
-                    "job_id": f"j_{model_id}_{version_id}",
+                    "job_id": job_id,
                     "operations": [],
                     "outputs": [],
                     "metrics": {},
@@ -106,166 +412,27 @@ def execute_optimize(data: Dict[str, Any]) -> Dict[str, Any]:
         except Exception as e:
             logger.error(f"Failed to load model: {e}")
             return {
-                "job_id": f"j_{model_id}_{version_id}",
+                "job_id": job_id,
                 "operations": [],
                 "outputs": [],
                 "metrics": {},
                 "error": f"Failed to load model: {str(e)}"
             }
 
-        artifacts: List[str] = []
-        strategy = data.get("strategy", {})
-        job_id = f"j_{model_id}_{version_id}"
-        executed_ops: List[Dict[str, Any]] = []
-        
-        def _apply_operation(op_key: str, cfg: Dict[str, Any], apply_func, error_label: str) -> bool:
-            """统一处理优化操作，只记录真正执行的步骤"""
-            if not (cfg and cfg.get("enable")):
-                return True
-            entry: Dict[str, Any] = {"operation": op_key}
-            executed_ops.append(entry)
-            try:
-                logger.debug(f"Applying {op_key}")
-                result = apply_func(cfg)
-                if result and "outputs" in result:
-                    artifacts.extend(result["outputs"])
-                entry["status"] = "success"
-                return True
-            except Exception as e:
-                entry["status"] = "failed"
-                logger.error(f"{error_label} failed: {e}", exc_info=True)
-                return False
-        
-        # 执行优化操作（顺序：剪枝→量化→蒸馏），如果失败则返回错误（资源会在finally中清理）
-        try:
-            # 1. 剪枝（先执行，在FP32精度下进行）
-            if not _apply_operation("prune", strategy.get("prune", {}), adapter.apply_prune, "Pruning"):
-                return {"job_id": job_id, "operations": executed_ops, "outputs": [], "metrics": {}, "error": "Pruning failed"}
-            # 2. 量化（剪枝后再量化，避免量化后再剪枝导致精度类型转换）
-            if not _apply_operation("quantize", strategy.get("quantize", {}), adapter.apply_quant, "Quantization"):
-                return {"job_id": job_id, "operations": executed_ops, "outputs": [], "metrics": {}, "error": "Quantization failed"}
-            # 3. 蒸馏（最后执行）
-            if not _apply_operation("distill", strategy.get("distill", {}), adapter.apply_distill, "Distillation"):
-                return {"job_id": job_id, "operations": executed_ops, "outputs": [], "metrics": {}, "error": "Distillation failed"}
-        except Exception as e:
-            logger.error(f"Unexpected error during optimization: {e}", exc_info=True)
-            return {"job_id": job_id, "operations": executed_ops, "outputs": [], "metrics": {}, "error": f"Optimization failed: {str(e)}"}
-
-        export_cfg = strategy.get("export", {})
-        formats = export_cfg.get("formats") or []
-        targets = export_cfg.get("targets", [])
-
-        should_export = bool(formats)
-        if auto_export_injected and artifacts:
-            # 若只是自动注入的默认导出，并且已经有操作产物，则不再额外导出原始模型
-            should_export = False
-
-        if should_export:
-            try:
-                logger.debug(f"Exporting to formats: {formats}")
-                export_artifacts = adapter.export(formats=formats, targets=targets)
-                artifacts.extend(export_artifacts)
-            except Exception as e:
-                logger.error(f"Export failed: {e}")
-                return {
-                    "job_id": f"j_{model_id}_{version_id}",
-                    "operations": executed_ops,
-                    "outputs": [],
-                    "metrics": {},
-                    "error": f"Export failed: {str(e)}"
-                }
-
-        metrics_path: Optional[str] = None
-        try:
-            logger.debug("Evaluating model metrics")
-            metrics = adapter.evaluate(artifacts=artifacts)
-            metrics_path = adapter.write_metrics(metrics)
-            if metrics_path and metrics_path not in artifacts:
-                artifacts.append(metrics_path)
-        except Exception as e:
-            logger.warning(f"Evaluation failed: {e}")
-            metrics = {}
-
-        if latency_eval and not metrics.get("latency_ms_cpu"):
-            try:
-                lat = latency_eval.measure_latency_ms(artifacts_dir, family_hint=str(family))
-                if lat:
-                    metrics["latency_ms_cpu"] = lat
-                    adapter.write_metrics(metrics)
-            except Exception as e:
-                logger.warning(f"Latency measurement failed: {e}")
-
-        if acc_eval:
-            try:
-                acc = acc_eval(artifacts_dir, family_hint=str(family))
-                if isinstance(acc, dict):
-                    metrics.update(acc)
-            except Exception as e:
-                logger.warning(f"Accuracy evaluation failed: {e}")
-
-        for unused_key in ("acc_top1", "acc_top5", "map"):
-            metrics.pop(unused_key, None)
-
-        size_before = metrics.get("size_before_mb")
-        size_after = metrics.get("size_after_mb")
-        ratio = None
-        if isinstance(size_before, (int, float)) and size_before and isinstance(size_after, (int, float)):
-            ratio = round(size_after / size_before, 4)
-        metrics = {
-            "size_before_mb": size_before,
-            "size_after_mb": size_after,
-            "compression_ratio": ratio,
-            "latency_ms_cpu": metrics.get("latency_ms_cpu")
-        }
-
-        if metrics_path:
-            adapter.write_metrics(metrics)
-
-        def _summarize_artifacts(paths: List[str]) -> List[Dict[str, Any]]:
-            """生成简明产物列表，方便前端展示"""
-            summary: List[Dict[str, Any]] = []
-            seen = set()
-            for path in paths:
-                if not path:
-                    continue
-                rel_path = path
-                try:
-                    if os.path.exists(path):
-                        rel_path = os.path.relpath(path, artifacts_dir)
-                except ValueError:
-                    rel_path = path
-                rel_path = rel_path.replace("\\", "/")
-                name = os.path.basename(path).lower()
-                if name.endswith(".json"):
-                    art_type = "metrics"
-                elif "quant" in name:
-                    art_type = "quantized_model"
-                elif "distill" in name:
-                    art_type = "distilled_model"
-                elif "prune" in name:
-                    art_type = "pruned_model"
-                else:
-                    art_type = "artifact"
-                if art_type == "metrics":
-                    continue
-                key = (art_type, rel_path)
-                if key in seen:
-                    continue
-                seen.add(key)
-                summary.append({"type": art_type, "path": rel_path})
-            return summary
-
-        logger.debug(f"Optimization completed for model_id={model_id}")
-        return {
-            "job_id": f"j_{model_id}_{version_id}",
-            "operations": executed_ops,
-            "outputs": _summarize_artifacts(artifacts),
-            "metrics": metrics,
-        }
+        if strategies:
+            result = _run_variants(adapter, strategies, framework, job_id, artifacts_dir)
+        else:
+            result = _run_strategy(adapter, data.get("strategy", {}), family, job_id,
+                                   auto_export_injected, artifacts_dir)
+        if not result.get("error"):
+            logger.debug(f"Optimization completed for model_id={model_id}")
+        return result
     finally:
-        if adapter is not None:
+        for owned in (adapter, data.get("adapter")):
+            if owned is None:
+                continue
             try:
-                adapter.cleanup()
+                owned.cleanup()
             except Exception as cleanup_error:
                 logger.warning(f"Adapter cleanup failed: {cleanup_error}")
 
@@ -307,7 +474,7 @@ def execute_compile(data: Dict[str, Any]) -> Dict[str, Any]:
         rel_path = os.path.relpath(output_path, compiled_dir) if output_path else ""
         
         return {
-            "job_id": f"j_compile_{int(time.time())}",
+            "job_id": data.get("job_id") or f"j_compile_{int(time.time())}",
             "operations": [{"operation": "compile", "status": "success", "target": target}],
             "outputs": [{"type": "compiled_model", "path": rel_path.replace("\\", "/")}],
             "metrics": {}
@@ -1,7 +1,8 @@
 """CPU 延时评估工具（中文注释）。
 
 说明：
-- 在 artifacts 目录中自动选择优先的模型文件（TorchScript .pt 或 ONNX .onnx）。
+- 在 artifacts 目录中自动选择优先的模型文件（TorchScript .pt、完整模型 .pt 或 ONNX .onnx）。
+- 输入按模型参数的dtype构造（fp16/bf16模型使用同dtype输入），FP16存储的模型转回FP32后计时。
 - 若本地安装了对应运行时（PyTorch/onnxruntime），则进行 10 次推理测平均延时；否则返回 None。
 """
 
@@ -26,30 +27,73 @@ def _pick_artifact(artifacts_dir: str) -> Optional[str]:
     return None
 
 
-def _default_shape(family_hint: str) -> tuple[int, int, int, int]:
+def default_input_shape(family_hint: str) -> tuple[int, int, int, int]:
+    """按模型家族给出默认输入形状（NCHW），延时评估和剪枝搜索共用"""
     f = (family_hint or "").lower()
     if "yolo" in f or "det" in f:
         return (1, 3, 640, 640)
     return (1, 3, 224, 224)
 
 
-def _latency_torchscript(pt_path: str, shape: tuple[int, int, int, int]) -> Optional[float]:
+def _load_torch_module(pt_path: str):
+    """TorchScript 优先；非TorchScript的 .pt 按完整模型（torch.save(model)）加载"""
+    import torch  # type: ignore
+
     try:
-        import torch  # type: ignore
+        return torch.jit.load(pt_path, map_location="cpu")
     except Exception:
-        return None
+        pass
+    m = torch.load(pt_path, map_location="cpu", weights_only=False)
+    if getattr(m, "_fp16_storage", False) and hasattr(m, "float"):
+        m = m.float()  # FP16存储、FP32计算
+    return m if callable(m) else None
+
+
+def _input_dtype(m):
+    """按模型第一个浮点参数的dtype构造输入（fp16/bf16模型需要同dtype输入）"""
+    import torch  # type: ignore
+
     try:
-        m = torch.jit.load(pt_path, map_location="cpu")
-        m.eval()
-        x = torch.randn(*shape)
+        for p in m.parameters():
+            if p.is_floating_point():
+                return p.dtype
+    except Exception:
+        pass
+    return torch.float32
+
+
+def _time_module(m, shape: tuple[int, ...], runs: int = 10) -> float:
+    """预热2次后运行runs次，返回平均延时（ms）"""
+    import torch  # type: ignore
+
+    m.eval()
+    x = torch.randn(*shape).to(_input_dtype(m))
+    with torch.inference_mode():
         # warmup
         for _ in range(2):
             _ = m(x)
         t0 = time.perf_counter()
-        for _ in range(10):
+        for _ in range(runs):
             _ = m(x)
         t1 = time.perf_counter()
-        return round((t1 - t0) * 1000.0 / 10.0, 3)
+    return round((t1 - t0) * 1000.0 / runs, 3)
+
+
+def _latency_torchscript(pt_path: str, shape: tuple[int, int, int, int]) -> Optional[float]:
+    try:
+        m = _load_torch_module(pt_path)
+        if m is None:
+            return None
+        return _time_module(m, shape)
+    except Exception:
+        return None
+
+
+def measure_model_latency_ms(model, family_hint: str = "", shape: Optional[tuple[int, ...]] = None,
+                             runs: int = 10) -> Optional[float]:
+    """直接对内存中的PyTorch模型计时（与导出产物使用相同的输入和计时方式），失败时返回None"""
+    try:
+        return _time_module(model, tuple(shape or default_input_shape(family_hint)), runs)
     except Exception:
         return None
 
@@ -72,7 +116,8 @@ def _latency_onnx(onnx_path: str, shape: tuple[int, int, int, int]) -> Optional[
                 shape = tuple(int(v) for v in shp)  # type: ignore
         except Exception:
             pass
-        x = (np.random.randn(*shape)).astype("float32")
+        dtype = "float16" if getattr(inputs[0], "type", "") == "tensor(float16)" else "float32"
+        x = (np.random.randn(*shape)).astype(dtype)
         # warmup
         for _ in range(2):
             _ = sess.run(None, {name: x})
@@ -93,7 +138,7 @@ def measure_latency_ms(artifacts_dir: str, family_hint: str = "") -> Optional[fl
     art = _pick_artifact(artifacts_dir)
     if not art:
         return None
-    shape = _default_shape(family_hint)
+    shape = default_input_shape(family_hint)
     low = art.lower()
     if low.endswith(".pt"):
         return _latency_torchscript(art, shape)
@@ -0,0 +1,193 @@
+"""异步任务服务
+
+/execute、/convert-format、/compile 将任务提交到有界队列，由工作进程池执行，
+请求线程只返回job_id，任务状态通过 GET /jobs/<job_id> 查询
+"""
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+from config.settings import Config
+from utils.error import APIError, ErrorCode
+from utils.file import ensure_json_array, read_json_list, write_json
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+_ACTIVE_STATES = (JOB_QUEUED, JOB_RUNNING)
+_RESULT_FIELDS = ("result_dir", "operations", "outputs", "metrics", "variants")
+
+
+def _run_job(func: Callable[[Dict[str, Any]], Dict[str, Any]], payload: Dict[str, Any]) -> Dict[str, Any]:
+    """工作进程入口：执行任务函数并记录起止时间"""
+    started_at = time.time()
+    try:
+        result = func(payload) or {}
+    except Exception as e:
+        result = {"error": f"{type(e).__name__}: {e}"}
+    return {"result": result, "started_at": started_at, "finished_at": time.time()}
+
+
+class JobManager:
+    """任务管理器（有界队列 + 工作进程池）"""
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 start_method: Optional[str] = None, history_limit: Optional[int] = None):
+        self.max_workers = max(1, int(max_workers or Config.JOB_WORKERS))
+        self.max_pending = max(1, int(max_pending or Config.JOB_QUEUE_SIZE))
+        self.start_method = start_method or Config.JOB_START_METHOD
+        self.history_limit = max(1, int(history_limit or Config.JOB_HISTORY_LIMIT))
+        self.jobs_db = str(Config.JOBS_DB)
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._futures: Dict[str, Future] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """延迟创建进程池（spawn避免fork已初始化的torch线程池）"""
+        if self._executor is None:
+            try:
+                ctx = multiprocessing.get_context(self.start_method)
+            except ValueError:
+                ctx = multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx)
+            logger.info(f"Job pool started: workers={self.max_workers}, start_method={ctx.get_start_method()}")
+        return self._executor
+
+    def submit(self, kind: str, func: Callable[[Dict[str, Any]], Dict[str, Any]],
+               payload: Dict[str, Any]) -> Dict[str, Any]:
+        """提交任务，队列已满时抛出 APIError(SERVICE_UNAVAILABLE)"""
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if job["status"] in _ACTIVE_STATES)
+            if active >= self.max_pending:
+                raise APIError(
+                    ErrorCode.SERVICE_UNAVAILABLE,
+                    f"Job queue is full ({active}/{self.max_pending}), please retry later"
+                )
+
+            job_id = payload.get("job_id") or f"j_{kind}_{uuid.uuid4().hex[:12]}"
+            payload = dict(payload, job_id=job_id)
+            try:
+                future = self._get_executor().submit(_run_job, func, payload)
+            except BrokenProcessPool:
+                logger.warning("Job pool is broken (worker crashed), restarting")
+                self._executor = None
+                future = self._get_executor().submit(_run_job, func, payload)
+
+            record = {
+                "job_id": job_id,
+                "type": kind,
+                "status": JOB_QUEUED,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "result_dir": payload.get("res_dir"),
+                "operations": [],
+                "outputs": [],
+                "metrics": {},
+                "error": None,
+            }
+            self._jobs[job_id] = record
+            self._futures[job_id] = future
+            snapshot = dict(record)
+
+        future.add_done_callback(lambda f, jid=job_id: self._on_done(jid, f))
+        logger.info(f"Job submitted: {job_id} ({kind})")
+        return snapshot
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询任务状态，内存中不存在时从 jobs_db 历史记录中查找"""
+        with self._lock:
+            record = self._jobs.get(job_id)
+            if record is not None:
+                future = self._futures.get(job_id)
+                if record["status"] == JOB_QUEUED and future is not None and future.running():
+                    record["status"] = JOB_RUNNING
+                return dict(record)
+
+        for record in reversed(read_json_list(self.jobs_db)):
+            if isinstance(record, dict) and record.get("job_id") == job_id:
+                return record
+        return None
+
+    def _on_done(self, job_id: str, future: Future) -> None:
+        """任务结束回调：更新状态并写入 jobs_db"""
+        try:
+            out = future.result()
+            result = out.get("result") or {}
+            started_at, finished_at = out.get("started_at"), out.get("finished_at")
+        except Exception as e:
+            result = {"error": f"Worker process failed: {type(e).__name__}: {e}"}
+            started_at, finished_at = None, time.time()
+
+        with self._lock:
+            self._futures.pop(job_id, None)
+            record = self._jobs.get(job_id)
+            if record is None:
+                return
+            for key in _RESULT_FIELDS:
+                if result.get(key) is not None:
+                    record[key] = result[key]
+            record["started_at"] = started_at
+            record["finished_at"] = finished_at
+            if result.get("error"):
+                record["status"] = JOB_FAILED
+                record["error"] = result["error"]
+                record["error_code"] = int(result.get("error_code", ErrorCode.COMPRESSION_FAILED))
+            else:
+                record["status"] = JOB_SUCCEEDED
+            snapshot = dict(record)
+            self._evict_finished()
+            self._persist(snapshot)
+
+        if snapshot["status"] == JOB_FAILED:
+            logger.error(f"Job failed: {job_id} - {snapshot['error']}")
+        else:
+            logger.info(f"Job finished: {job_id}")
+
+    def _evict_finished(self) -> None:
+        """内存中只保留最近 history_limit 个已结束任务"""
+        finished = [jid for jid, job in self._jobs.items() if job["status"] not in _ACTIVE_STATES]
+        for jid in finished[:max(0, len(finished) - self.history_limit)]:
+            self._jobs.pop(jid, None)
+
+    def _persist(self, record: Dict[str, Any]) -> None:
+        """追加任务记录到 jobs_db（保留最近 history_limit 条）"""
+        try:
+            ensure_json_array(self.jobs_db)
+            records = read_json_list(self.jobs_db)
+            records.append(record)
+            write_json(self.jobs_db, records[-self.history_limit:])
+        except Exception as e:
+            logger.warning(f"Failed to persist job {record.get('job_id')}: {e}")
+
+    def shutdown(self, wait: bool = False) -> None:
+        """关闭进程池"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+# 全局单例
+_manager_instance: Optional[JobManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """获取任务管理器单例"""
+    global _manager_instance
+    with _manager_lock:
+        if _manager_instance is None:
+            _manager_instance = JobManager()
+        return _manager_instance
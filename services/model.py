@@ -3,12 +3,17 @@
 合并 model_detector.py 和 teacher_validator.py
 """
 import os
+import json
+import hashlib
 import logging
-from typing import Dict, Optional, Any
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Any, Tuple
 
 logger = logging.getLogger(__name__)
 
 from adapters.registry import get_adapter
+from config.settings import Config
 from utils.path import PathManager
 
 
@@ -121,8 +126,8 @@ def detect_original_format(model_dir: str, framework: str) -> Optional[str]:
     return None
 
 
-def detect_family_from_model(model_dir: str, framework: str) -> str:
-    """通过加载模型识别family（优先文件名检测，避免路径误导）"""
+def _detect_family(model_dir: str, framework: str) -> Tuple[str, Optional[Any]]:
+    """识别family，返回 (family, 已加载模型的adapter)；未完整加载模型时adapter为None"""
     # 1. 快速文件名检测（不加载模型，避免自定义类加载失败）
     try:
         import tempfile
@@ -138,7 +143,7 @@ def detect_family_from_model(model_dir: str, framework: str) -> str:
                     shutil.rmtree(temp_artifacts_dir, ignore_errors=True)
                 except Exception:
                     pass
-                return quick_detected
+                return quick_detected, None
         
         try:
             import shutil
@@ -148,11 +153,30 @@ def detect_family_from_model(model_dir: str, framework: str) -> str:
     except Exception:
         pass
 
-    # 2. 加载模型后检测（字符串表示、state_dict键）
+    # 2. 只解析检查点的pickle流（类名、state_dict键），不加载张量
+    if framework == "pytorch":
+        try:
+            import tempfile
+            import shutil
+            temp_artifacts_dir = tempfile.mkdtemp()
+            try:
+                AdapterCls = get_adapter(framework, "generic")
+                if AdapterCls:
+                    adapter = AdapterCls(model_dir=model_dir, artifacts_dir=temp_artifacts_dir, family="generic")
+                    sniffed = adapter._detect_from_checkpoint()
+                    if sniffed:
+                        logger.debug(f"Family detected from checkpoint header: {sniffed}")
+                        return sniffed, None
+            finally:
+                shutil.rmtree(temp_artifacts_dir, ignore_errors=True)
+        except Exception as e:
+            logger.debug(f"Checkpoint sniffing failed: {e}")
+
+    # 3. 加载模型后检测（字符串表示、state_dict键）
     AdapterCls = get_adapter(framework, "generic")
     if not AdapterCls:
         logger.warning(f"No adapter found for framework={framework}, returning generic")
-        return "generic"
+        return "generic", None
     
     try:
         import tempfile
@@ -174,7 +198,7 @@ def detect_family_from_model(model_dir: str, framework: str) -> str:
                 shutil.rmtree(temp_artifacts_dir, ignore_errors=True)
             except Exception:
                 pass
-            return fallback_detected
+            return fallback_detected, None
         
         # 优先使用adapter自身识别的family
         if adapter.family and adapter.family != "generic":
@@ -188,35 +212,181 @@ def detect_family_from_model(model_dir: str, framework: str) -> str:
         except Exception:
             pass
         
-        return detected
+        return detected, adapter
         
     except Exception as e:
         logger.error(f"Error detecting family: {e}")
-        return "generic"
+        return "generic", None
+
+
+def detect_family_from_model(model_dir: str, framework: str) -> str:
+    """通过加载模型识别family（优先文件名检测，避免路径误导）"""
+    family, adapter = _detect_family(model_dir, framework)
+    if adapter is not None:
+        adapter.cleanup()
+    return family
+
+
+def model_dir_fingerprint(model_dir: str) -> str:
+    """计算model_dir指纹（绝对路径 + 各文件相对路径、大小、修改时间）"""
+    root = os.path.abspath(model_dir)
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((os.path.relpath(path, root).replace("\\", "/"), st.st_size, st.st_mtime_ns))
+    raw = json.dumps([root, entries], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class DetectionCache:
+    """模型识别结果缓存（进程内LRU，可选持久化到磁盘）
+
+    key为model_dir指纹，文件有任何增删改都会使缓存失效；
+    value为 {framework, family, original_format}
+    """
+
+    _FIELDS = ("framework", "family", "original_format")
+
+    def __init__(self, max_entries: Optional[int] = None, path: Optional[str] = None,
+                 persist: Optional[bool] = None):
+        self.max_entries = max(1, int(max_entries or Config.DETECTION_CACHE_SIZE))
+        self.path = str(path or Config.DETECTION_CACHE)
+        self.persist = Config.DETECTION_CACHE_PERSIST if persist is None else persist
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """查询缓存，内存未命中时查磁盘"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return dict(entry)
+        if not self.persist:
+            return None
+        entry = self._read_disk().get(key)
+        if not isinstance(entry, dict):
+            return None
+        entry = {k: entry.get(k) for k in self._FIELDS}
+        self._remember(key, entry)
+        return dict(entry)
+
+    def put(self, key: str, detection: Dict[str, Any]) -> None:
+        """写入缓存"""
+        entry = {k: detection.get(k) for k in self._FIELDS}
+        self._remember(key, entry)
+        if self.persist:
+            self._write_disk(key, entry)
+
+    def clear(self) -> None:
+        """清空内存缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _read_disk(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except Exception:
+            return {}
+
+    def _write_disk(self, key: str, entry: Dict[str, Any]) -> None:
+        """写入磁盘（临时文件 + 原子替换，多个工作进程并发写入时不会产生半截文件）"""
+        try:
+            with self._lock:
+                data = self._read_disk()
+                data.pop(key, None)
+                data[key] = entry
+                while len(data) > self.max_entries:
+                    data.pop(next(iter(data)))
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"Failed to persist detection cache: {e}")
+
+
+# 全局单例
+_detection_cache: Optional[DetectionCache] = None
+_detection_cache_lock = threading.Lock()
+
+
+def get_detection_cache() -> DetectionCache:
+    """获取模型识别缓存单例"""
+    global _detection_cache
+    with _detection_cache_lock:
+        if _detection_cache is None:
+            _detection_cache = DetectionCache()
+        return _detection_cache
 
 
 class ModelDetector:
     """模型识别服务类"""
     
-    def detect_from_dir(self, model_dir: str) -> Dict[str, Any]:
-        """从model_dir识别framework、family和原始格式"""
+    def __init__(self, use_cache: bool = True):
+        self.use_cache = use_cache
+    
+    def detect_from_dir(self, model_dir: str, keep_adapter: bool = False) -> Dict[str, Any]:
+        """从model_dir识别framework、family和原始格式（相同指纹的目录直接命中缓存）
+
+        keep_adapter=True 时，若识别过程中完整加载了模型，结果中的 "adapter"
+        为持有该模型的adapter，可直接传给 execute_optimize 避免再次加载
+        """
         if not model_dir or not os.path.exists(model_dir):
             raise ValueError(f"Model directory not found: {model_dir}")
         
         if not os.path.isdir(model_dir):
             raise ValueError(f"Model directory is not a directory: {model_dir}")
         
+        cache_key = None
+        if self.use_cache:
+            try:
+                cache_key = model_dir_fingerprint(model_dir)
+                cached = get_detection_cache().get(cache_key)
+                if cached:
+                    logger.debug(f"Detection cache hit: {model_dir}")
+                    return dict(cached, model_dir=model_dir, detection_method="cache")
+            except Exception as e:
+                logger.warning(f"Detection cache lookup failed: {e}")
+                cache_key = None
+        
         framework = detect_framework_from_files(model_dir)
-        family = detect_family_from_model(model_dir, framework)
+        family, adapter = _detect_family(model_dir, framework)
+        # generic且没有加载出模型说明加载失败（可能是缺少可选依赖、内存不足等暂时性问题），不写入缓存
+        cacheable = family != "generic" or adapter is not None
+        if adapter is not None and not keep_adapter:
+            adapter.cleanup()
+            adapter = None
         original_format = detect_original_format(model_dir, framework)
         
-        return {
+        detection = {
             "framework": framework,
             "family": family,
             "original_format": original_format,
             "model_dir": model_dir,
             "detection_method": "auto"
         }
+        if cache_key and cacheable:
+            get_detection_cache().put(cache_key, detection)
+        if keep_adapter:
+            detection["adapter"] = adapter
+        return detection
 
 
 class TeacherValidator:
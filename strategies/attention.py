@@ -0,0 +1,96 @@
+"""可拆分的多头注意力：q/k/v/out 投影为独立Linear，供静态量化（SmoothQuant）和注意力头剪枝共用"""
+
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+
+class SplitMultiheadAttention(nn.Module):
+    """与 nn.MultiheadAttention 接口兼容、q/k/v/out 投影为独立 nn.Linear 的多头注意力（可被FX静态量化）
+
+    不返回注意力权重（返回 (输出, None)）；同时声明 _qkv_same_embed_dim=False，
+    nn.TransformerEncoderLayer 据此走普通路径而不是融合kernel
+    """
+
+    _qkv_same_embed_dim = False
+    in_proj_weight = None
+    in_proj_bias = None
+
+    def __init__(self, embed_dim: int, num_heads: int, dropout: float = 0.0, bias: bool = True,
+                 batch_first: bool = False):
+        super().__init__()
+        self.embed_dim = embed_dim
+        self.num_heads = num_heads
+        self.head_dim = embed_dim // num_heads
+        self.dropout = dropout
+        self.batch_first = batch_first
+        self.q_proj = nn.Linear(embed_dim, embed_dim, bias=bias)
+        self.k_proj = nn.Linear(embed_dim, embed_dim, bias=bias)
+        self.v_proj = nn.Linear(embed_dim, embed_dim, bias=bias)
+        self.out_proj = nn.Linear(embed_dim, embed_dim, bias=bias)
+
+    @classmethod
+    def from_float(cls, mha: nn.MultiheadAttention) -> "SplitMultiheadAttention":
+        bias = mha.in_proj_bias is not None
+        module = cls(mha.embed_dim, mha.num_heads, dropout=mha.dropout, bias=bias, batch_first=mha.batch_first)
+        with torch.no_grad():
+            for proj, weight in zip((module.q_proj, module.k_proj, module.v_proj), mha.in_proj_weight.chunk(3)):
+                proj.weight.copy_(weight)
+            if bias:
+                for proj, b in zip((module.q_proj, module.k_proj, module.v_proj), mha.in_proj_bias.chunk(3)):
+                    proj.bias.copy_(b)
+            module.out_proj.weight.copy_(mha.out_proj.weight)
+            if bias:
+                module.out_proj.bias.copy_(mha.out_proj.bias)
+        module.train(mha.training)
+        return module.to(mha.out_proj.weight.device)
+
+    def _heads(self, x: torch.Tensor) -> torch.Tensor:
+        return x.reshape(x.shape[0], x.shape[1], self.num_heads, self.head_dim).transpose(1, 2)
+
+    def forward(self, query: torch.Tensor, key: torch.Tensor, value: torch.Tensor,
+                key_padding_mask: Optional[torch.Tensor] = None, need_weights: bool = True,
+                attn_mask: Optional[torch.Tensor] = None, average_attn_weights: bool = True,
+                is_causal: bool = False) -> Tuple[torch.Tensor, None]:
+        if not self.batch_first:
+            query, key, value = query.transpose(0, 1), key.transpose(0, 1), value.transpose(0, 1)
+        q = self._heads(self.q_proj(query))
+        k = self._heads(self.k_proj(key))
+        v = self._heads(self.v_proj(value))
+        mask = None
+        if attn_mask is not None:
+            # nn.MultiheadAttention 的布尔掩码 True 表示屏蔽，转换为加性掩码
+            mask = attn_mask.float().masked_fill(attn_mask, float("-inf")) if attn_mask.dtype == torch.bool \
+                else attn_mask
+        if key_padding_mask is not None:
+            padding = key_padding_mask[:, None, None, :]
+            padding = torch.zeros_like(padding, dtype=q.dtype).masked_fill(padding, float("-inf")) \
+                if padding.dtype == torch.bool else padding.to(q.dtype)
+            mask = padding if mask is None else mask + padding
+        out = F.scaled_dot_product_attention(q, k, v, attn_mask=mask,
+                                             dropout_p=self.dropout if self.training else 0.0,
+                                             is_causal=is_causal and mask is None)
+        # 头剪枝后 num_heads * head_dim 可小于 embed_dim（out_proj 输入随之缩小）
+        out = out.transpose(1, 2).reshape(q.shape[0], -1, self.num_heads * self.head_dim)
+        out = self.out_proj(out)
+        if not self.batch_first:
+            out = out.transpose(0, 1)
+        return out, None
+
+
+def split_attention(model: nn.Module) -> int:
+    """把模型中的 nn.MultiheadAttention 替换为 SplitMultiheadAttention，返回替换数量"""
+    targets = [(name, m) for name, m in model.named_modules()
+               if isinstance(m, nn.MultiheadAttention) and m._qkv_same_embed_dim
+               and m.bias_k is None and not m.add_zero_attn]
+    for name, mha in targets:
+        parent = model
+        parts = name.split(".")
+        for part in parts[:-1]:
+            parent = getattr(parent, part)
+        setattr(parent, parts[-1], SplitMultiheadAttention.from_float(mha))
+    return len(targets)
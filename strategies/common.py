@@ -2,7 +2,7 @@
 
 import json
 import os
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 
 def clamp(value: float, low: float = 0.0, high: float = 0.9) -> float:
@@ -43,3 +43,35 @@ def evaluate_accuracy(model: Any, data_loader: Any) -> float:
     except Exception:
         return 0.0
 
+
+
+def flatten_outputs(out: Any) -> List[Any]:
+    """把模型输出（张量/tuple/list/dict）展开为浮点张量列表"""
+    import torch
+
+    if isinstance(out, torch.Tensor):
+        return [out.float()] if out.is_floating_point() else []
+    if isinstance(out, dict):
+        out = list(out.values())
+    if isinstance(out, (list, tuple)):
+        return [t for item in out for t in flatten_outputs(item)]
+    return []
+
+
+def probe_batch(calib_dir: Optional[str], shape: Tuple[int, ...], info: Dict[str, Any],
+                samples: int) -> Tuple[Any, str]:
+    """校准批次（共用解码缓存）及其缓存key；无校准数据时使用固定种子的随机输入"""
+    import torch
+
+    if calib_dir:
+        try:
+            from utils.calibration import get_calibration_set
+
+            calib_set = get_calibration_set(calib_dir, input_shape=shape, max_samples=samples)
+            info.update(calib_set.info())
+            return torch.cat(list(calib_set.batches()))[:samples], calib_set.key
+        except Exception as e:
+            info["calibration_error"] = str(e)
+    info["calibration"] = "random_data"
+    generator = torch.Generator().manual_seed(0)
+    return torch.randn(samples, *shape[1:], generator=generator), "random"
@@ -0,0 +1,134 @@
+"""Conv-BN 融合：把 BatchNorm2d 折叠进前面的 Conv2d 权重
+
+用 torch.fx 追踪模型数据流，找出输出只被一个 BatchNorm2d 使用的 Conv2d，
+用 BN 的推理统计量重写卷积的权重和偏置，BN 替换为 nn.Identity。模块层级和类名保持不变，
+完整模型序列化、剪枝手术等按名称访问子模块的逻辑不受影响。
+整体无法追踪时（如含动态控制流的检测模型）逐级对子模块追踪。
+
+卷积后的ReLU保留为独立模块：BN折叠后，FX静态量化（prepare_fx）、TorchScript冻结和ONNX Runtime
+都会把 Conv+ReLU 合并为单个kernel。FX量化前用 strip_identity 去掉图中占位的 Identity，
+否则 Conv 与 ReLU 之间隔着一个节点无法匹配融合模式。融合后的模型只能用于推理（BN的训练统计不再更新）。
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+# 默认融合的CNN类模型家族（导出和静态量化前自动执行）
+FUSE_FAMILIES = ("resnet", "vgg", "cnn", "van", "inceptionv4", "yolo")
+
+
+def _get_module(model: Any, name: str) -> Any:
+    for part in name.split("."):
+        model = getattr(model, part)
+    return model
+
+
+def _set_module(model: Any, name: str, new_module: Any) -> None:
+    parent = model
+    parts = name.split(".")
+    for part in parts[:-1]:
+        parent = getattr(parent, part)
+    setattr(parent, parts[-1], new_module)
+
+
+def _conv_bn_pairs(gm: Any) -> Tuple[List[Tuple[str, str, bool]], Counter]:
+    """在追踪图中查找 (conv名称, bn名称, bn后是否为ReLU)，以及各模块被调用的次数"""
+    import torch
+    import torch.nn as nn
+    import torch.nn.functional as F
+
+    modules = dict(gm.named_modules())
+    calls = Counter(n.target for n in gm.graph.nodes if n.op == "call_module")
+    pairs = []
+    for node in gm.graph.nodes:
+        if node.op != "call_module" or not isinstance(modules.get(node.target), nn.BatchNorm2d):
+            continue
+        src = node.args[0] if node.args else None
+        if getattr(src, "op", None) != "call_module" or type(modules.get(src.target)) is not nn.Conv2d:
+            continue
+        if len(src.users) != 1:
+            continue
+        users = list(node.users)
+        relu = len(users) == 1 and (
+            (users[0].op == "call_module" and isinstance(modules.get(users[0].target), nn.ReLU))
+            or (users[0].op == "call_function" and users[0].target in (F.relu, torch.relu)))
+        pairs.append((src.target, node.target, relu))
+    return pairs, calls
+
+
+def _fuse_traced(model: Any, prefix: str, module: Any, stats: Dict[str, int]) -> None:
+    """追踪module并融合其中的Conv-BN；追踪失败时递归处理子模块"""
+    import torch.fx as fx
+    import torch.nn as nn
+    from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+    try:
+        gm = fx.symbolic_trace(module)
+    except Exception:
+        for name, child in module.named_children():
+            if any(True for _ in child.children()):
+                _fuse_traced(model, f"{prefix}{name}.", child, stats)
+        return
+
+    pairs, calls = _conv_bn_pairs(gm)
+    for conv_name, bn_name, relu in pairs:
+        # 被多处调用的共享模块无法单独改写
+        if calls[conv_name] > 1 or calls[bn_name] > 1:
+            stats["skipped"] += 1
+            continue
+        conv = _get_module(module, conv_name)
+        bn = _get_module(module, bn_name)
+        if not bn.track_running_stats or bn.running_mean is None:
+            stats["skipped"] += 1
+            continue
+        _set_module(model, prefix + conv_name, fuse_conv_bn_eval(conv, bn))
+        _set_module(model, prefix + bn_name, nn.Identity())
+        stats["fused"] += 1
+        stats["with_relu"] += int(relu)
+
+
+def fuse_conv_bn(model: Any) -> Tuple[Any, Optional[Dict[str, Any]]]:
+    """原地融合模型中的 Conv2d+BatchNorm2d，返回 (模型, 信息)；没有可融合的层时信息为None"""
+    try:
+        import torch
+        import torch.nn as nn
+    except Exception:
+        return model, None
+    if not isinstance(model, nn.Module):
+        return model, None
+    if not any(isinstance(m, nn.BatchNorm2d) for m in model.modules()):
+        return model, None
+
+    model.eval()
+    stats = {"fused": 0, "with_relu": 0, "skipped": 0}
+    with torch.no_grad():
+        _fuse_traced(model, "", model, stats)
+    if not stats["fused"]:
+        return model, None
+    model._conv_bn_fused = True
+    return model, {"conv_bn_fused": stats["fused"], "conv_bn_relu": stats["with_relu"],
+                   "conv_bn_skipped": stats["skipped"]}
+
+
+def strip_identity(model: Any) -> Any:
+    """返回去掉折叠BN所留 nn.Identity 节点的 GraphModule（模块层级不变）；未融合或无法追踪时原样返回"""
+    if not getattr(model, "_conv_bn_fused", False):
+        return model
+    try:
+        import torch.fx as fx
+        import torch.nn as nn
+
+        gm = fx.symbolic_trace(model)
+    except Exception:
+        return model
+    for node in list(gm.graph.nodes):
+        if node.op == "call_module" and isinstance(gm.get_submodule(node.target), nn.Identity):
+            node.replace_all_uses_with(node.args[0])
+            gm.graph.erase_node(node)
+    gm.graph.lint()
+    gm.recompile()
+    gm.delete_all_unused_submodules()
+    gm._conv_bn_fused = True
+    return gm
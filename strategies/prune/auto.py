@@ -2,9 +2,19 @@
 
 from typing import Any, Dict, Optional, Tuple
 
+from evaluators.latency import default_input_shape
+
+from strategies.prune.nm_sparse import apply_nm_sparsity, parse_nm
+from strategies.prune.search import search_sparsity
+from strategies.prune.sensitivity import apply_layerwise
 from strategies.prune.structured import apply_structured, select_sparsity
 from strategies.prune.unstructured import apply_unstructured
 
+try:
+    from strategies.prune.heads import apply_head_pruning
+except ImportError:
+    apply_head_pruning = None
+
 
 def _get_model_size_mb(model: Any) -> float:
     """估算模型大小（MB）"""
@@ -68,7 +78,9 @@ def decide_and_apply_prune(
     
     Args:
         model: 待剪枝模型
-        cfg: 剪枝配置（type/target_sparsity/search_space/flops_reduction/constraints）
+        cfg: 剪枝配置（type(auto/structured/unstructured/nm_sparse/heads)/pattern/head_sparsity/ffn_sparsity/target_sparsity/search_space/flops_reduction/constraints/physical/
+             target_latency_ms/target_size_mb/max_error/max_probes/
+             layerwise/flops_reduction/params_reduction/sweep_ratios）
         family: 模型家族
         
     Returns:
@@ -87,7 +99,7 @@ def decide_and_apply_prune(
     
     if ptype == "auto":
         if family_lower in ["transformer", "vit", "bert"]:
-            ptype, reason = "unstructured", "Transformer models prefer unstructured pruning for attention layers"
+            ptype, reason = "heads", "Transformer models prune attention heads and FFN neurons for real speedup"
         elif family_lower in ["lstm", "rnn"]:
             ptype, reason = "unstructured", "LSTM/RNN models use unstructured pruning on Linear layers only"
         elif family_lower in ["gcn", "vae"]:
@@ -103,7 +115,7 @@ def decide_and_apply_prune(
         tgt = select_sparsity(
             constraints=constraints if constraints else {"flops_reduction": cfg.get("flops_reduction")},
             search=cfg.get("search"),
-            default=cfg.get("target_sparsity")
+            default=cfg.get("target_sparsity") if cfg.get("target_sparsity") is not None else 0.5
         )
     elif cfg.get("target_sparsity") is not None:
         tgt = float(cfg.get("target_sparsity"))
@@ -114,8 +126,85 @@ def decide_and_apply_prune(
     
     result = None
     fallback_reason = None
+    physical = bool(cfg.get("physical", True))
+    search_info = None
+    if not cfg.get("layerwise") and (cfg.get("target_latency_ms") is not None or cfg.get("target_size_mb") is not None):
+        if ptype == "structured" and physical:
+            try:
+                search_info = search_sparsity(
+                    model,
+                    lambda m, s: apply_structured(m, target_sparsity=s, physical=True),
+                    family=family_lower,
+                    target_latency_ms=cfg.get("target_latency_ms"),
+                    target_size_mb=cfg.get("target_size_mb"),
+                    val_dir=cfg.get("val_data_dir"),
+                    max_error=cfg.get("max_error"),
+                    max_probes=int(cfg.get("max_probes") or 8),
+                )
+                tgt = search_info["sparsity"]
+                reason += f", sparsity {tgt:.3f} from measured {'latency' if cfg.get('target_latency_ms') is not None else 'size'} search"
+                if not search_info["met"]:
+                    fallback_reason = "Target not reached at maximum sparsity"
+                elif search_info.get("fidelity_ok") is False:
+                    fallback_reason = (f"Output error {search_info['output_error']:.4f} on val_data exceeds "
+                                       f"max_error {search_info['max_error']}; fine-tune or relax the target")
+            except Exception as e:
+                fallback_reason = f"Sparsity search failed ({e}), using sparsity {tgt:.2f}"
+        else:
+            fallback_reason = f"Latency/size search needs physical structured pruning, using sparsity {tgt:.2f}"
     
-    if ptype == "unstructured":
+    if ptype == "nm_sparse":
+        skipped = {"chosen_strategy": "nm_sparse", "status": "skipped", "target_sparsity": 0.0}
+        try:
+            n, m = parse_nm(cfg.get("pattern"), cfg.get("n"), cfg.get("m"))
+        except ValueError as e:
+            return {**skipped, "fallback_reason": str(e)}
+        result = apply_nm_sparsity(model, n, m)
+        if not result:
+            return {**skipped, "pattern": f"{n}:{m}",
+                    "fallback_reason": f"No Linear/Conv2d layer has an input dim divisible by {m}, model left dense"}
+        reason += f", {n}:{m} semi-structured sparsity on Linear/Conv2d"
+    elif ptype == "heads":
+        # 注意力头/FFN神经元物理删除，没有可识别的结构时回退为非结构化剪枝
+        if apply_head_pruning is not None:
+            try:
+                result = apply_head_pruning(
+                    model,
+                    head_sparsity=float(cfg.get("head_sparsity", tgt)),
+                    ffn_sparsity=cfg.get("ffn_sparsity"),
+                    calib_dir=cfg.get("calib_dir") or cfg.get("val_data_dir"),
+                    input_shape=default_input_shape(family_lower),
+                )
+            except Exception as e:
+                fallback_reason = f"Head pruning failed ({e}), using unstructured pruning"
+        if result:
+            reason += ", importance scored on calibration data"
+        else:
+            fallback_reason = fallback_reason or "No prunable attention heads or FFN layers, using unstructured pruning"
+            ptype = "unstructured"
+    elif cfg.get("layerwise"):
+        # 敏感度驱动的逐层比例：目标为 flops_reduction / params_reduction，未给出时按稀疏度作为削减目标
+        metric = "params" if cfg.get("params_reduction") is not None or ptype == "unstructured" else "flops"
+        target = cfg.get(f"{metric}_reduction")
+        if ptype == "structured" and not physical:
+            fallback_reason = "Layerwise structured pruning needs physical=true, using uniform sparsity"
+        else:
+            try:
+                result = apply_layerwise(
+                    model,
+                    mode=ptype,
+                    metric=metric,
+                    target=tgt if target is None else float(target),
+                    calib_dir=cfg.get("calib_dir") or cfg.get("val_data_dir"),
+                    input_shape=default_input_shape(family_lower),
+                    ratios=cfg.get("sweep_ratios"),
+                )
+                if result:
+                    reason += f", per-layer ratios from sensitivity sweep ({metric} target)"
+            except Exception as e:
+                fallback_reason = f"Layerwise sensitivity pruning failed ({e}), using uniform sparsity"
+
+    if not result and ptype == "unstructured":
         module_types = None
         if family_lower in ["lstm", "rnn", "gcn"]:
             try:
@@ -126,11 +215,11 @@ def decide_and_apply_prune(
                 pass
         result = apply_unstructured(model, target_sparsity=tgt, module_types=module_types)
         if not result:
-            result = apply_structured(model, target_sparsity=tgt)
+            result = apply_structured(model, target_sparsity=tgt, physical=physical)
             if result:
                 ptype, reason = "structured", "Fallback to structured pruning (BN-based by default)"
-    else:
-        result = apply_structured(model, target_sparsity=tgt)
+    elif not result and ptype != "nm_sparse":
+        result = apply_structured(model, target_sparsity=tgt, physical=physical)
         if not result:
             result = apply_unstructured(model, target_sparsity=tgt)
             if result:
@@ -146,7 +235,26 @@ def decide_and_apply_prune(
         })
         if fallback_reason:
             result["fallback_reason"] = fallback_reason
-        if ptype == "structured":
+        if search_info:
+            result["search"] = search_info
+        if ptype == "structured" and result.get("method") == "dependency_graph":
+            result["note"] = (f"Removed {result['channels_removed']} channels in {result['groups_pruned']} coupled groups "
+                              f"({result['layers_shrunk']} layers shrunk, params -{result['param_reduction']:.1%}); "
+                              f"{result['groups_frozen']} groups touching model/block boundaries or "
+                              f"unsupported ops were left intact")
+        elif ptype == "structured" and result.get("channels_removed"):
+            result["note"] = (f"Removed {result['channels_removed']} channels from {result['layers_shrunk']} layers; "
+                              f"{result.get('layers_skipped', 0)} layers (residual/concat paths) keep zeroed filters")
+        elif ptype == "structured":
             result["note"] = "Structured pruning masks parameters. To reduce file size, rebuild model or export to ONNX/TensorRT"
+        elif ptype == "heads":
+            result["note"] = (f"Removed {result['heads_before'] - result['heads_after']}/{result['heads_before']} "
+                              f"attention heads and {result['ffn_neurons_before'] - result['ffn_neurons_after']}/"
+                              f"{result['ffn_neurons_before']} FFN neurons (params -{result['param_reduction']:.1%}); "
+                              f"fine-tune to recover accuracy")
+        elif ptype == "nm_sparse":
+            result["note"] = (f"{result['layers_skipped']} layers whose input dim is not a multiple of "
+                              f"{result['pattern'].split(':')[1]} stay dense; compact weights are saved as "
+                              f"<name>.sparse.safetensors (nm layout)")
     
     return result
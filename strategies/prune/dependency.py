@@ -0,0 +1,396 @@
+"""依赖图结构化剪枝：按耦合通道组物理删除卷积通道
+
+用 torch.fx 追踪模型，为每个 Conv2d 的输出建立一个"通道空间"，沿数据流传播：
+- BatchNorm / 逐元素激活 / 池化 / 上采样 / Dropout 不改变通道空间
+- 残差相加、逐通道相乘（add/mul）把两侧的通道空间合并为同一组（必须删除相同的通道）
+- 通道维拼接（cat dim=1）把多个空间按顺序拼接，下游卷积按偏移同步删除输入通道
+- depthwise 卷积（groups == in == out）输入输出共享同一空间，随之缩小
+- 普通分组卷积、chunk/split、reshape、模型输出等无法安全改形状的位置，涉及的空间整组冻结
+
+每个未冻结的组按成员卷积的重要性（后接BN时用 |gamma|，否则用滤波器L1范数，逐成员归一化后求和）
+保留前 (1 - amount) 的通道，并同步缩小生产者卷积、BN、depthwise卷积和所有消费者（卷积输入、flatten后的Linear）。
+整体无法追踪时（如检测模型的动态前向）逐级追踪子模块，子模块的输入输出视为冻结边界。
+"""
+
+from __future__ import annotations
+
+import operator
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from .surgery import (
+        _passthrough_kinds, _set_module, _shrink_bn, _shrink_linear_in, keep_count, rebuild_conv,
+    )
+except ImportError:
+    from strategies.prune.surgery import (
+        _passthrough_kinds, _set_module, _shrink_bn, _shrink_linear_in, keep_count, rebuild_conv,
+    )
+
+
+class _ChannelGraph:
+    """通道空间、合并关系与各模块对空间的使用情况"""
+
+    def __init__(self) -> None:
+        self.sizes: List[int] = []
+        self.parent: List[int] = []
+        self.frozen: set = set()
+        self.producer: Dict[int, str] = {}
+        self.bns: List[Tuple[str, List[int]]] = []
+        self.depthwise: List[Tuple[str, List[int]]] = []
+        self.consumers: List[Tuple[str, str, List[int], int]] = []
+
+    def new_space(self, size: int, producer: Optional[str] = None) -> int:
+        sid = len(self.sizes)
+        self.sizes.append(size)
+        self.parent.append(sid)
+        if producer is None:
+            self.frozen.add(sid)
+        else:
+            self.producer[sid] = producer
+        return sid
+
+    def find(self, sid: int) -> int:
+        while self.parent[sid] != sid:
+            self.parent[sid] = self.parent[self.parent[sid]]
+            sid = self.parent[sid]
+        return sid
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[rb] = ra
+
+    def freeze(self, ids: List[int]) -> None:
+        self.frozen.update(ids)
+
+    def frozen_roots(self) -> set:
+        return {self.find(s) for s in self.frozen}
+
+
+# 节点值：("map", 空间列表, 自适应池化后的空间大小或None) / ("flat", 空间列表, 每通道特征数) / None（非通道张量）
+def _values_in(arg: Any, values: Dict[Any, Any]) -> List[Any]:
+    import torch.fx as fx
+
+    if isinstance(arg, fx.Node):
+        return [values.get(arg)]
+    if isinstance(arg, (list, tuple)):
+        return [v for a in arg for v in _values_in(a, values)]
+    if isinstance(arg, dict):
+        return [v for a in arg.values() for v in _values_in(a, values)]
+    return []
+
+
+def _tensor_args(node: Any) -> List[Any]:
+    import torch.fx as fx
+
+    found: List[Any] = []
+
+    def collect(arg: Any) -> None:
+        if isinstance(arg, fx.Node):
+            found.append(arg)
+        elif isinstance(arg, (list, tuple)):
+            for a in arg:
+                collect(a)
+        elif isinstance(arg, dict):
+            for a in arg.values():
+                collect(a)
+
+    collect(node.args)
+    collect(node.kwargs)
+    return found
+
+
+def _arg(node: Any, index: int, name: str, default: Any = None) -> Any:
+    if len(node.args) > index:
+        return node.args[index]
+    return node.kwargs.get(name, default)
+
+
+def build_channel_graph(gm: Any) -> _ChannelGraph:
+    """沿FX图传播通道空间，记录合并关系、冻结位置和需要同步缩小的模块"""
+    import torch
+    import torch.nn as nn
+    import torch.nn.functional as F
+
+    graph = _ChannelGraph()
+    modules = dict(gm.named_modules())
+    calls = Counter(n.target for n in gm.graph.nodes if n.op == "call_module")
+    pass_mods, pass_funcs, pass_methods = _passthrough_kinds()
+    pass_mods = pass_mods + (nn.Upsample, nn.BatchNorm2d)
+    pass_funcs = pass_funcs | {F.interpolate}
+    binary = {operator.add, operator.iadd, operator.mul, operator.imul, operator.sub, torch.add, torch.mul, torch.sub}
+    binary_methods = {"add", "add_", "mul", "mul_", "sub"}
+    values: Dict[Any, Any] = {}
+
+    def freeze_inputs(node: Any) -> None:
+        for value in _values_in((node.args, node.kwargs), values):
+            if value is not None:
+                graph.freeze(value[1])
+
+    for node in gm.graph.nodes:
+        inputs = _values_in(node.args[:1], values)
+        first = inputs[0] if inputs else None
+        out = None
+
+        if node.op == "placeholder":
+            out = ("map", [graph.new_space(0)], None)
+        elif node.op == "get_attr":
+            out = None
+        elif node.op == "output":
+            freeze_inputs(node)
+        elif node.op == "call_module":
+            mod = modules.get(node.target)
+            shared = calls[node.target] > 1
+            if isinstance(mod, nn.Conv2d):
+                usable = first is not None and first[0] == "map" and not shared
+                if mod.groups == 1:
+                    if usable and all(graph.sizes[s] > 0 for s in first[1]) \
+                            and sum(graph.sizes[s] for s in first[1]) == mod.in_channels:
+                        graph.consumers.append((node.target, "conv", first[1], 1))
+                    else:
+                        freeze_inputs(node)
+                    out = ("map", [graph.new_space(mod.out_channels, None if shared else node.target)], None)
+                elif usable and mod.groups == mod.in_channels == mod.out_channels:
+                    graph.depthwise.append((node.target, first[1]))
+                    out = ("map", first[1], None)
+                else:
+                    freeze_inputs(node)
+                    out = ("map", [graph.new_space(mod.out_channels)], None)
+            elif isinstance(mod, nn.BatchNorm2d):
+                if first is not None and first[0] == "map" and not shared:
+                    graph.bns.append((node.target, first[1]))
+                    out = first
+                else:
+                    freeze_inputs(node)
+            elif isinstance(mod, (nn.AdaptiveAvgPool2d, nn.AdaptiveMaxPool2d)) and first is not None \
+                    and first[0] == "map":
+                size = mod.output_size if isinstance(mod.output_size, tuple) else (mod.output_size, mod.output_size)
+                out = ("map", first[1], None if None in size else int(size[0]) * int(size[1]))
+            elif isinstance(mod, nn.Flatten) and first is not None and first[0] == "map" \
+                    and first[2] is not None and mod.start_dim == 1:
+                out = ("flat", first[1], first[2])
+            elif isinstance(mod, nn.Linear) and first is not None and first[0] == "flat" and not shared \
+                    and sum(graph.sizes[s] for s in first[1]) * first[2] == mod.in_features:
+                graph.consumers.append((node.target, "linear", first[1], first[2]))
+            elif isinstance(mod, pass_mods) and first is not None and len(_tensor_args(node)) == 1:
+                out = first
+            else:
+                freeze_inputs(node)
+        elif node.op in ("call_function", "call_method"):
+            target = node.target
+            tensors = _tensor_args(node)
+            if target in binary or target in binary_methods:
+                channel = [values.get(t) for t in tensors if values.get(t) is not None]
+                unknown = [t for t in tensors if values.get(t) is None]
+                if len(channel) == 2 and not unknown and channel[0][0] == channel[1][0] == "map" \
+                        and len(channel[0][1]) == len(channel[1][1]) \
+                        and all(graph.sizes[a] == graph.sizes[b] for a, b in zip(channel[0][1], channel[1][1])):
+                    for a, b in zip(channel[0][1], channel[1][1]):
+                        graph.union(a, b)
+                    out = channel[0]
+                elif len(channel) == 1 and not unknown:
+                    out = channel[0]
+                else:
+                    freeze_inputs(node)
+            elif target is torch.cat or target == "cat":
+                parts = _values_in(_arg(node, 0, "tensors"), values)
+                dim = _arg(node, 1, "dim", 0)
+                if dim in (1, -3) and parts and all(p is not None and p[0] == "map" for p in parts):
+                    out = ("map", [s for p in parts for s in p[1]], None)
+                else:
+                    freeze_inputs(node)
+            elif target is torch.flatten or target == "flatten":
+                start = _arg(node, 1, "start_dim", 0)
+                if first is not None and first[0] == "map" and first[2] is not None and start == 1:
+                    out = ("flat", first[1], first[2])
+                else:
+                    freeze_inputs(node)
+            elif target in (F.adaptive_avg_pool2d, F.adaptive_max_pool2d) and first is not None and first[0] == "map":
+                size = _arg(node, 1, "output_size")
+                size = size if isinstance(size, tuple) else (size, size)
+                hw = int(size[0]) * int(size[1]) if all(isinstance(v, int) for v in size) else None
+                out = ("map", first[1], hw)
+            elif (target in pass_funcs or target in pass_methods) and len(tensors) == 1:
+                out = first
+            elif target in ("size", "dim") or target is getattr:
+                out = None
+            else:
+                freeze_inputs(node)
+        values[node] = out
+    return graph
+
+
+def _importance(graph: _ChannelGraph, sid: int, modules: Dict[str, Any]) -> Any:
+    """单个通道空间的通道重要性：后接BN用 |gamma|，否则用生产者滤波器L1范数（按均值归一化）"""
+    score = None
+    for bn_name, ids in graph.bns:
+        bn = modules[bn_name]
+        if ids == [sid] and bn.affine:
+            score = bn.weight.detach().abs().float()
+            break
+    if score is None:
+        conv = modules[graph.producer[sid]]
+        score = conv.weight.detach().abs().flatten(1).sum(1).float()
+    return score / (score.mean() + 1e-12)
+
+
+def _index(graph: _ChannelGraph, ids: List[int], keep: Dict[int, Any]) -> Any:
+    """拼接输入中保留的通道下标（冻结或未剪枝的空间全部保留）"""
+    import torch
+
+    parts, offset = [], 0
+    for sid in ids:
+        root = graph.find(sid)
+        kept = keep.get(root)
+        parts.append((kept if kept is not None else torch.arange(graph.sizes[sid])) + offset)
+        offset += graph.sizes[sid]
+    return torch.cat(parts) if parts else torch.zeros(0, dtype=torch.long)
+
+
+def _prune_graph(module: Any, graph: _ChannelGraph, amount: float, stats: Dict[str, int], prefix: str = "",
+                 ratios: Optional[Dict[str, float]] = None,
+                 listing: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """在一个已分析的模块内按耦合组选择保留通道，返回 {子模块名: 新模块}（不修改module）
+
+    组名为组内第一个生产者卷积的完整模块名；ratios 中给出的组按各自比例剪枝，其余组按 amount。
+    listing 不为None时追加每个组的描述（name/channels/members/frozen）
+    """
+    import torch
+
+    modules = dict(module.named_modules())
+    groups: Dict[int, List[int]] = {}
+    for sid in graph.producer:
+        groups.setdefault(graph.find(sid), []).append(sid)
+
+    frozen = graph.frozen_roots()
+    keep: Dict[int, Any] = {}
+    for root, members in groups.items():
+        stats["groups"] += 1
+        name = prefix + graph.producer[min(members)]
+        if listing is not None:
+            listing.append({"name": name, "channels": graph.sizes[root], "frozen": root in frozen,
+                            "members": [prefix + graph.producer[s] for s in sorted(members)]})
+        if root in frozen:
+            stats["groups_frozen"] += 1
+            continue
+        size = graph.sizes[root]
+        count = keep_count(size, ratios.get(name, amount) if ratios else amount)
+        if count >= size:
+            continue
+        score = sum(_importance(graph, sid, modules) for sid in members)
+        keep[root] = torch.topk(score, count).indices.sort().values
+        stats["groups_pruned"] += 1
+        stats["channels_removed"] += (size - count) * len(members)
+    if not keep:
+        return {}
+
+    out_idx = {graph.producer[s]: keep[graph.find(s)] for s in graph.producer if graph.find(s) in keep}
+    in_idx = {name: _index(graph, ids, keep) for name, kind, ids, _ in graph.consumers
+              if kind == "conv" and any(graph.find(s) in keep for s in ids)}
+    replacements: Dict[str, Any] = {}
+    for name in set(out_idx) | set(in_idx):
+        replacements[name] = rebuild_conv(modules[name], out_idx.get(name), in_idx.get(name))
+    for name, ids in graph.depthwise:
+        if any(graph.find(s) in keep for s in ids):
+            replacements[name] = rebuild_conv(modules[name], _index(graph, ids, keep), None, depthwise=True)
+    for name, ids in graph.bns:
+        if any(graph.find(s) in keep for s in ids):
+            bn = modules[name]
+            replacements[name] = _shrink_bn(bn, _index(graph, ids, keep).to(next(iter(bn.buffers())).device))
+    for name, kind, ids, spatial in graph.consumers:
+        if kind == "linear" and any(graph.find(s) in keep for s in ids):
+            linear = modules[name]
+            replacements[name] = _shrink_linear_in(linear, _index(graph, ids, keep).to(linear.weight.device), spatial)
+    return replacements
+
+
+def _analyze(module: Any, prefix: str, analysis: List[Tuple[str, _ChannelGraph]]) -> None:
+    """追踪module并建立通道依赖图；追踪失败时递归处理子模块"""
+    import torch.fx as fx
+
+    try:
+        gm = fx.symbolic_trace(module)
+    except Exception:
+        for name, child in module.named_children():
+            if any(True for _ in child.children()):
+                _analyze(child, f"{prefix}{name}.", analysis)
+        return
+    try:
+        analysis.append((prefix, build_channel_graph(gm)))
+    except Exception:
+        pass
+
+
+def analyze_channels(model: Any) -> List[Tuple[str, _ChannelGraph]]:
+    """[(子模块前缀, 通道依赖图)]；只记录模块名称，可复用于同结构的模型副本
+
+    torch.fx 追踪会临时替换全局的 Module.__call__，不能与其它线程中的前向并行；
+    需要并行剪枝多个副本时先在主线程分析一次，再把结果传给 prune_channel_groups
+    """
+    analysis: List[Tuple[str, _ChannelGraph]] = []
+    _analyze(model, "", analysis)
+    return analysis
+
+
+def _apply_analysis(model: Any, analysis: List[Tuple[str, _ChannelGraph]], amount: float, stats: Dict[str, int],
+                    ratios: Optional[Dict[str, float]] = None,
+                    listing: Optional[List[Dict[str, Any]]] = None) -> None:
+    for prefix, graph in analysis:
+        module = model.get_submodule(prefix[:-1]) if prefix else model
+        local = dict.fromkeys(stats, 0)
+        try:
+            replacements = _prune_graph(module, graph, amount, local, prefix, ratios, listing)
+        except Exception:
+            continue
+        for name, new_module in replacements.items():
+            _set_module(module, name, new_module)
+        local["layers_shrunk"] = len(replacements)
+        for key, value in local.items():
+            stats[key] += value
+
+
+def _new_stats() -> Dict[str, int]:
+    return {"groups": 0, "groups_pruned": 0, "groups_frozen": 0, "channels_removed": 0, "layers_shrunk": 0}
+
+
+def channel_groups(model: Any, analysis: Optional[List[Tuple[str, _ChannelGraph]]] = None) -> List[Dict[str, Any]]:
+    """列出模型的耦合通道组（不修改模型）：[{"name", "channels", "members", "frozen"}]"""
+    listing: List[Dict[str, Any]] = []
+    _apply_analysis(model, analyze_channels(model) if analysis is None else analysis, 0.0, _new_stats(),
+                    listing=listing)
+    return listing
+
+
+def prune_channel_groups(model: Any, amount: float, ratios: Optional[Dict[str, float]] = None,
+                         analysis: Optional[List[Tuple[str, _ChannelGraph]]] = None) -> Optional[Dict[str, Any]]:
+    """按依赖图耦合组物理剪枝卷积通道（原地修改），没有可剪的组时返回None
+
+    ratios: {组名: 剪枝比例}，按组指定非均匀比例（未列出的组使用 amount）
+    analysis: analyze_channels 的结果（同结构模型的副本可复用，省去重新追踪）
+    """
+    try:
+        import torch.nn as nn
+    except Exception:
+        return None
+    if not isinstance(model, nn.Module) or not any(isinstance(m, nn.Conv2d) for m in model.modules()):
+        return None
+
+    params_before = sum(p.numel() for p in model.parameters())
+    stats = _new_stats()
+    _apply_analysis(model, analyze_channels(model) if analysis is None else analysis, amount, stats, ratios=ratios)
+    if not stats["groups_pruned"]:
+        return None
+    params_after = sum(p.numel() for p in model.parameters())
+    return {
+        "method": "dependency_graph",
+        "channel_groups": stats["groups"],
+        "groups_pruned": stats["groups_pruned"],
+        "groups_frozen": stats["groups_frozen"],
+        "channels_removed": stats["channels_removed"],
+        "layers_shrunk": stats["layers_shrunk"],
+        "layers_skipped": stats["groups_frozen"],
+        "params_before": params_before,
+        "params_after": params_after,
+        "param_reduction": round(1 - params_after / params_before, 4) if params_before else 0.0,
+    }
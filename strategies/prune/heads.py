@@ -0,0 +1,340 @@
+"""Transformer 注意力头与FFN神经元结构化剪枝
+
+非结构化剪枝只把权重置零，Transformer/ViT 推理不会变快。这里按校准数据上的重要性物理删除：
+- 注意力头：nn.MultiheadAttention 先拆成 q/k/v/out 四个 Linear（SplitMultiheadAttention），
+  timm 风格的注意力（qkv + proj Linear、num_heads）替换为 HeadPrunedAttention；
+  头 h 的重要性为其经输出投影后的贡献 ||W_out[:, h] · ctx_h||² 在校准token上的均值，
+  每层保留前 (1 - head_sparsity) 个头（至少1个），q/k/v 的输出行和输出投影的输入列同步删除
+- FFN神经元：Linear→激活→Linear（nn.TransformerEncoderLayer 的 linear1/linear2、torchvision MLPBlock、
+  timm Mlp 的 fc1/fc2）以及 1x1卷积→depthwise卷积→激活→1x1卷积（VAN MLP），
+  神经元 j 的重要性为 mean|a_j| · ||W2[:, j]||，保留数对齐到8的倍数
+
+头维度和残差流宽度不变，LayerNorm、位置编码和模型输入输出保持原形状。
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+try:
+    from ..attention import SplitMultiheadAttention, split_attention
+    from ..common import flatten_outputs, probe_batch
+    from .sensitivity import DEFAULT_SENSITIVITY_SAMPLES
+    from .surgery import _set_module, keep_count, rebuild_conv
+except ImportError:
+    from strategies.attention import SplitMultiheadAttention, split_attention
+    from strategies.common import flatten_outputs, probe_batch
+    from strategies.prune.sensitivity import DEFAULT_SENSITIVITY_SAMPLES
+    from strategies.prune.surgery import _set_module, keep_count, rebuild_conv
+
+try:
+    from strategies.quant.sensitivity import output_error
+except ImportError:
+    output_error = None
+
+# 输入为序列（首层是Linear）时随机校准输入的序列长度
+_SEQ_LEN = 32
+_ELEMENTWISE = (nn.Identity, nn.Dropout, nn.GELU, nn.ReLU, nn.ReLU6, nn.SiLU, nn.Hardswish,
+                nn.Tanh, nn.Sigmoid, nn.Mish, nn.LeakyReLU)
+# timm 等库自定义的无参数逐元素模块
+_ELEMENTWISE_NAMES = {"GELU", "GELUTanh", "QuickGELU", "Swish", "DropPath"}
+
+
+class HeadPrunedAttention(nn.Module):
+    """头剪枝后的 timm 风格注意力：qkv 输出 3 * num_heads * head_dim，proj 输入 num_heads * head_dim"""
+
+    def __init__(self, attn: nn.Module, keep: torch.Tensor):
+        super().__init__()
+        heads, head_dim = attn.num_heads, attn.proj.in_features // attn.num_heads
+        self.num_heads = len(keep)
+        self.head_dim = head_dim
+        self.scale = float(getattr(attn, "scale", head_dim ** -0.5))
+        cols = (keep.unsqueeze(1) * head_dim + torch.arange(head_dim, device=keep.device)).flatten()
+        rows = torch.cat([cols + i * heads * head_dim for i in range(3)])
+        self.qkv = _shrink_linear(attn.qkv, out_idx=rows)
+        self.proj = _shrink_linear(attn.proj, in_idx=cols)
+        for name in ("q_norm", "k_norm", "attn_drop", "proj_drop"):
+            module = getattr(attn, name, None)
+            setattr(self, name, module if isinstance(module, nn.Module) else nn.Identity())
+
+    def forward(self, x: torch.Tensor, attn_mask: Optional[torch.Tensor] = None) -> torch.Tensor:
+        B, N, _ = x.shape
+        qkv = self.qkv(x).reshape(B, N, 3, self.num_heads, self.head_dim).permute(2, 0, 3, 1, 4)
+        q, k, v = qkv.unbind(0)
+        q, k = self.q_norm(q), self.k_norm(k)
+        # scaled_dot_product_attention 默认按 head_dim ** -0.5 缩放，自定义 scale 时折算到 q 上
+        if not math.isclose(self.scale, self.head_dim ** -0.5):
+            q = q * (self.scale * math.sqrt(self.head_dim))
+        dropout = getattr(self.attn_drop, "p", 0.0) if self.training else 0.0
+        x = F.scaled_dot_product_attention(q, k, v, attn_mask=attn_mask, dropout_p=dropout)
+        x = x.transpose(1, 2).reshape(B, N, self.num_heads * self.head_dim)
+        return self.proj_drop(self.proj(x))
+
+
+def _shrink_linear(linear: nn.Linear, out_idx: Optional[torch.Tensor] = None,
+                   in_idx: Optional[torch.Tensor] = None) -> nn.Linear:
+    """按输出/输入下标重建Linear"""
+    device = linear.weight.device
+    weight = linear.weight.data
+    bias = linear.bias.data if linear.bias is not None else None
+    if out_idx is not None:
+        weight = weight.index_select(0, out_idx.to(device))
+        bias = bias.index_select(0, out_idx.to(device)) if bias is not None else None
+    if in_idx is not None:
+        weight = weight.index_select(1, in_idx.to(device))
+    new = nn.Linear(weight.shape[1], weight.shape[0], bias=bias is not None).to(device=device, dtype=weight.dtype)
+    new.weight.data = weight.clone()
+    if bias is not None:
+        new.bias.data = bias.clone()
+    new.train(linear.training)
+    return new
+
+
+def _elementwise(module: nn.Module) -> bool:
+    if isinstance(module, _ELEMENTWISE):
+        return True
+    return (type(module).__name__ in _ELEMENTWISE_NAMES and not list(module.children())
+            and not list(module.parameters()))
+
+
+def _is_timm_attention(module: nn.Module) -> bool:
+    """qkv/proj 两个Linear、整数 num_heads、无额外参数（如BEiT的q_bias）且proj前没有归一化"""
+    qkv, proj, heads = getattr(module, "qkv", None), getattr(module, "proj", None), getattr(module, "num_heads", None)
+    if not isinstance(qkv, nn.Linear) or not isinstance(proj, nn.Linear) or not isinstance(heads, int):
+        return False
+    if proj.in_features % heads or qkv.out_features != 3 * proj.in_features or module._parameters:
+        return False
+    return isinstance(getattr(module, "norm", nn.Identity()), nn.Identity)
+
+
+def _attention_units(model: nn.Module) -> List[Dict[str, Any]]:
+    """可剪头的注意力：{"name", "kind"(split/timm), "proj"(输出投影名称), "heads", "head_dim"}"""
+    units = []
+    for name, module in model.named_modules():
+        if isinstance(module, SplitMultiheadAttention):
+            units.append({"name": name, "kind": "split", "proj": f"{name}.out_proj",
+                          "heads": module.num_heads, "head_dim": module.head_dim})
+        elif isinstance(module, HeadPrunedAttention) or _is_timm_attention(module):
+            units.append({"name": name, "kind": "timm", "proj": f"{name}.proj", "heads": module.num_heads,
+                          "head_dim": module.proj.in_features // module.num_heads})
+    return units
+
+
+def _ffn_pair(module: nn.Module, name: str) -> Optional[Tuple[str, str, List[str]]]:
+    """FFN的 (fc1名称, fc2名称, 中间depthwise卷积名称列表)，不是可剪的FFN时返回None"""
+    prefix = f"{name}." if name else ""
+    if isinstance(getattr(module, "linear1", None), nn.Linear) and isinstance(getattr(module, "linear2", None), nn.Linear):
+        # nn.TransformerEncoderLayer / DecoderLayer：linear2(dropout(activation(linear1(x))))
+        if module.linear1.out_features == module.linear2.in_features:
+            return f"{prefix}linear1", f"{prefix}linear2", []
+        return None
+    if isinstance(module, nn.Sequential):
+        # torchvision MLPBlock：Linear → 逐元素 → Linear → 逐元素
+        children = list(module.named_children())
+        linears = [i for i, (_, child) in enumerate(children) if isinstance(child, nn.Linear)]
+        if len(linears) != 2 or linears[0] != 0:
+            return None
+        if not all(_elementwise(child) for i, (_, child) in enumerate(children) if i not in linears):
+            return None
+        fc1, fc2 = children[linears[0]], children[linears[1]]
+        if fc1[1].out_features != fc2[1].in_features:
+            return None
+        return f"{prefix}{fc1[0]}", f"{prefix}{fc2[0]}", []
+    fc1, fc2 = getattr(module, "fc1", None), getattr(module, "fc2", None)
+    if isinstance(fc1, nn.Linear) and isinstance(fc2, nn.Linear):
+        hidden = fc1.out_features
+        if fc2.in_features != hidden:
+            return None
+    elif isinstance(fc1, nn.Conv2d) and isinstance(fc2, nn.Conv2d):
+        hidden = fc1.out_channels
+        if fc2.in_channels != hidden or fc1.groups != 1 or fc2.groups != 1 \
+                or fc1.kernel_size != (1, 1) or fc2.kernel_size != (1, 1):
+            return None
+    else:
+        return None
+    # timm Mlp / VAN MLP：其余子模块只能是逐元素模块或通道数为hidden的depthwise卷积
+    depthwise = []
+    for child_name, child in module.named_children():
+        if child is fc1 or child is fc2:
+            continue
+        for leaf_name, leaf in child.named_modules():
+            if list(leaf.children()):
+                continue
+            if isinstance(leaf, nn.Conv2d) and leaf.groups == leaf.in_channels == leaf.out_channels == hidden:
+                depthwise.append(f"{prefix}{child_name}" + (f".{leaf_name}" if leaf_name else ""))
+            elif not _elementwise(leaf):
+                return None
+    return f"{prefix}fc1", f"{prefix}fc2", depthwise
+
+
+def _ffn_units(model: nn.Module) -> List[Dict[str, Any]]:
+    units = []
+    for name, module in model.named_modules():
+        pair = _ffn_pair(module, name)
+        if pair is not None:
+            fc1 = model.get_submodule(pair[0])
+            hidden = fc1.out_features if isinstance(fc1, nn.Linear) else fc1.out_channels
+            units.append({"name": name, "fc1": pair[0], "fc2": pair[1], "depthwise": pair[2], "hidden": hidden})
+    return units
+
+
+def _score(model: nn.Module, batch: Any, attention: List[Dict[str, Any]],
+           ffn: List[Dict[str, Any]]) -> Dict[str, torch.Tensor]:
+    """在校准批次上统计每个注意力头和FFN神经元的重要性（按输出投影/fc2的输入计算）"""
+    scores: Dict[str, torch.Tensor] = {}
+    counts: Dict[str, int] = {}
+
+    def head_hook(unit: Dict[str, Any], proj: nn.Linear):
+        def record(_module: Any, inputs: Any) -> None:
+            x = inputs[0].detach().float().reshape(-1, unit["heads"], unit["head_dim"])
+            w = proj.weight.detach().float().reshape(proj.out_features, unit["heads"], unit["head_dim"])
+            contrib = torch.stack([(x[:, h] @ w[:, h].t()).pow(2).sum() for h in range(unit["heads"])])
+            scores[unit["name"]] = scores.get(unit["name"], 0) + contrib
+            counts[unit["name"]] = counts.get(unit["name"], 0) + x.shape[0]
+        return record
+
+    def ffn_hook(unit: Dict[str, Any], fc2: nn.Module):
+        def record(_module: Any, inputs: Any) -> None:
+            x = inputs[0].detach().float()
+            x = x.movedim(1, -1) if isinstance(fc2, nn.Conv2d) else x
+            x = x.reshape(-1, unit["hidden"])
+            scores[unit["name"]] = scores.get(unit["name"], 0) + x.abs().sum(0)
+            counts[unit["name"]] = counts.get(unit["name"], 0) + x.shape[0]
+        return record
+
+    handles = []
+    for unit in attention:
+        proj = model.get_submodule(unit["proj"])
+        handles.append(proj.register_forward_pre_hook(head_hook(unit, proj)))
+    for unit in ffn:
+        fc2 = model.get_submodule(unit["fc2"])
+        handles.append(fc2.register_forward_pre_hook(ffn_hook(unit, fc2)))
+    try:
+        with torch.no_grad():
+            model(batch)
+    finally:
+        for handle in handles:
+            handle.remove()
+
+    for unit in ffn:
+        if unit["name"] in scores:
+            fc2 = model.get_submodule(unit["fc2"])
+            norm = fc2.weight.detach().float().transpose(0, 1).flatten(1).norm(dim=1)
+            scores[unit["name"]] = scores[unit["name"]] / counts[unit["name"]] * norm
+    for unit in attention:
+        if unit["name"] in scores:
+            scores[unit["name"]] = scores[unit["name"]] / counts[unit["name"]]
+    return scores
+
+
+def _prune_heads(model: nn.Module, unit: Dict[str, Any], keep: torch.Tensor) -> None:
+    module = model.get_submodule(unit["name"])
+    if unit["kind"] == "timm":
+        _set_module(model, unit["name"], HeadPrunedAttention(module, keep))
+        return
+    cols = (keep.unsqueeze(1) * unit["head_dim"] + torch.arange(unit["head_dim"], device=keep.device)).flatten()
+    for proj in ("q_proj", "k_proj", "v_proj"):
+        setattr(module, proj, _shrink_linear(getattr(module, proj), out_idx=cols))
+    module.out_proj = _shrink_linear(module.out_proj, in_idx=cols)
+    module.num_heads = len(keep)
+
+
+def _prune_ffn(model: nn.Module, unit: Dict[str, Any], keep: torch.Tensor) -> None:
+    fc1, fc2 = model.get_submodule(unit["fc1"]), model.get_submodule(unit["fc2"])
+    if isinstance(fc1, nn.Linear):
+        _set_module(model, unit["fc1"], _shrink_linear(fc1, out_idx=keep))
+        _set_module(model, unit["fc2"], _shrink_linear(fc2, in_idx=keep))
+        return
+    _set_module(model, unit["fc1"], rebuild_conv(fc1, keep, None))
+    for name in unit["depthwise"]:
+        _set_module(model, name, rebuild_conv(model.get_submodule(name), keep, None, depthwise=True))
+    _set_module(model, unit["fc2"], rebuild_conv(fc2, None, keep))
+
+
+def _input_shape(model: nn.Module, shape: Sequence[int]) -> Tuple[int, ...]:
+    """首个带权重的层为Linear时（序列模型）按 (1, _SEQ_LEN, in_features) 构造输入"""
+    for module in model.modules():
+        if isinstance(module, nn.Linear):
+            return (1, _SEQ_LEN, module.in_features)
+        if isinstance(getattr(module, "weight", None), torch.Tensor) and not list(module.children()):
+            break
+    return tuple(int(v) for v in shape)
+
+
+def apply_head_pruning(
+    model: Any,
+    head_sparsity: float = 0.3,
+    ffn_sparsity: Optional[float] = None,
+    calib_dir: Optional[str] = None,
+    input_shape: Sequence[int] = (1, 3, 224, 224),
+) -> Optional[Dict[str, Any]]:
+    """按校准数据上的重要性删除注意力头和FFN神经元（原地修改model），没有可剪的结构时返回None"""
+    head_sparsity = max(0.0, min(0.9, float(head_sparsity)))
+    ffn_sparsity = head_sparsity if ffn_sparsity is None else max(0.0, min(0.9, float(ffn_sparsity)))
+    # 拆分 nn.MultiheadAttention 数学上等价，拆分后再统计参考输出
+    split = split_attention(model) if head_sparsity > 0 else 0
+    attention = _attention_units(model) if head_sparsity > 0 else []
+    ffn = _ffn_units(model) if ffn_sparsity > 0 else []
+    if not attention and not ffn:
+        return None
+
+    was_training = model.training
+    model.eval()
+    params_before = sum(p.numel() for p in model.parameters())
+    info: Dict[str, Any] = {}
+    batch, _ = probe_batch(calib_dir, _input_shape(model, input_shape), info, DEFAULT_SENSITIVITY_SAMPLES)
+    with torch.no_grad():
+        reference = flatten_outputs(model(batch)) if output_error is not None else None
+    scores = _score(model, batch, attention, ffn)
+
+    heads_before = heads_after = neurons_before = neurons_after = 0
+    with torch.no_grad():
+        for unit in attention:
+            keep_n = max(1, unit["heads"] - int(unit["heads"] * head_sparsity))
+            heads_before += unit["heads"]
+            heads_after += keep_n
+            if keep_n < unit["heads"] and unit["name"] in scores:
+                keep = scores[unit["name"]].topk(keep_n).indices.sort().values
+                _prune_heads(model, unit, keep)
+            else:
+                heads_after += unit["heads"] - keep_n
+        for unit in ffn:
+            keep_n = keep_count(unit["hidden"], ffn_sparsity)
+            neurons_before += unit["hidden"]
+            neurons_after += keep_n
+            if keep_n < unit["hidden"] and unit["name"] in scores:
+                keep = scores[unit["name"]].topk(keep_n).indices.sort().values
+                _prune_ffn(model, unit, keep)
+            else:
+                neurons_after += unit["hidden"] - keep_n
+    model.train(was_training)
+
+    params_after = sum(p.numel() for p in model.parameters())
+    result = {
+        "target_sparsity": head_sparsity,
+        "method": "attention_heads",
+        "head_sparsity": head_sparsity,
+        "ffn_sparsity": ffn_sparsity,
+        "attention_layers": len(attention),
+        "attention_split": split,
+        "heads_before": heads_before,
+        "heads_after": heads_after,
+        "ffn_layers": len(ffn),
+        "ffn_neurons_before": neurons_before,
+        "ffn_neurons_after": neurons_after,
+        "params_before": params_before,
+        "params_after": params_after,
+        "param_reduction": round(1 - params_after / params_before, 4) if params_before else 0.0,
+    }
+    if reference is not None:
+        model.eval()
+        with torch.no_grad():
+            result["output_error"] = round(output_error(reference, model(batch)), 6)
+        model.train(was_training)
+    result.update(info)
+    return result
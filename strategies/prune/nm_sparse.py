@@ -0,0 +1,81 @@
+"""N:M 半结构化稀疏剪枝（默认2:4）
+
+每 M 个连续的输入元素中只保留幅值最大的 N 个（Conv按输入通道分组，顺序与 utils.sparse_format.nm_matrix 一致）。
+稀疏率固定为 1 - N/M，按 nm 布局保存时权重存储约为稠密的 N/M 加上每个值 ceil(log2 M) 位的下标；
+2:4 模式可由 TensorRT（--sparsity=enable）和 torch 半结构化稀疏kernel（CUDA）加速。
+输入维不能被 M 整除的层（如3通道输入的首层卷积）保持稠密。
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from utils.sparse_format import DEFAULT_NM, nm_matrix, nm_restore
+except ImportError:
+    DEFAULT_NM = (2, 4)
+    nm_matrix = nm_restore = None
+
+
+def parse_nm(pattern: Any = None, n: Optional[int] = None, m: Optional[int] = None) -> Tuple[int, int]:
+    """解析 "2:4" 形式的模式（或分别给出的n/m），校验 0 < N < M"""
+    if pattern:
+        parts = str(pattern).split(":")
+        if len(parts) != 2 or not all(p.strip().isdigit() for p in parts):
+            raise ValueError(f"Invalid N:M pattern: {pattern}, expected like '2:4'")
+        n, m = int(parts[0]), int(parts[1])
+    n = int(DEFAULT_NM[0] if n is None else n)
+    m = int(DEFAULT_NM[1] if m is None else m)
+    if not 0 < n < m:
+        raise ValueError(f"Invalid N:M pattern: {n}:{m}, need 0 < N < M")
+    return n, m
+
+
+def nm_mask(weight: Any, n: int, m: int) -> Optional[Any]:
+    """每M个一组保留|w|最大的N个的掩码（形状同weight），无法分组时返回None"""
+    import torch
+
+    matrix = nm_matrix(weight.detach(), m)
+    if matrix is None:
+        return None
+    groups = matrix.reshape(matrix.shape[0], -1, m)
+    keep = groups.abs().topk(n, dim=-1).indices
+    mask = torch.zeros_like(groups, dtype=torch.bool).scatter_(-1, keep, True)
+    return nm_restore(mask.reshape(matrix.shape[0], -1), tuple(weight.shape))
+
+
+def apply_nm_sparsity(model: Any, n: int = DEFAULT_NM[0], m: int = DEFAULT_NM[1],
+                      module_types: Optional[Tuple[type, ...]] = None) -> Optional[Dict[str, Any]]:
+    """对 Linear/Conv2d 权重施加N:M稀疏（原地置零），没有可处理的层时返回None"""
+    try:
+        import torch
+        import torch.nn as nn
+    except Exception:
+        return None
+    if nm_matrix is None:
+        return None
+
+    types = module_types or (nn.Linear, nn.Conv2d)
+    pruned = skipped = total = zeros = 0
+    with torch.no_grad():
+        for module in model.modules():
+            if not isinstance(module, types) or not isinstance(getattr(module, "weight", None), torch.Tensor):
+                continue
+            mask = nm_mask(module.weight, n, m)
+            if mask is None:
+                skipped += 1
+                continue
+            module.weight.mul_(mask.to(module.weight.dtype))
+            pruned += 1
+            total += module.weight.numel()
+            zeros += int((module.weight == 0).sum())
+    if not pruned:
+        return None
+    return {
+        "target_sparsity": round(1 - n / m, 4),
+        "method": "nm_sparse",
+        "pattern": f"{n}:{m}",
+        "layers_pruned": pruned,
+        "layers_skipped": skipped,
+        "weight_sparsity": round(zeros / total, 4) if total else 0.0,
+    }
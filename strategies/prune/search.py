@@ -0,0 +1,145 @@
+"""按实测延时/模型大小搜索剪枝稀疏度
+
+在 [min_sparsity, max_sparsity] 上二分：每个探测点深拷贝模型、按该稀疏度剪枝，
+用CPU延时评估器（evaluators.latency）计时、统计参数+缓冲区大小，返回满足目标的最小稀疏度和全部探测记录。
+假设延时/大小随稀疏度单调下降（物理删除通道的结构化剪枝满足；只置零的剪枝不会变快，不适用）。
+提供验证数据时每个探测点额外计算剪枝前后输出的相对L2误差（不参与二分，只用于报告和 max_error 检查）。
+"""
+
+from __future__ import annotations
+
+import copy
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    from evaluators.latency import default_input_shape, measure_model_latency_ms
+except ImportError:
+    default_input_shape = measure_model_latency_ms = None
+
+try:
+    from ..common import flatten_outputs
+except ImportError:
+    from strategies.common import flatten_outputs
+
+try:
+    from strategies.quant.sensitivity import output_error
+except ImportError:
+    output_error = None
+
+try:
+    from utils.calibration import get_calibration_set
+except ImportError:
+    get_calibration_set = None
+
+DEFAULT_MAX_PROBES = 8
+# 二分区间小于该宽度时停止
+DEFAULT_TOLERANCE = 0.05
+# 每个探测点计时的轮数（取最小值，降低CPU调度噪声）
+_TIMING_ROUNDS = 3
+_FIDELITY_SAMPLES = 16
+
+
+def _size_mb(model: Any) -> float:
+    param_size = sum(p.numel() * p.element_size() for p in model.parameters())
+    buffer_size = sum(b.numel() * b.element_size() for b in model.buffers())
+    return round((param_size + buffer_size) / (1024 * 1024), 4)
+
+
+def _latency_ms(model: Any, shape: tuple) -> Optional[float]:
+    samples = [measure_model_latency_ms(model, shape=shape) for _ in range(_TIMING_ROUNDS)]
+    samples = [v for v in samples if v is not None]
+    return min(samples) if samples else None
+
+
+def _fidelity_batch(val_dir: Optional[str], shape: tuple, info: Dict[str, Any]) -> Optional[Any]:
+    """验证数据的第一个批次，无验证数据或读取失败时返回None"""
+    if not val_dir or get_calibration_set is None or output_error is None:
+        return None
+    try:
+        val_set = get_calibration_set(val_dir, input_shape=shape, max_samples=_FIDELITY_SAMPLES)
+        return next(iter(val_set.batches()))
+    except Exception as e:
+        info["fidelity_error"] = str(e)
+        return None
+
+
+def search_sparsity(
+    model: Any,
+    prune_fn: Callable[[Any, float], Any],
+    *,
+    family: str = "",
+    target_latency_ms: Optional[float] = None,
+    target_size_mb: Optional[float] = None,
+    val_dir: Optional[str] = None,
+    max_error: Optional[float] = None,
+    min_sparsity: float = 0.1,
+    max_sparsity: float = 0.9,
+    tolerance: float = DEFAULT_TOLERANCE,
+    max_probes: int = DEFAULT_MAX_PROBES,
+) -> Dict[str, Any]:
+    """二分搜索满足延时/大小目标的最小稀疏度（不修改model），返回 {"sparsity", "met", "probes", ...}
+
+    prune_fn(model_copy, sparsity) 原地剪枝副本；目标全部达到才算满足。
+    最大稀疏度仍达不到目标时 sparsity 为 max_sparsity、met 为 False
+    """
+    import torch
+
+    if target_latency_ms is None and target_size_mb is None:
+        raise ValueError("search_sparsity needs target_latency_ms or target_size_mb")
+    if target_latency_ms is not None and measure_model_latency_ms is None:
+        raise RuntimeError("CPU latency evaluator is not available")
+    shape = tuple(default_input_shape(family))
+    info: Dict[str, Any] = {"target_latency_ms": target_latency_ms, "target_size_mb": target_size_mb}
+    model.eval()
+    info["baseline_size_mb"] = _size_mb(model)
+    if target_latency_ms is not None:
+        info["baseline_latency_ms"] = _latency_ms(model, shape)
+
+    batch = _fidelity_batch(val_dir, shape, info)
+    reference = None
+    if batch is not None:
+        with torch.no_grad():
+            reference = flatten_outputs(model(batch))
+
+    probes: List[Dict[str, Any]] = []
+
+    def probe(sparsity: float) -> bool:
+        candidate = copy.deepcopy(model)
+        record: Dict[str, Any] = {"sparsity": round(sparsity, 4)}
+        if not prune_fn(candidate, sparsity):
+            raise ValueError(f"Pruning failed at sparsity {sparsity:.3f}")
+        record["size_mb"] = _size_mb(candidate)
+        ok = target_size_mb is None or record["size_mb"] <= target_size_mb
+        if target_latency_ms is not None:
+            record["latency_ms"] = _latency_ms(candidate, shape)
+            ok = ok and record["latency_ms"] is not None and record["latency_ms"] <= target_latency_ms
+        if reference is not None:
+            with torch.no_grad():
+                record["output_error"] = round(output_error(reference, candidate(batch)), 6)
+        record["meets_target"] = ok
+        probes.append(record)
+        return ok
+
+    low, high = float(min_sparsity), float(max_sparsity)
+    if not probe(high):
+        best, met = high, False
+    elif probe(low):
+        best, met = low, True
+    else:
+        # 不变式：low 不满足，high 满足
+        while high - low > tolerance and len(probes) < max_probes:
+            mid = (low + high) / 2
+            if probe(mid):
+                high = mid
+            else:
+                low = mid
+        best, met = high, True
+
+    info.update({"sparsity": round(best, 4), "met": met, "probes": probes})
+    chosen = next(p for p in probes if p["sparsity"] == info["sparsity"])
+    if "output_error" in chosen:
+        info["output_error"] = chosen["output_error"]
+        if max_error is not None:
+            info["max_error"] = float(max_error)
+            info["fidelity_ok"] = chosen["output_error"] <= float(max_error)
+    return info
@@ -0,0 +1,295 @@
+"""逐层剪枝敏感度扫描 + 非均匀剪枝比例
+
+统一比例剪枝会过度剪掉敏感的浅层。这里对每个剪枝单元分别按若干比例剪枝（其余层不动），
+在缓存的校准批次上计算输出相对L2误差，同时记录剪枝后的 FLOPs（乘加次数）和非零参数量；
+再用贪心（每步选择"误差增量 / 节省量"最小的单元提高比例）求解满足全局 FLOPs/参数量削减目标的逐层比例。
+
+- 结构化：单元为依赖图的耦合通道组（dependency.channel_groups），比例按组物理删除通道
+- 非结构化：单元为每个 Conv2d/Linear，比例为该层L1幅值剪枝的比例；只支持参数量目标（稠密kernel的FLOPs不变）
+- 各单元的扫描在线程池中并行（Config.PRUNE_SENSITIVITY_WORKERS），每个任务剪枝独立的模型副本
+- 扫描结果按 (模型权重指纹, 模式, 比例, 校准数据, 输入形状) 缓存为JSON，重复运行直接复用
+"""
+
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from .dependency import analyze_channels, channel_groups, prune_channel_groups
+except ImportError:
+    from strategies.prune.dependency import analyze_channels, channel_groups, prune_channel_groups
+
+try:
+    from ..common import flatten_outputs, probe_batch
+except ImportError:
+    from strategies.common import flatten_outputs, probe_batch
+
+try:
+    from strategies.quant.sensitivity import output_error
+except ImportError:
+    output_error = None
+
+try:
+    from config.settings import Config
+except ImportError:
+    Config = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SWEEP_RATIOS = (0.25, 0.5, 0.75)
+DEFAULT_SENSITIVITY_SAMPLES = 8
+# 逐层比例叠加后的实际削减量通常小于各层单独削减量之和，按实测差距提高目标重新求解的次数
+_SOLVE_ROUNDS = 3
+
+
+def _setting(name: str, default: Any) -> Any:
+    return getattr(Config, name, default) if Config else default
+
+
+def count_flops(model: Any, batch: Any) -> Tuple[int, Any]:
+    """前向一次，统计每个样本的 Conv2d/Linear 乘加次数，返回 (FLOPs, 模型输出)"""
+    import torch
+    import torch.nn as nn
+
+    total = [0]
+
+    def hook(module: Any, inputs: Any, output: Any) -> None:
+        per_sample = output.numel() // max(1, output.shape[0])
+        if isinstance(module, nn.Conv2d):
+            kh, kw = module.kernel_size
+            total[0] += per_sample * (module.in_channels // module.groups) * kh * kw
+        else:
+            total[0] += per_sample * module.in_features
+
+    handles = [m.register_forward_hook(hook) for m in model.modules() if isinstance(m, (nn.Conv2d, nn.Linear))]
+    try:
+        with torch.no_grad():
+            output = model(batch)
+    finally:
+        for handle in handles:
+            handle.remove()
+    return total[0], output
+
+
+def nonzero_params(model: Any) -> int:
+    return int(sum(int((p != 0).sum()) for p in model.parameters()))
+
+
+def _prune_layer_l1(model: Any, name: str, ratio: float) -> bool:
+    """按L1幅值把单个层的权重剪掉ratio比例"""
+    import torch.nn.utils.prune as prune
+
+    module = model.get_submodule(name)
+    prune.l1_unstructured(module, name="weight", amount=float(ratio))
+    prune.remove(module, "weight")
+    return True
+
+
+def _units(model: Any, mode: str, analysis: Any) -> List[str]:
+    import torch.nn as nn
+
+    if mode == "structured":
+        return [g["name"] for g in channel_groups(model, analysis) if not g["frozen"]]
+    return [name for name, m in model.named_modules() if isinstance(m, (nn.Conv2d, nn.Linear))]
+
+
+def _prune_unit(mode: str, analysis: Any) -> Callable[[Any, str, float], Any]:
+    if mode == "structured":
+        # 复用主线程的依赖图分析：FX追踪会替换全局 Module.__call__，不能在工作线程中进行
+        return lambda m, unit, ratio: prune_channel_groups(m, 0.0, ratios={unit: ratio}, analysis=analysis)
+    return _prune_layer_l1
+
+
+def model_fingerprint(model: Any) -> str:
+    """模型结构与权重的指纹（模块类型、参数/缓冲区名称、形状和数值）"""
+    import torch
+
+    digest = hashlib.sha1(type(model).__name__.encode("utf-8"))
+    for name, tensor in model.state_dict().items():
+        digest.update(f"{name}:{tuple(tensor.shape)}:{tensor.dtype}".encode("utf-8"))
+        if tensor.numel():
+            digest.update(tensor.detach().cpu().contiguous().view(-1).view(torch.uint8).numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _cache_file(key: str) -> str:
+    cache_dir = str(_setting("PRUNE_SENSITIVITY_CACHE_DIR", os.path.join("storage", "prune_sensitivity")))
+    return os.path.join(cache_dir, f"{key}.json")
+
+
+def sweep_sensitivity(
+    model: Any,
+    mode: str,
+    batch: Any,
+    ratios: Sequence[float] = DEFAULT_SWEEP_RATIOS,
+    workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    """逐单元按各比例剪枝模型副本，返回 {"base": {flops, params}, "units": {单元: [{ratio, error, flops, params}]}}"""
+    model.eval()
+    base_flops, output = count_flops(model, batch)
+    reference = flatten_outputs(output)
+    analysis = analyze_channels(model) if mode == "structured" else None
+    prune_unit = _prune_unit(mode, analysis)
+
+    def probe(task: Tuple[str, float]) -> Dict[str, Any]:
+        unit, ratio = task
+        candidate = copy.deepcopy(model)
+        prune_unit(candidate, unit, ratio)
+        flops, out = count_flops(candidate, batch)
+        return {"ratio": ratio, "error": round(output_error(reference, out), 6), "flops": flops,
+                "params": nonzero_params(candidate)}
+
+    units = _units(model, mode, analysis)
+    tasks = [(unit, float(r)) for unit in units for r in ratios]
+    workers = max(1, int(workers or _setting("PRUNE_SENSITIVITY_WORKERS", 4)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        records = list(pool.map(probe, tasks))
+    sweep: Dict[str, List[Dict[str, Any]]] = {unit: [] for unit in units}
+    for (unit, _), record in zip(tasks, records):
+        sweep[unit].append(record)
+    return {"base": {"flops": base_flops, "params": nonzero_params(model)}, "units": sweep}
+
+
+def cached_sweep(model: Any, mode: str, batch: Any, batch_key: str, ratios: Sequence[float],
+                 workers: Optional[int], info: Dict[str, Any]) -> Dict[str, Any]:
+    """按模型指纹读取/写入扫描缓存"""
+    spec = {"model": model_fingerprint(model), "mode": mode, "ratios": [float(r) for r in ratios],
+            "data": batch_key, "shape": list(batch.shape)}
+    key = hashlib.sha1(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()[:20]
+    path = _cache_file(key)
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                sweep = json.load(f)
+            info["sweep_cache"] = "hit"
+            return sweep
+        except (OSError, ValueError):
+            pass
+    sweep = sweep_sensitivity(model, mode, batch, ratios, workers)
+    info["sweep_cache"] = "miss"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(sweep, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning(f"Failed to cache prune sensitivity sweep: {e}")
+    return sweep
+
+
+def solve_ratios(sweep: Dict[str, Any], metric: str, target: float) -> Tuple[Dict[str, float], float, float]:
+    """贪心求解逐单元比例，使估计的 metric 削减比例达到 target，返回 (比例, 估计削减比例, 估计误差)
+
+    估计值按各单元单独剪枝的节省量/误差相加
+    """
+    base = float(sweep["base"][metric])
+    options = {unit: [{"ratio": 0.0, "error": 0.0, "saved": 0.0}]
+               + [{"ratio": r["ratio"], "error": r["error"], "saved": base - r[metric]}
+                  for r in sorted(records, key=lambda r: r["ratio"])]
+               for unit, records in sweep["units"].items()}
+    level = {unit: 0 for unit in options}
+    saved = error = 0.0
+    while saved < target * base:
+        best = None
+        for unit, opts in options.items():
+            cur = opts[level[unit]]
+            for index in range(level[unit] + 1, len(opts)):
+                gain = opts[index]["saved"] - cur["saved"]
+                if gain <= 0:
+                    continue
+                cost = (opts[index]["error"] - cur["error"]) / gain
+                if best is None or cost < best[0]:
+                    best = (cost, unit, index)
+        if best is None:
+            break
+        _, unit, index = best
+        cur, nxt = options[unit][level[unit]], options[unit][index]
+        saved += nxt["saved"] - cur["saved"]
+        error += nxt["error"] - cur["error"]
+        level[unit] = index
+    plan = {unit: options[unit][level[unit]]["ratio"] for unit in options}
+    return plan, (saved / base if base else 0.0), error
+
+
+def apply_plan(model: Any, mode: str, plan: Dict[str, float], analysis: Any = None) -> Optional[Dict[str, Any]]:
+    """按逐单元比例原地剪枝"""
+    ratios = {unit: ratio for unit, ratio in plan.items() if ratio > 0}
+    if not ratios:
+        return None
+    if mode == "structured":
+        return prune_channel_groups(model, 0.0, ratios=ratios, analysis=analysis)
+    for unit, ratio in ratios.items():
+        _prune_layer_l1(model, unit, ratio)
+    return {"method": "layerwise_l1", "layers_pruned": len(ratios)}
+
+
+def apply_layerwise(
+    model: Any,
+    *,
+    mode: str = "structured",
+    metric: str = "flops",
+    target: float = 0.3,
+    calib_dir: Optional[str] = None,
+    input_shape: Sequence[int] = (1, 3, 224, 224),
+    ratios: Optional[Sequence[float]] = None,
+    workers: Optional[int] = None,
+) -> Optional[Dict[str, Any]]:
+    """敏感度驱动的逐层非均匀剪枝（原地修改），返回剪枝信息（含逐层方案 layerwise.plan）"""
+    if mode not in ("structured", "unstructured"):
+        raise ValueError(f"Unknown layerwise prune mode: {mode}")
+    if metric not in ("flops", "params"):
+        raise ValueError(f"Layerwise target metric must be flops or params, got {metric}")
+    if mode == "unstructured" and metric == "flops":
+        raise ValueError("Unstructured pruning does not reduce dense FLOPs; use params_reduction")
+    ratios = sorted({float(r) for r in (ratios or DEFAULT_SWEEP_RATIOS) if 0 < float(r) < 1})
+    if not ratios:
+        raise ValueError("sweep_ratios must contain values in (0, 1)")
+    target = max(0.0, min(0.9, float(target)))
+    shape = tuple(int(v) for v in (input_shape or (1, 3, 224, 224)))
+
+    info: Dict[str, Any] = {"metric": metric, "target_reduction": target, "sweep_ratios": ratios}
+    batch, batch_key = probe_batch(calib_dir, shape, info, DEFAULT_SENSITIVITY_SAMPLES)
+    model.eval()
+    sweep = cached_sweep(model, mode, batch, batch_key, ratios, workers, info)
+    if not sweep["units"]:
+        return None
+    base = sweep["base"][metric]
+    reference = flatten_outputs(count_flops(model, batch)[1])
+    analysis = analyze_channels(model) if mode == "structured" else None
+
+    # 叠加剪枝的实际削减量与估计值有偏差：在模型副本上实测，不足时按差距提高目标重新求解
+    goal = target
+    for _ in range(_SOLVE_ROUNDS):
+        plan, estimated, estimated_error = solve_ratios(sweep, metric, goal)
+        candidate = copy.deepcopy(model)
+        apply_plan(candidate, mode, plan, analysis)
+        flops, output = count_flops(candidate, batch)
+        achieved = 1 - (flops if metric == "flops" else nonzero_params(candidate)) / base if base else 0.0
+        if achieved >= target or estimated < goal:
+            break
+        goal = min(1.0, goal + (target - achieved))
+
+    result = apply_plan(model, mode, plan, analysis)
+    if result is None:
+        return None
+    ranked = sorted(((unit, records[-1]["error"]) for unit, records in sweep["units"].items()),
+                    key=lambda kv: kv[1], reverse=True)
+    info.update({
+        "plan": {unit: ratio for unit, ratio in plan.items()},
+        "achieved_reduction": round(achieved, 4),
+        "estimated_error": round(estimated_error, 6),
+        "measured_error": round(output_error(reference, output), 6),
+        "units": len(plan),
+        "units_pruned": sum(1 for r in plan.values() if r > 0),
+        "sensitivity_top": {unit: err for unit, err in ranked[:10]},
+        "met": achieved >= target,
+    })
+    result["layerwise"] = info
+    return result
@@ -7,6 +7,13 @@ try:
 except ImportError:
     from strategies.common import clamp
 
+try:
+    from .dependency import prune_channel_groups
+    from .surgery import remove_pruned_channels
+except ImportError:
+    from strategies.prune.dependency import prune_channel_groups
+    from strategies.prune.surgery import remove_pruned_channels
+
 
 def select_sparsity(constraints: Optional[Dict[str, Any]] = None, search: Optional[Dict[str, Any]] = None, default: float = 0.5) -> float:
     """基于简单启发式从搜索空间中选择目标稀疏率。
@@ -78,16 +85,38 @@ def apply_structured_bn(model: Any, *, target_sparsity: float) -> Optional[Dict[
         return None
 
 
-def apply_structured(model: Any, *, target_sparsity: float) -> Optional[Dict[str, float]]:
-    """结构化通道剪枝：优先BN权重，无BN则回退Ln范数"""
+def apply_structured(model: Any, *, target_sparsity: float, physical: bool = True) -> Optional[Dict[str, float]]:
+    """结构化通道剪枝
+
+    physical=True 时优先按依赖图把残差/concat/depthwise 耦合的通道组一起物理删除（见 dependency.prune_channel_groups）；
+    无可剪的组时回退为BN权重（无BN则Ln范数）置零 + 删除全零通道（见 surgery.remove_pruned_channels），
+    无法安全删除的层保留掩码结果
+    """
     amount = clamp(target_sparsity)
     if amount <= 0:
         return None
-    
-    result = apply_structured_bn(model, target_sparsity=amount)
-    if result:
-        return result
-    
+    if physical:
+        try:
+            result = prune_channel_groups(model, amount)
+        except Exception:
+            result = None
+        if result:
+            result["target_sparsity"] = amount
+            return result
+
+    result = apply_structured_bn(model, target_sparsity=amount) or _apply_structured_ln(model, amount)
+    if result and physical:
+        try:
+            surgery = remove_pruned_channels(model)
+        except Exception:
+            surgery = None
+        if surgery:
+            result.update(surgery)
+    return result
+
+
+def _apply_structured_ln(model: Any, amount: float) -> Optional[Dict[str, float]]:
+    """按Ln范数对所有Conv2d做结构化剪枝"""
     try:
         import torch.nn.utils.prune as prune
         import torch.nn as nn
@@ -0,0 +1,249 @@
+"""通道手术：物理删除结构化剪枝后全零的卷积输出通道
+
+结构化剪枝（ln_structured/BN）只把整个滤波器置零，张量形状不变。这里用 torch.fx 追踪
+模型数据流，对每个含全零滤波器的 Conv2d，沿唯一的下游路径
+（BatchNorm → 逐元素激活/池化/Dropout → 下一个 Conv2d 或 flatten 后的 Linear）
+同步缩小形状并替换模块。遇到 add/cat/reshape、多个消费者等无法安全处理的结构时跳过该层，
+保持原有掩码结果。被删除通道经BN/激活后的常量输出不补偿到下游偏置（与常见剪枝工具一致，可由微调恢复）。
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+# 通道数不少于该值时，保留的通道数向上取整为该值的倍数（CPU卷积kernel按8/16通道分块）
+CHANNEL_ROUND = 8
+
+
+def _zero_filters(conv: Any) -> List[int]:
+    """返回权重全零的输出通道索引"""
+    w = conv.weight.detach()
+    return [i for i, v in enumerate(w.flatten(1).abs().sum(1).tolist()) if v == 0.0]
+
+
+def _set_module(model: Any, name: str, new_module: Any) -> None:
+    """按点分名称替换子模块"""
+    parent = model
+    parts = name.split(".")
+    for part in parts[:-1]:
+        parent = getattr(parent, part)
+    setattr(parent, parts[-1], new_module)
+
+
+def _shrink_conv(conv: Any, keep: Any, dim: int) -> Any:
+    """按keep索引缩小Conv2d的输出（dim=0）或输入（dim=1）通道"""
+    import torch.nn as nn
+
+    in_ch = conv.in_channels if dim == 0 else len(keep)
+    out_ch = len(keep) if dim == 0 else conv.out_channels
+    new = nn.Conv2d(
+        in_ch, out_ch, conv.kernel_size, stride=conv.stride, padding=conv.padding,
+        dilation=conv.dilation, groups=conv.groups, bias=conv.bias is not None,
+        padding_mode=conv.padding_mode,
+    ).to(device=conv.weight.device, dtype=conv.weight.dtype)
+    new.weight.data = conv.weight.data.index_select(dim, keep).clone()
+    if conv.bias is not None:
+        new.bias.data = (conv.bias.data.index_select(0, keep) if dim == 0 else conv.bias.data).clone()
+    new.train(conv.training)
+    return new
+
+
+def _shrink_bn(bn: Any, keep: Any) -> Any:
+    """按keep索引缩小BatchNorm2d"""
+    import torch.nn as nn
+
+    new = nn.BatchNorm2d(len(keep), eps=bn.eps, momentum=bn.momentum, affine=bn.affine,
+                         track_running_stats=bn.track_running_stats)
+    if bn.affine:
+        new.weight.data = bn.weight.data.index_select(0, keep).clone()
+        new.bias.data = bn.bias.data.index_select(0, keep).clone()
+    if bn.track_running_stats and bn.running_mean is not None:
+        new.running_mean.data = bn.running_mean.data.index_select(0, keep).clone()
+        new.running_var.data = bn.running_var.data.index_select(0, keep).clone()
+        new.num_batches_tracked.data = bn.num_batches_tracked.data.clone()
+    new.train(bn.training)
+    return new.to(device=bn.weight.device if bn.affine else bn.running_mean.device)
+
+
+def _shrink_linear_in(linear: Any, keep: Any, spatial: int) -> Any:
+    """按keep通道缩小flatten后Linear的输入特征（每个通道对应spatial个特征）"""
+    import torch
+    import torch.nn as nn
+
+    cols = (keep.unsqueeze(1) * spatial + torch.arange(spatial, device=keep.device)).flatten()
+    new = nn.Linear(len(cols), linear.out_features, bias=linear.bias is not None).to(
+        device=linear.weight.device, dtype=linear.weight.dtype)
+    new.weight.data = linear.weight.data.index_select(1, cols).clone()
+    if linear.bias is not None:
+        new.bias.data = linear.bias.data.clone()
+    new.train(linear.training)
+    return new
+
+
+def keep_count(size: int, amount: float) -> int:
+    """按剪枝比例计算保留的通道数（至少1个，通道较多时按CHANNEL_ROUND向上取整）"""
+    keep = size - int(size * amount)
+    if size >= 2 * CHANNEL_ROUND:
+        keep = -(-keep // CHANNEL_ROUND) * CHANNEL_ROUND
+    return max(1, min(size, keep))
+
+
+def rebuild_conv(conv: Any, out_idx: Optional[Any], in_idx: Optional[Any], depthwise: bool = False) -> Any:
+    """按输出/输入下标重建Conv2d（depthwise卷积输入输出和groups同步缩小）"""
+    import torch.nn as nn
+
+    device = conv.weight.device
+    weight = conv.weight.data
+    bias = conv.bias.data if conv.bias is not None else None
+    if out_idx is not None:
+        weight = weight.index_select(0, out_idx.to(device))
+        bias = bias.index_select(0, out_idx.to(device)) if bias is not None else None
+    if in_idx is not None and not depthwise:
+        weight = weight.index_select(1, in_idx.to(device))
+    out_ch = weight.shape[0]
+    in_ch = out_ch if depthwise else weight.shape[1] * conv.groups
+    new = nn.Conv2d(in_ch, out_ch, conv.kernel_size, stride=conv.stride, padding=conv.padding,
+                    dilation=conv.dilation, groups=out_ch if depthwise else conv.groups,
+                    bias=bias is not None, padding_mode=conv.padding_mode).to(device=device, dtype=conv.weight.dtype)
+    new.weight.data = weight.clone()
+    if bias is not None:
+        new.bias.data = bias.clone()
+    new.train(conv.training)
+    return new
+
+
+def _passthrough_kinds() -> Tuple[tuple, set, set]:
+    """不改变通道语义的模块类型、函数和方法名"""
+    import torch
+    import torch.nn as nn
+    import torch.nn.functional as F
+
+    modules = (nn.ReLU, nn.ReLU6, nn.LeakyReLU, nn.SiLU, nn.GELU, nn.Hardswish, nn.Hardsigmoid,
+               nn.Sigmoid, nn.Tanh, nn.ELU, nn.Mish, nn.Identity, nn.Dropout, nn.Dropout2d,
+               nn.MaxPool2d, nn.AvgPool2d)
+    functions = {F.relu, F.relu6, F.leaky_relu, F.silu, F.gelu, F.hardswish, F.sigmoid, F.dropout,
+                 F.max_pool2d, F.avg_pool2d, torch.relu, torch.sigmoid, torch.tanh}
+    methods = {"relu", "relu_", "sigmoid", "tanh", "contiguous"}
+    return modules, functions, methods
+
+
+def _trace_consumer(gm: Any, node: Any) -> Optional[Tuple[List[str], str, str, int]]:
+    """从conv节点沿唯一下游路径查找：(途经的BN名称, 消费者名称, 消费者类型, flatten后每通道特征数)"""
+    import torch
+    import torch.nn as nn
+
+    modules = dict(gm.named_modules())
+    pass_mods, pass_funcs, pass_methods = _passthrough_kinds()
+    bns: List[str] = []
+    spatial: Optional[int] = None
+    current = node
+    while True:
+        users = list(current.users)
+        if len(users) != 1:
+            return None
+        nxt = users[0]
+        if nxt.args[:1] != (current,):
+            return None
+        if nxt.op == "call_module":
+            mod = modules.get(nxt.target)
+            if isinstance(mod, nn.Conv2d):
+                if spatial is not None or mod.groups != 1:
+                    return None
+                return bns, nxt.target, "conv", 1
+            if isinstance(mod, nn.Linear):
+                if spatial is None:
+                    return None
+                return bns, nxt.target, "linear", spatial
+            if isinstance(mod, nn.BatchNorm2d) and spatial is None:
+                bns.append(nxt.target)
+            elif isinstance(mod, nn.AdaptiveAvgPool2d) and spatial is None:
+                out = mod.output_size if isinstance(mod.output_size, tuple) else (mod.output_size, mod.output_size)
+                if None in out:
+                    return None
+                spatial = -int(out[0]) * int(out[1])  # 负数表示池化后尚未flatten
+            elif isinstance(mod, nn.Flatten) and spatial is not None and spatial < 0:
+                spatial = -spatial
+            elif not isinstance(mod, pass_mods):
+                return None
+        elif nxt.op == "call_function":
+            if nxt.target is torch.flatten and spatial is not None and spatial < 0:
+                spatial = -spatial
+            elif nxt.target not in pass_funcs:
+                return None
+        elif nxt.op == "call_method":
+            if nxt.target == "flatten" and spatial is not None and spatial < 0:
+                spatial = -spatial
+            elif nxt.target not in pass_methods:
+                return None
+        else:
+            return None
+        current = nxt
+
+
+def remove_pruned_channels(model: Any) -> Optional[Dict[str, Any]]:
+    """删除全零滤波器对应的通道，原地替换模型中的子模块
+
+    返回：{"channels_removed", "layers_shrunk", "layers_skipped"}；无法追踪模型或没有可删除的通道时返回 None。
+    """
+    try:
+        import torch
+        import torch.fx as fx
+        import torch.nn as nn
+    except Exception:
+        return None
+
+    try:
+        gm = fx.symbolic_trace(model)
+    except Exception:
+        return None
+
+    modules = dict(model.named_modules())
+    # 被多处调用的共享模块（如复用的卷积）无法单独改形状
+    calls = Counter(n.target for n in gm.graph.nodes if n.op == "call_module")
+    removed = shrunk = skipped = 0
+    for node in gm.graph.nodes:
+        if node.op != "call_module":
+            continue
+        conv = modules.get(node.target)
+        if not isinstance(conv, nn.Conv2d) or conv.groups != 1:
+            continue
+        zeros = _zero_filters(conv)
+        if not zeros or len(zeros) >= conv.out_channels:
+            continue
+        path = _trace_consumer(gm, node)
+        if path is None:
+            skipped += 1
+            continue
+        bns, consumer_name, consumer_kind, spatial = path
+        if any(calls[name] > 1 for name in [node.target, consumer_name] + bns):
+            skipped += 1
+            continue
+        zero_set = set(zeros)
+        keep = torch.tensor([i for i in range(conv.out_channels) if i not in zero_set],
+                            dtype=torch.long, device=conv.weight.device)
+        consumer = modules[consumer_name]
+        expected_in = conv.out_channels * (spatial if consumer_kind == "linear" else 1)
+        if (consumer.in_features if consumer_kind == "linear" else consumer.in_channels) != expected_in:
+            skipped += 1
+            continue
+
+        new_conv = _shrink_conv(conv, keep, dim=0)
+        _set_module(model, node.target, new_conv)
+        modules[node.target] = new_conv
+        for bn_name in bns:
+            new_bn = _shrink_bn(modules[bn_name], keep)
+            _set_module(model, bn_name, new_bn)
+            modules[bn_name] = new_bn
+        if consumer_kind == "conv":
+            new_consumer = _shrink_conv(consumer, keep, dim=1)
+        else:
+            new_consumer = _shrink_linear_in(consumer, keep, spatial)
+        _set_module(model, consumer_name, new_consumer)
+        modules[consumer_name] = new_consumer
+        removed += len(zeros)
+        shrunk += 1
+
+    if not shrunk:
+        return None
+    return {"channels_removed": removed, "layers_shrunk": shrunk, "layers_skipped": skipped}
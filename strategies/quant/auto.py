@@ -2,8 +2,43 @@
 
 from typing import Any, Dict, Tuple, Optional
 
-from strategies.quant.ptq import apply_fp16, apply_int8_dynamic, apply_int8_static
+from strategies.quant.ptq import apply_bf16, apply_fp16, apply_fp16_storage, apply_int8_dynamic, apply_int8_static
 from strategies.quant.qat import apply_qat
+from strategies.quant.backend import select_backend
+from strategies.quant.datafree import apply_int8_datafree
+from strategies.quant.sensitivity import apply_mixed_precision
+
+try:
+    from strategies.quant.smooth import apply_int8_smoothquant
+except ImportError:
+    apply_int8_smoothquant = None
+
+try:
+    from strategies.quant.weight_only import apply_weight_only
+except ImportError:
+    apply_weight_only = None
+
+
+# LayerNorm→Linear 激活离群值明显、静态INT8前需要先做SmoothQuant平滑的模型家族
+SMOOTHQUANT_FAMILIES = ("vit", "transformer")
+
+
+def _apply_static(model: Any, family: str, qc: Dict[str, Any], calib_dir: Optional[str],
+                  calib_num: Optional[int], backend: str) -> Tuple[Any, Dict[str, Any]]:
+    """INT8静态量化；Transformer/ViT 先做SmoothQuant平滑，无法平滑时回退到INT8动态量化"""
+    if family not in SMOOTHQUANT_FAMILIES:
+        return apply_int8_static(model, calib_dir=calib_dir, calib_num=calib_num, backend=backend)
+    if apply_int8_smoothquant is None:
+        m, i = apply_int8_dynamic(model, backend=backend)
+        i["fallback_reason"] = "SmoothQuant unavailable (torch not installed)"
+        return m, i
+    try:
+        return apply_int8_smoothquant(model, calib_dir=calib_dir, calib_num=calib_num, backend=backend,
+                                      alpha=qc.get("smooth_alpha"))
+    except Exception as e:
+        m, i = apply_int8_dynamic(model, backend=backend)
+        i["fallback_reason"] = f"SmoothQuant static INT8 failed: {e}"
+        return m, i
 
 
 def _get_model_size_mb(model: Any) -> float:
@@ -23,7 +58,9 @@ def decide_and_apply_quant(model: Any, qc: Dict[str, Any], family: Optional[str]
     
     Args:
         model: 待量化模型
-        qc: 量化配置字典（precision/bits/auto/calib_dir/calib_num）
+        qc: 量化配置字典（precision/bits/auto/calib_dir/calib_num/target_backend；
+            precision=mixed 时可选 max_error/max_fp32_ratio；weight_only_int8/int4 时可选 group_size；
+            vit/transformer 静态INT8可选 smooth_alpha）
         family: 模型家族（yolo/resnet/lstm/rnn/gcn/vae/transformer等）
     
     Returns:
@@ -37,6 +74,8 @@ def decide_and_apply_quant(model: Any, qc: Dict[str, Any], family: Optional[str]
     auto = bool(qc.get("auto", False))
     calib_dir = qc.get("calib_dir")
     calib_num = qc.get("calib_num")
+    # INT8量化后端：显式target_backend（后端名或x86/arm等平台别名）优先，否则按本机指令集选择
+    backend = select_backend(qc.get("target_backend"))
     
     info: Dict[str, Any] = {}
     family_lower = str(family or "generic").lower()
@@ -45,12 +84,46 @@ def decide_and_apply_quant(model: Any, qc: Dict[str, Any], family: Optional[str]
         m, i = apply_fp16(model)
         info.update(i)
         return m, info
+    if precision == "bf16":
+        m, i = apply_bf16(model)
+        info.update(i)
+        return m, info
+    if precision == "fp16_storage":
+        m, i = apply_fp16_storage(model)
+        info.update(i)
+        return m, info
     if precision == "int8_dynamic":
-        m, i = apply_int8_dynamic(model)
+        m, i = apply_int8_dynamic(model, backend=backend)
         info.update(i)
         return m, info
     if precision == "int8_static":
-        m, i = apply_int8_static(model, calib_dir=calib_dir, calib_num=calib_num)
+        m, i = _apply_static(model, family_lower, qc, calib_dir, calib_num, backend)
+        info.update(i)
+        return m, info
+    if precision == "int8_datafree":
+        try:
+            m, i = apply_int8_datafree(model, backend=backend)
+        except Exception as e:
+            # 无法FX追踪或缺少BN统计量时回退到INT8动态量化
+            m, i = apply_int8_dynamic(model, backend=backend)
+            i["fallback_reason"] = f"Data-free quantization failed: {e}"
+        info.update(i)
+        return m, info
+    if precision == "mixed":
+        try:
+            m, i = apply_mixed_precision(model, calib_dir=calib_dir, calib_num=calib_num, backend=backend,
+                                         max_error=qc.get("max_error"), max_fp32_ratio=qc.get("max_fp32_ratio"))
+        except Exception as e:
+            # 无法做敏感度分析（如非图像输入的模型）时回退到INT8动态量化
+            m, i = apply_int8_dynamic(model, backend=backend)
+            i["fallback_reason"] = f"Sensitivity analysis failed: {e}"
+        info.update(i)
+        return m, info
+    if precision in ("weight_only_int8", "weight_only_int4"):
+        if apply_weight_only is None:
+            info.update({"precision": precision, "fallback": "no_torch"})
+            return model, info
+        m, i = apply_weight_only(model, bits=4 if precision.endswith("int4") else 8, group_size=qc.get("group_size"))
         info.update(i)
         return m, info
     if precision in ["qat", "int8_qat"]:
@@ -66,13 +139,13 @@ def decide_and_apply_quant(model: Any, qc: Dict[str, Any], family: Optional[str]
     if bits == 8:
         if family_lower in ["lstm", "rnn"]:
             import torch.nn as nn
-            m, i = apply_int8_dynamic(model, module_types=(nn.Linear,))
+            m, i = apply_int8_dynamic(model, module_types=(nn.Linear,), backend=backend)
             i.update({"strategy": "linear_only", "preserved_layers": "LSTM/RNN (FP32)"})
             info.update(i)
             return m, info
         elif family_lower == "gcn":
             import torch.nn as nn
-            m, i = apply_int8_dynamic(model, module_types=(nn.Linear,))
+            m, i = apply_int8_dynamic(model, module_types=(nn.Linear,), backend=backend)
             i.update({"strategy": "linear_only", "preserved_layers": "GraphConv (FP32)"})
             info.update(i)
             return m, info
@@ -80,28 +153,28 @@ def decide_and_apply_quant(model: Any, qc: Dict[str, Any], family: Optional[str]
             try:
                 import torch.nn as nn
                 if hasattr(model, "encoder") and hasattr(model, "decoder"):
-                    model.encoder = apply_int8_dynamic(model.encoder, module_types=(nn.Linear,))[0]
+                    model.encoder = apply_int8_dynamic(model.encoder, module_types=(nn.Linear,), backend=backend)[0]
                     model.decoder = apply_fp16(model.decoder)[0] if hasattr(model.decoder, "half") else model.decoder
-                    info.update({"precision": "mixed_int8_fp16", "strategy": "encoder_quantized_decoder_fp16"})
+                    info.update({"precision": "mixed_int8_fp16", "backend": backend, "strategy": "encoder_quantized_decoder_fp16"})
                     return model, info
             except Exception:
                 pass
             m, i = apply_fp16(model)
             info.update(i)
             return m, info
-        elif family_lower == "transformer":
-            m, i = apply_int8_dynamic(model)
+        elif family_lower == "transformer" and not calib_dir:
+            m, i = apply_int8_dynamic(model, backend=backend)
             i["strategy"] = "attention_aware"
             info.update(i)
             return m, info
         else:
             visual_models = ["resnet", "vgg", "cnn", "yolo", "inception", "inceptionv4", "van", "alexnet", "squeezenet", "densenet", "vit"]
-            if family_lower in visual_models and (calib_dir or calib_num):
-                m, i = apply_int8_static(model, calib_dir=calib_dir, calib_num=calib_num)
+            if family_lower in visual_models + ["transformer"] and (calib_dir or calib_num):
+                m, i = _apply_static(model, family_lower, qc, calib_dir, calib_num, backend)
             elif auto and (calib_dir or calib_num):
-                m, i = apply_int8_static(model, calib_dir=calib_dir, calib_num=calib_num)
+                m, i = _apply_static(model, family_lower, qc, calib_dir, calib_num, backend)
             else:
-                m, i = apply_int8_dynamic(model)
+                m, i = apply_int8_dynamic(model, backend=backend)
             info.update(i)
             return m, info
     
@@ -110,7 +183,7 @@ def decide_and_apply_quant(model: Any, qc: Dict[str, Any], family: Optional[str]
         
         if calib_dir or calib_num:
             try:
-                m, i = apply_int8_static(model, calib_dir=calib_dir, calib_num=calib_num)
+                m, i = _apply_static(model, family_lower, qc, calib_dir, calib_num, backend)
                 info.update(i)
                 return m, info
             except Exception:
@@ -123,18 +196,18 @@ def decide_and_apply_quant(model: Any, qc: Dict[str, Any], family: Optional[str]
             return m, info
         elif family_lower in ["lstm", "rnn"]:
             import torch.nn as nn
-            m, i = apply_int8_dynamic(model, module_types=(nn.Linear,))
+            m, i = apply_int8_dynamic(model, module_types=(nn.Linear,), backend=backend)
             i.update({"strategy": "auto_selected", "reason": "LSTM/RNN Linear-only quantization"})
             info.update(i)
             return m, info
         elif family_lower == "transformer":
-            m, i = apply_int8_dynamic(model)
+            m, i = apply_int8_dynamic(model, backend=backend)
             i.update({"strategy": "auto_selected", "reason": "Transformer INT8 dynamic"})
             info.update(i)
             return m, info
         elif family_lower == "gcn":
             import torch.nn as nn
-            m, i = apply_int8_dynamic(model, module_types=(nn.Linear,))
+            m, i = apply_int8_dynamic(model, module_types=(nn.Linear,), backend=backend)
             i.update({"strategy": "auto_selected", "reason": "GCN Linear-only quantization"})
             info.update(i)
             return m, info
@@ -142,9 +215,9 @@ def decide_and_apply_quant(model: Any, qc: Dict[str, Any], family: Optional[str]
             try:
                 import torch.nn as nn
                 if hasattr(model, "encoder") and hasattr(model, "decoder"):
-                    model.encoder = apply_int8_dynamic(model.encoder, module_types=(nn.Linear,))[0]
+                    model.encoder = apply_int8_dynamic(model.encoder, module_types=(nn.Linear,), backend=backend)[0]
                     model.decoder = apply_fp16(model.decoder)[0] if hasattr(model.decoder, "half") else model.decoder
-                    info.update({"precision": "mixed_int8_fp16", "strategy": "auto_selected", "reason": "VAE encoder INT8 + decoder FP16"})
+                    info.update({"precision": "mixed_int8_fp16", "backend": backend, "strategy": "auto_selected", "reason": "VAE encoder INT8 + decoder FP16"})
                     return model, info
             except Exception:
                 pass
@@ -0,0 +1,67 @@
+"""量化后端选择 - 按目标平台选择 x86/fbgemm（x86服务器）或 qnnpack（ARM）
+
+量化模型的算子实现由 torch.backends.quantized.engine 决定，qconfig 必须与之匹配：
+在x86上使用qnnpack的qconfig会得到慢得多的模型，反之在ARM上无法运行fbgemm算子。
+"""
+
+from __future__ import annotations
+
+import logging
+import platform
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+QUANT_BACKENDS = ("x86", "fbgemm", "qnnpack", "onednn")
+
+# 目标平台别名 -> 后端
+_BACKEND_ALIASES = {
+    "x86": "x86", "x86_64": "x86", "amd64": "x86", "intel": "x86", "server": "x86",
+    "fbgemm": "fbgemm", "onednn": "onednn",
+    "qnnpack": "qnnpack", "arm": "qnnpack", "arm64": "qnnpack", "aarch64": "qnnpack", "mobile": "qnnpack",
+}
+
+
+def _supported_engines() -> list:
+    try:
+        import torch
+        return [e for e in torch.backends.quantized.supported_engines if e != "none"]
+    except Exception:
+        return []
+
+
+def detect_backend() -> str:
+    """按本机指令集选择默认后端：x86 优先 x86（新版torch）/fbgemm，ARM 使用 qnnpack"""
+    machine = platform.machine().lower()
+    supported = _supported_engines()
+    if machine in ("x86_64", "amd64", "i386", "i686", "x86"):
+        for engine in ("x86", "fbgemm"):
+            if engine in supported:
+                return engine
+    if "qnnpack" in supported:
+        return "qnnpack"
+    return supported[0] if supported else "fbgemm"
+
+
+def select_backend(target: Optional[str] = None) -> str:
+    """解析 target_backend（后端名或平台别名），本机不支持时回退到 detect_backend()"""
+    if target:
+        backend = _BACKEND_ALIASES.get(str(target).lower())
+        supported = _supported_engines()
+        if backend == "x86" and "x86" not in supported and "fbgemm" in supported:
+            backend = "fbgemm"
+        if backend and (not supported or backend in supported):
+            return backend
+        logger.warning(f"Quantization backend {target!r} is not supported here, detecting from host")
+    return detect_backend()
+
+
+def activate_backend(backend: str) -> str:
+    """设置 torch.backends.quantized.engine，返回实际生效的后端"""
+    try:
+        import torch
+        torch.backends.quantized.engine = backend
+        return torch.backends.quantized.engine
+    except Exception as e:
+        logger.warning(f"Failed to set quantized engine to {backend}: {e}")
+        return backend
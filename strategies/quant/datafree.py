@@ -0,0 +1,304 @@
+"""无数据INT8静态量化（Data-Free Quantization）
+
+没有 calibration_data 时，INT8静态量化只能用随机噪声校准，得到的激活范围与真实分布相差很大。
+这里只使用模型自身的权重和BN统计量：
+
+1. 记录每个 Conv 后 BatchNorm 的 beta/gamma（BN输出近似服从 N(beta, gamma^2)），再折叠 Conv-BN
+2. 跨层均衡（cross-layer equalization）：Conv -> ReLU/MaxPool -> Conv 链上按通道缩放，
+   使前一层输出通道与后一层输入通道的权重范围相等，降低逐通道量化误差（ReLU对正缩放保持等变）
+3. 解析偏置校正：输入期望由BN统计量给出（ReLU后为截断正态的期望），把权重量化误差带来的输出偏移减回偏置
+4. 激活范围：图片输入使用归一化后的取值区间，BN后的激活使用 beta ± k*gamma，经 ReLU/池化/残差相加传播；
+   其余节点仍由随机输入初始化观察器
+"""
+
+from __future__ import annotations
+
+import math
+import operator
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from .backend import activate_backend, select_backend
+except ImportError:
+    from strategies.quant.backend import activate_backend, select_backend
+
+try:
+    from strategies.fuse import _conv_bn_pairs, fuse_conv_bn, strip_identity
+except ImportError:
+    _conv_bn_pairs = fuse_conv_bn = strip_identity = None
+
+try:
+    from utils.calibration import IMAGENET_MEAN, IMAGENET_STD
+except ImportError:
+    IMAGENET_MEAN, IMAGENET_STD = (0.485, 0.456, 0.406), (0.229, 0.224, 0.225)
+
+# BN输出的激活范围取 beta ± k*gamma
+BN_RANGE_SIGMAS = 3.0
+# 跨层均衡迭代上限与收敛阈值（缩放因子最大偏离1的程度）
+_CLE_MAX_ITERS = 20
+_CLE_TOLERANCE = 1e-3
+# 初始化未知激活范围所用的随机批次数
+_NOISE_BATCHES = 4
+
+
+def _is_relu(gm: Any, node: Any) -> bool:
+    import torch
+    import torch.nn as nn
+    import torch.nn.functional as F
+
+    if node.op == "call_module":
+        return isinstance(gm.get_submodule(node.target), nn.ReLU)
+    return node.op == "call_function" and node.target in (F.relu, torch.relu)
+
+
+def _is_module(gm: Any, node: Any, types: Any) -> bool:
+    return getattr(node, "op", None) == "call_module" and isinstance(gm.get_submodule(node.target), types)
+
+
+def _equalization_pairs(gm: Any) -> List[Tuple[str, str]]:
+    """(前一层conv, 后一层conv)：中间只有单一使用者的 ReLU/MaxPool，后一层为普通或逐通道（depthwise）卷积"""
+    import torch.nn as nn
+
+    pairs = []
+    for node in gm.graph.nodes:
+        if not _is_module(gm, node, nn.Conv2d) or type(gm.get_submodule(node.target)) is not nn.Conv2d:
+            continue
+        conv2 = gm.get_submodule(node.target)
+        src = node.args[0] if node.args else None
+        while src is not None and len(src.users) == 1 and (_is_relu(gm, src) or _is_module(gm, src, nn.MaxPool2d)):
+            src = src.args[0]
+        if src is None or len(src.users) != 1 or not _is_module(gm, src, nn.Conv2d):
+            continue
+        conv1 = gm.get_submodule(src.target)
+        if type(conv1) is not nn.Conv2d or conv1.out_channels != conv2.in_channels:
+            continue
+        if conv2.groups not in (1, conv2.in_channels):
+            continue
+        pairs.append((src.target, node.target))
+    return pairs
+
+
+def _input_ranges(conv: Any) -> Any:
+    """后一层卷积每个输入通道的权重绝对值最大值"""
+    w = conv.weight.detach().abs()
+    if conv.groups == 1:
+        return w.amax(dim=(0, 2, 3))
+    return w.reshape(conv.in_channels, -1).amax(dim=1)
+
+
+def cross_layer_equalization(gm: Any, bn_stats: Dict[str, Tuple[Any, Any]]) -> Dict[str, int]:
+    """对可均衡的卷积对迭代缩放，bn_stats 中前一层的 beta/gamma 同步缩放"""
+    import torch
+
+    pairs = _equalization_pairs(gm)
+    iterations = 0
+    with torch.no_grad():
+        for iterations in range(1, _CLE_MAX_ITERS + 1):
+            change = 0.0
+            for name1, name2 in pairs:
+                conv1, conv2 = gm.get_submodule(name1), gm.get_submodule(name2)
+                r1 = conv1.weight.abs().reshape(conv1.out_channels, -1).amax(dim=1)
+                r2 = _input_ranges(conv2)
+                valid = (r1 > 0) & (r2 > 0)
+                scale = torch.where(valid, torch.sqrt(r1 / torch.where(valid, r2, torch.ones_like(r2))),
+                                    torch.ones_like(r1))
+                conv1.weight.div_(scale.view(-1, 1, 1, 1))
+                if conv1.bias is not None:
+                    conv1.bias.div_(scale)
+                if conv2.groups == 1:
+                    conv2.weight.mul_(scale.view(1, -1, 1, 1))
+                else:
+                    per_out = conv2.out_channels // conv2.in_channels
+                    conv2.weight.mul_(scale.repeat_interleave(per_out).view(-1, 1, 1, 1))
+                if name1 in bn_stats:
+                    beta, gamma = bn_stats[name1]
+                    bn_stats[name1] = (beta / scale, gamma / scale)
+                change = max(change, float(scale.log().abs().max()))
+            if change < _CLE_TOLERANCE:
+                break
+    return {"equalized_pairs": len(pairs), "cle_iterations": iterations if pairs else 0}
+
+
+def _expected_input(gm: Any, node: Any, bn_stats: Dict[str, Tuple[Any, Any]]) -> Optional[Any]:
+    """卷积输入的逐通道期望：输入为 BN后conv 或其ReLU 时可解析计算，否则None"""
+    import torch
+
+    src = node.args[0] if node.args else None
+    relu = src is not None and _is_relu(gm, src)
+    if relu:
+        src = src.args[0]
+    if getattr(src, "op", None) != "call_module" or src.target not in bn_stats:
+        return None
+    beta, gamma = bn_stats[src.target]
+    if not relu:
+        return beta
+    # y ~ N(beta, gamma^2)：E[max(y, 0)] = beta * Phi(beta/gamma) + gamma * phi(beta/gamma)
+    gamma = gamma.clamp(min=1e-8)
+    z = beta / gamma
+    cdf = 0.5 * (1 + torch.erf(z / math.sqrt(2)))
+    pdf = torch.exp(-0.5 * z * z) / math.sqrt(2 * math.pi)
+    return beta * cdf + gamma * pdf
+
+
+def _fake_quant_weight(weight: Any, observer: Any) -> Any:
+    """用量化后端的权重观察器模拟权重量化（与convert后的实际量化一致）"""
+    import torch
+
+    observer(weight)
+    scale, zero_point = observer.calculate_qparams()
+    if getattr(observer, "ch_axis", None) is not None and scale.numel() > 1:
+        return torch.fake_quantize_per_channel_affine(weight, scale.float(), zero_point.int(), observer.ch_axis,
+                                                      observer.quant_min, observer.quant_max)
+    return torch.fake_quantize_per_tensor_affine(weight, float(scale), int(zero_point),
+                                                 observer.quant_min, observer.quant_max)
+
+
+def bias_correction(gm: Any, bn_stats: Dict[str, Tuple[Any, Any]], weight_observer: Any) -> int:
+    """解析偏置校正：bias -= (W_q - W) · E[x]（忽略padding的影响），返回校正的层数"""
+    import torch
+    import torch.nn as nn
+
+    corrected = 0
+    with torch.no_grad():
+        for node in gm.graph.nodes:
+            if not _is_module(gm, node, nn.Conv2d):
+                continue
+            expected = _expected_input(gm, node, bn_stats)
+            conv = gm.get_submodule(node.target)
+            if expected is None or expected.numel() != conv.in_channels:
+                continue
+            error = _fake_quant_weight(conv.weight, weight_observer()) - conv.weight
+            groups = conv.groups
+            error = error.sum(dim=(2, 3)).reshape(groups, conv.out_channels // groups, -1)
+            shift = (error * expected.reshape(groups, 1, -1)).sum(dim=-1).flatten()
+            if conv.bias is None:
+                conv.bias = nn.Parameter(torch.zeros(conv.out_channels, device=conv.weight.device))
+            conv.bias.sub_(shift)
+            corrected += 1
+    return corrected
+
+
+def activation_ranges(gm: Any, bn_stats: Dict[str, Tuple[Any, Any]],
+                      channels: int) -> Dict[str, Tuple[float, float]]:
+    """按图传播的激活范围 {节点名: (min, max)}：输入为归一化图片区间，BN后的卷积为 beta ± k*gamma"""
+    import torch
+    import torch.nn as nn
+
+    passthrough = (nn.MaxPool2d, nn.AvgPool2d, nn.AdaptiveAvgPool2d, nn.Identity, nn.Dropout, nn.Flatten)
+    shape_functions = (torch.flatten, torch.reshape)
+    mean, std = IMAGENET_MEAN[:channels], IMAGENET_STD[:channels]
+    ranges: Dict[str, Tuple[float, float]] = {}
+    for node in gm.graph.nodes:
+        args = [a for a in node.args if hasattr(a, "name")]
+        known = [ranges.get(a.name) for a in args]
+        if node.op == "placeholder" and not ranges:
+            ranges[node.name] = (min(-m / s for m, s in zip(mean, std)), max((1 - m) / s for m, s in zip(mean, std)))
+        elif node.op == "call_module" and node.target in bn_stats:
+            beta, gamma = bn_stats[node.target]
+            ranges[node.name] = (float((beta - BN_RANGE_SIGMAS * gamma).min()),
+                                 float((beta + BN_RANGE_SIGMAS * gamma).max()))
+        elif not known or known[0] is None:
+            continue
+        elif _is_relu(gm, node):
+            lo, hi = known[0]
+            ranges[node.name] = (max(lo, 0.0), max(hi, 0.0))
+        elif _is_module(gm, node, nn.ReLU6):
+            lo, hi = known[0]
+            ranges[node.name] = (min(max(lo, 0.0), 6.0), min(max(hi, 0.0), 6.0))
+        elif _is_module(gm, node, passthrough) or node.target in shape_functions or node.target in ("flatten", "view"):
+            ranges[node.name] = known[0]
+        elif node.target in (operator.add, torch.add) and len(known) == 2 and None not in known:
+            ranges[node.name] = (known[0][0] + known[1][0], known[0][1] + known[1][1])
+    return ranges
+
+
+def _datafree_qconfig_mapping(backend: str) -> Any:
+    """激活使用MinMax观察器（范围可直接写入），权重观察器与后端默认一致"""
+    import torch
+    from torch.ao.quantization import MinMaxObserver, QConfig, get_default_qconfig, get_default_qconfig_mapping
+
+    default = get_default_qconfig(backend)
+    activation = MinMaxObserver.with_args(dtype=torch.quint8, reduce_range=backend in ("x86", "fbgemm"))
+    return get_default_qconfig_mapping(backend).set_global(QConfig(activation=activation, weight=default.weight))
+
+
+def _assign_ranges(prepared: Any, gm: Any, ranges: Dict[str, Tuple[float, float]]) -> int:
+    """把传播得到的范围写入 prepared 模型中对应节点的激活观察器，返回写入的数量"""
+    import torch
+    from torch.ao.quantization.observer import MinMaxObserver
+
+    # prepare_fx 把 Conv+ReLU 融合为一个模块，观察器接在融合模块后，对应原图中ReLU的范围
+    relu_after = {}
+    for node in gm.graph.nodes:
+        if _is_relu(gm, node) and node.args and getattr(node.args[0], "op", None) == "call_module":
+            relu_after[node.args[0].target] = node.name
+
+    assigned = 0
+    for node in prepared.graph.nodes:
+        if node.op != "call_module" or not node.args:
+            continue
+        observer = prepared.get_submodule(node.target)
+        if not isinstance(observer, MinMaxObserver) or not hasattr(node.args[0], "name"):
+            continue
+        src = node.args[0]
+        key = src.name
+        if src.op == "call_module" and "ReLU" in type(prepared.get_submodule(src.target)).__name__:
+            key = relu_after.get(src.target, key)
+        if key not in ranges:
+            continue
+        lo, hi = ranges[key]
+        observer.min_val = torch.tensor(min(lo, 0.0))
+        observer.max_val = torch.tensor(max(hi, 0.0))
+        assigned += 1
+    return assigned
+
+
+def apply_int8_datafree(
+    model: Any,
+    input_shape: Sequence[int] = (1, 3, 224, 224),
+    backend: Optional[str] = None,
+) -> Tuple[Any, Dict[str, Any]]:
+    """无校准数据的INT8静态量化（跨层均衡 + 偏置校正 + BN统计量激活范围），返回 (量化后的模型, 信息)"""
+    import torch
+    import torch.fx as fx
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    info: Dict[str, Any] = {"precision": "int8_datafree"}
+    info["backend"] = backend = activate_backend(backend or select_backend())
+    shape = tuple(int(v) for v in (input_shape or (1, 3, 224, 224)))
+    model.eval()
+
+    # 1. 折叠前记录BN统计量（按卷积名称），再折叠Conv-BN
+    try:
+        traced = fx.symbolic_trace(model)
+    except Exception as e:
+        raise ValueError(f"Data-free quantization requires an FX-traceable model: {e}")
+    pairs, calls = _conv_bn_pairs(traced)
+    bn_stats = {}
+    for conv_name, bn_name, _ in pairs:
+        bn = traced.get_submodule(bn_name)
+        if calls[conv_name] == 1 and calls[bn_name] == 1 and bn.track_running_stats and bn.affine:
+            bn_stats[conv_name] = (bn.bias.detach().clone(), bn.weight.detach().abs().clone())
+    model, fuse_info = fuse_conv_bn(model)
+    if fuse_info:
+        info.update(fuse_info)
+    gm = strip_identity(model)
+    if not isinstance(gm, fx.GraphModule):
+        gm = fx.symbolic_trace(model)
+    info["bn_statistics"] = len(bn_stats)
+
+    # 2. 跨层均衡  3. 偏置校正（使用最终的权重）
+    qconfig_mapping = _datafree_qconfig_mapping(backend)
+    info.update(cross_layer_equalization(gm, bn_stats))
+    info["bias_corrected"] = bias_correction(gm, bn_stats, qconfig_mapping.global_qconfig.weight)
+
+    # 4. 随机输入初始化全部观察器，再用BN统计量推出的范围覆盖
+    prepared = prepare_fx(gm, qconfig_mapping, example_inputs=(torch.randn(*shape),))
+    batch = (8,) + shape[1:]
+    with torch.no_grad():
+        for _ in range(_NOISE_BATCHES):
+            prepared(torch.randn(*batch))
+    ranges = activation_ranges(gm, bn_stats, shape[1])
+    info["ranges_from_bn"] = _assign_ranges(prepared, gm, ranges)
+    info["calibration"] = "data_free"
+    return convert_fx(prepared), info
@@ -0,0 +1,171 @@
+"""ONNX模型INT8静态量化（onnxruntime.quantization.quantize_static）
+
+从ONNX图读取输入名、形状和dtype，用 calibration_data 中的图片构建批量 CalibrationDataReader；
+图片经 utils.calibration 解码后缓存在磁盘，重复量化同一份数据时不再解码。
+量化使用QDQ格式（激活uint8、权重int8），权重默认按输出通道量化，
+校准方法可选 minmax / entropy / percentile。
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from onnxruntime.quantization import CalibrationDataReader
+except ImportError:
+    CalibrationDataReader = object
+
+try:
+    from utils.calibration import get_calibration_set
+except ImportError:
+    get_calibration_set = None
+
+try:
+    from config.settings import Config
+    _CALIB_MAX_SAMPLES = Config.CALIB_MAX_SAMPLES
+    _CALIB_BATCH_SIZE = Config.CALIB_BATCH_SIZE
+except ImportError:
+    _CALIB_MAX_SAMPLES = 512
+    _CALIB_BATCH_SIZE = 32
+
+CALIB_METHODS = ("minmax", "entropy", "percentile")
+
+# ONNX TensorProto 元素类型 -> numpy dtype（图片校准只支持浮点输入）
+_ONNX_FLOAT_TYPES = {1: "float32", 10: "float16", 11: "float64"}
+
+DEFAULT_IMAGE_SIZE = 224
+
+
+def onnx_input_specs(model_path: str) -> List[Dict[str, Any]]:
+    """读取图的真实输入（排除initializer）：[{name, shape, dtype}]，动态维度为None"""
+    import onnx
+
+    model = onnx.load(model_path, load_external_data=False)
+    initializers = {init.name for init in model.graph.initializer}
+    specs = []
+    for value in model.graph.input:
+        if value.name in initializers:
+            continue
+        tensor_type = value.type.tensor_type
+        dims = [d.dim_value if d.HasField("dim_value") and d.dim_value > 0 else None
+                for d in tensor_type.shape.dim]
+        specs.append({"name": value.name, "shape": dims,
+                      "dtype": _ONNX_FLOAT_TYPES.get(tensor_type.elem_type)})
+    return specs
+
+
+def _image_input(specs: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], Tuple[int, int, int, int]]:
+    """找出唯一的NCHW浮点图片输入，返回 (输入描述, 用于预处理的形状)"""
+    if len(specs) != 1:
+        raise ValueError(f"Image calibration supports a single model input, got {[s['name'] for s in specs]}")
+    spec = specs[0]
+    shape = spec["shape"]
+    if spec["dtype"] is None or len(shape) != 4 or shape[1] not in (1, 3):
+        raise ValueError(f"Input {spec['name']} is not a float NCHW image tensor: shape={shape}, dtype={spec['dtype']}")
+    height = shape[2] or DEFAULT_IMAGE_SIZE
+    width = shape[3] or DEFAULT_IMAGE_SIZE
+    return spec, (1, shape[1], height, width)
+
+
+class OnnxCalibrationReader(CalibrationDataReader):
+    """按批次把校准图片喂给onnxruntime校准器（批维度固定时按该值分批）
+
+    uniform_batches=True 时所有批次大小相同（丢弃最后不足一批的样本）：
+    entropy/percentile 校准器把各批次的输出堆叠后统计直方图，批次大小不一致会失败
+    """
+
+    def __init__(self, model_path: str, calib_dir: str, calib_num: Optional[int] = None,
+                 batch_size: Optional[int] = None, uniform_batches: bool = False):
+        if get_calibration_set is None:
+            raise ImportError("utils.calibration is not available")
+        spec, shape = _image_input(onnx_input_specs(model_path))
+        self.input_name = spec["name"]
+        self.dtype = spec["dtype"]
+        fixed_batch = spec["shape"][0]
+        self.calib_set = get_calibration_set(calib_dir, input_shape=shape,
+                                             max_samples=calib_num or _CALIB_MAX_SAMPLES)
+        self.batch_size = int(fixed_batch or min(int(batch_size or _CALIB_BATCH_SIZE), len(self.calib_set)))
+        # 固定批维度的模型同样丢弃最后不足一批的样本
+        self._loader = self.calib_set.loader(batch_size=self.batch_size,
+                                             drop_last=bool(fixed_batch) or uniform_batches)
+        self._iter = None
+        self.batches_read = 0
+
+    def get_next(self) -> Optional[Dict[str, Any]]:
+        if self._iter is None:
+            self._iter = iter(self._loader)
+            self.batches_read = 0
+        try:
+            images, _ = next(self._iter)
+        except StopIteration:
+            return None
+        self.batches_read += 1
+        return {self.input_name: images.numpy().astype(self.dtype, copy=False)}
+
+    def rewind(self) -> None:
+        self._iter = None
+
+    def info(self) -> Dict[str, Any]:
+        info: Dict[str, Any] = dict(self.calib_set.info())
+        info.update({"calibration_input": self.input_name, "calibration_batch_size": self.batch_size})
+        return info
+
+
+def _calibrate_method(name: str) -> Any:
+    from onnxruntime.quantization import CalibrationMethod
+
+    return {"minmax": CalibrationMethod.MinMax, "entropy": CalibrationMethod.Entropy,
+            "percentile": CalibrationMethod.Percentile}[name]
+
+
+def _preprocess(model_path: str, output_path: str) -> Optional[str]:
+    """量化前预处理（符号形状推断 + 图优化，折叠常量bias），失败时返回None直接使用原模型"""
+    try:
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+
+        pre_path = f"{output_path}.pre.onnx"
+        quant_pre_process(model_path, pre_path)
+        return pre_path
+    except Exception:
+        return None
+
+
+def quantize_onnx_static(
+    model_path: str,
+    output_path: str,
+    calib_dir: str,
+    calib_num: Optional[int] = None,
+    calib_method: Optional[str] = None,
+    per_channel: Optional[bool] = None,
+    batch_size: Optional[int] = None,
+) -> Dict[str, Any]:
+    """用校准图片对ONNX模型做QDQ INT8静态量化，返回量化信息"""
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+
+    method = str(calib_method or "minmax").lower()
+    if method not in CALIB_METHODS:
+        raise ValueError(f"Unsupported calib_method: {calib_method}, expected one of {CALIB_METHODS}")
+    per_channel = True if per_channel is None else bool(per_channel)
+
+    reader = OnnxCalibrationReader(model_path, calib_dir, calib_num=calib_num, batch_size=batch_size,
+                                   uniform_batches=method != "minmax")
+    pre_path = _preprocess(model_path, output_path)
+    try:
+        quantize_static(
+            pre_path or model_path,
+            output_path,
+            reader,
+            quant_format=QuantFormat.QDQ,
+            per_channel=per_channel,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            calibrate_method=_calibrate_method(method),
+        )
+    finally:
+        if pre_path and os.path.exists(pre_path):
+            os.remove(pre_path)
+    info: Dict[str, Any] = {"quant_format": "QDQ", "per_channel": per_channel, "calib_method": method,
+                            "calibration_batches": reader.batches_read, "preprocessed": pre_path is not None}
+    info.update(reader.info())
+    return info
@@ -1,7 +1,28 @@
-"""后训练量化（PTQ）核心实现 - FP16、INT8动态、INT8静态量化"""
+"""后训练量化（PTQ）核心实现 - FP16、BF16、FP16存储、INT8动态、INT8静态量化"""
 
 from typing import Any, Dict, Tuple, Optional, Sequence
 
+try:
+    from .backend import activate_backend, select_backend
+except ImportError:
+    from strategies.quant.backend import activate_backend, select_backend
+
+try:
+    from strategies.fuse import fuse_conv_bn, strip_identity
+except ImportError:
+    fuse_conv_bn = strip_identity = None
+
+try:
+    from utils.calibration import get_calibration_set
+except ImportError:
+    get_calibration_set = None
+
+try:
+    from config.settings import Config
+    _CALIB_MAX_SAMPLES = Config.CALIB_MAX_SAMPLES
+except ImportError:
+    _CALIB_MAX_SAMPLES = 512
+
 
 def apply_fp16(model: Any) -> Tuple[Any, Dict[str, str]]:
     """FP16量化"""
@@ -16,12 +37,95 @@ def apply_fp16(model: Any) -> Tuple[Any, Dict[str, str]]:
         return model, info
 
 
-def apply_int8_dynamic(model: Any, module_types: Optional[tuple] = None) -> Tuple[Any, Dict[str, str]]:
-    """INT8动态量化"""
+def bf16_supported() -> bool:
+    """本机CPU是否支持原生bf16计算（AVX512-BF16/AMX 或 ARM BF16）"""
+    try:
+        import torch
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        pass
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8", errors="ignore") as f:
+            flags = f.read()
+        return any(flag in flags for flag in ("avx512_bf16", "amx_bf16", " bf16"))
+    except OSError:
+        return False
+
+
+def apply_bf16(model: Any) -> Tuple[Any, Dict[str, Any]]:
+    """BF16量化：权重和计算均为bf16，输入需转换为bf16
+
+    与FP16相比bf16的指数范围与FP32相同，CPU上由oneDNN提供原生kernel；
+    不支持原生bf16的CPU上软件模拟通常比FP32更慢，此时回退到FP16存储/FP32计算（同样减半文件大小）
+    """
+    if not bf16_supported():
+        model, info = apply_fp16_storage(model)
+        info.update({"fallback": "fp16_storage", "native_bf16": False,
+                     "fallback_reason": "CPU has no native bf16 support, using fp16 storage with fp32 compute"})
+        return model, info
+    info: Dict[str, Any] = {"precision": "bf16", "native_bf16": True}
+    try:
+        import torch
+        if hasattr(model, "to"):
+            model = model.to(torch.bfloat16)
+        return model, info
+    except Exception:
+        info["fallback"] = "exception"
+        return model, info
+
+
+def upcast_fp16_storage(module: Any, args: Any) -> None:
+    """forward_pre_hook：首次推理前把以FP16存储的模型转回FP32（直接 torch.load 的模型也能以FP32运行）"""
+    import torch
+
+    param = next(module.parameters(), None)
+    if param is not None and param.dtype == torch.float16:
+        module.float()
+
+
+def apply_fp16_storage(model: Any) -> Tuple[Any, Dict[str, Any]]:
+    """FP16存储/FP32计算：内存中的模型保持FP32，保存时权重写为FP16，加载时转回FP32
+
+    文件大小与FP16相同，但CPU推理仍走FP32 kernel，精度损失只来自一次权重舍入
+    """
+    info: Dict[str, Any] = {"precision": "fp16_storage", "compute_dtype": "float32", "storage_dtype": "float16"}
+    try:
+        import torch
+        with torch.no_grad():
+            for param in model.parameters():
+                if param.dtype == torch.float32:
+                    param.copy_(param.half().float())
+        model._fp16_storage = True
+        return model, info
+    except Exception:
+        info["fallback"] = "exception"
+        return model, info
+
+
+def fp16_storage_copy(model: Any) -> Any:
+    """apply_fp16_storage 处理过的模型在保存时使用的FP16副本（附带加载后自动转回FP32的钩子）"""
+    import copy
+
+    stored = copy.deepcopy(model).half()
+    stored.register_forward_pre_hook(upcast_fp16_storage)
+    return stored
+
+
+def restore_fp16_storage(model: Any) -> Any:
+    """加载时把FP16存储的模型转回FP32，其它对象原样返回"""
+    if getattr(model, "_fp16_storage", False) and hasattr(model, "float"):
+        model = model.float()
+    return model
+
+
+def apply_int8_dynamic(model: Any, module_types: Optional[tuple] = None,
+                       backend: Optional[str] = None) -> Tuple[Any, Dict[str, str]]:
+    """INT8动态量化（backend为空时按本机指令集选择）"""
     info: Dict[str, str] = {"precision": "int8_dynamic"}
     try:
         import torch
         from torch import nn
+        info["backend"] = activate_backend(backend or select_backend())
         types = module_types or (nn.Linear,)
         model = torch.quantization.quantize_dynamic(model, set(types), dtype=torch.qint8)
         return model, info
@@ -35,18 +139,22 @@ def apply_int8_static(
     calib_dir: Optional[str] = None,
     calib_num: Optional[int] = None,
     input_shape: Sequence[int] = (1, 3, 224, 224),
+    backend: Optional[str] = None,
 ) -> Tuple[Any, Dict[str, str]]:
-    """INT8静态量化（PTQ）"""
+    """INT8静态量化（PTQ），qconfig与 torch.backends.quantized.engine 使用同一后端"""
     info: Dict[str, str] = {"precision": "int8_static"}
+    backend = backend or select_backend()
     try:
         import torch
+        info["backend"] = activate_backend(backend)
         import os
-        from torch.ao.quantization import get_default_qconfig_mapping, prepare_fx, convert_fx
+        from torch.ao.quantization import get_default_qconfig_mapping
+        from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
     except ImportError:
         try:
             from torch.quantization import get_default_qconfig, prepare, convert
             model.eval()
-            qconfig = get_default_qconfig("fbgemm")
+            qconfig = get_default_qconfig(backend)
             model.qconfig = qconfig
             prepared = prepare(model, inplace=False)
             steps = int(calib_num or 8)
@@ -63,41 +171,38 @@ def apply_int8_static(
 
     try:
         model.eval()
-        qconfig_mapping = get_default_qconfig_mapping("qnnpack")
-        prepared = prepare_fx(model, qconfig_mapping)
+        graph_model, fuse_info = model, None
+        if fuse_conv_bn is not None and any(isinstance(m, torch.nn.BatchNorm2d) for m in model.modules()):
+            # 在副本上把BN折叠进卷积（观察器直接统计融合后的卷积输出），量化失败回退时返回未修改的原模型
+            import copy
+            fused, fuse_info = fuse_conv_bn(copy.deepcopy(model))
+            if fuse_info:
+                graph_model = strip_identity(fused)
+        qconfig_mapping = get_default_qconfig_mapping(backend)
         steps = int(calib_num or 8)
         shp = tuple(int(v) for v in (input_shape or (1, 3, 224, 224)))
+        prepared = prepare_fx(graph_model, qconfig_mapping, example_inputs=(torch.randn(*shp),))
 
         if calib_dir and os.path.exists(calib_dir):
             try:
-                from torchvision import datasets, transforms
-                from torch.utils.data import DataLoader
-                transform = transforms.Compose([
-                    transforms.Resize(256),
-                    transforms.CenterCrop(shp[2]),
-                    transforms.ToTensor(),
-                    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-                ])
-                dataset = datasets.ImageFolder(calib_dir, transform=transform)
-                dataloader = DataLoader(dataset, batch_size=1, shuffle=False)
-                calibrated = 0
-                for images, _ in dataloader:
-                    if calibrated >= steps:
-                        break
-                    prepared(images)
-                    calibrated += 1
-                info["calibration"] = "real_data"
-                info["calibration_samples"] = str(calibrated)
-            except Exception:
+                calib_set = get_calibration_set(calib_dir, input_shape=shp, max_samples=calib_num or _CALIB_MAX_SAMPLES)
+                with torch.no_grad():
+                    for images in calib_set.batches():
+                        prepared(images)
+                info.update(calib_set.info())
+            except Exception as e:
                 for _ in range(max(1, min(128, steps))):
                     prepared(torch.randn(*shp))
                 info["calibration"] = "random_data"
+                info["calibration_error"] = str(e)
         else:
             for _ in range(max(1, min(128, steps))):
                 prepared(torch.randn(*shp))
             info["calibration"] = "random_data"
 
-        return convert_fx(prepared), info
+        quantized = convert_fx(prepared)
+        info.update(fuse_info or {})
+        return quantized, info
     except Exception:
         info["fallback"] = "exception"
         return model, info
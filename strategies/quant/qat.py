@@ -2,7 +2,8 @@
 
 说明：
 - 在训练过程中模拟量化效果，使模型适应量化后的精度损失。
-- 支持真实数据集训练。
+- 支持真实数据集训练，数据由多进程预取（进程在epoch之间保留）。
+- 训练后期冻结量化观察器和BN统计量，支持验证精度早停和优化步数上限。
 - 相比PTQ（后训练量化），QAT能获得更高的量化精度。
 """
 
@@ -13,8 +14,70 @@ from typing import Any, Dict, Optional
 
 try:
     from ..common import write_report, evaluate_accuracy
+    from .backend import activate_backend, select_backend
 except ImportError:
     from strategies.common import write_report, evaluate_accuracy
+    from strategies.quant.backend import activate_backend, select_backend
+
+
+# 可通过 quantize_qat 方法参数覆盖的训练选项
+QAT_OPTIONS = ("batch_size", "lr", "num_workers", "freeze_observer_epoch", "freeze_bn_epoch",
+               "early_stop_patience", "max_steps", "val_max_batches")
+
+# 早停：验证精度提升小于该值视为没有提升
+_EARLY_STOP_MIN_DELTA = 1e-3
+
+
+def _default_workers() -> int:
+    try:
+        from config.settings import Config
+        return int(Config.CALIB_WORKERS)
+    except Exception:
+        return 4
+
+
+def _prepare_qat(model: Any, backend: str, example: Any) -> tuple[Any, str]:
+    """插入伪量化节点：优先FX图模式（自动融合Conv-BN-ReLU并插入量化/反量化），无法追踪时回退到eager模式"""
+    import torch.quantization as quant
+
+    model.train()
+    try:
+        from torch.ao.quantization import get_default_qat_qconfig_mapping
+        from torch.ao.quantization.quantize_fx import prepare_qat_fx
+        return prepare_qat_fx(model, get_default_qat_qconfig_mapping(backend), example_inputs=(example,)), "fx"
+    except Exception:
+        model.qconfig = quant.get_default_qat_qconfig(backend)
+        return quant.prepare_qat(model, inplace=False), "eager"
+
+
+def _convert_qat(prepared: Any, mode: str) -> Any:
+    import torch.quantization as quant
+
+    prepared.eval()
+    if mode == "fx":
+        from torch.ao.quantization.quantize_fx import convert_fx
+        return convert_fx(prepared)
+    return quant.convert(prepared, inplace=False)
+
+
+def _freeze_bn(model: Any) -> None:
+    """冻结BN统计量：融合后的QAT模块停止更新running stats，未融合的BN切到eval模式"""
+    from torch import nn
+
+    try:
+        from torch.ao.nn.intrinsic.qat import freeze_bn_stats
+        model.apply(freeze_bn_stats)
+    except ImportError:
+        pass
+    for module in model.modules():
+        if isinstance(module, nn.modules.batchnorm._BatchNorm):
+            module.eval()
+
+
+def _set_observers(model: Any, enabled: bool) -> None:
+    from torch.ao.quantization import disable_observer, enable_observer
+
+    model.apply(enable_observer if enabled else disable_observer)
 
 
 def quantization_aware_training(
@@ -25,8 +88,14 @@ def quantization_aware_training(
     epochs: int = 10,
     batch_size: int = 32,
     lr: float = 1e-4,
-    qconfig: str = "fbgemm",
+    qconfig: Optional[str] = None,
     artifacts_dir: Optional[str] = None,
+    num_workers: Optional[int] = None,
+    freeze_observer_epoch: Optional[int] = None,
+    freeze_bn_epoch: Optional[int] = None,
+    early_stop_patience: Optional[int] = None,
+    max_steps: Optional[int] = None,
+    val_max_batches: Optional[int] = None,
 ) -> Dict[str, Any]:
     """执行量化感知训练（QAT）。
 
@@ -37,51 +106,67 @@ def quantization_aware_training(
         epochs: 训练轮数
         batch_size: 批次大小
         lr: 学习率
-        qconfig: 量化配置（fbgemm用于x86, qnnpack用于ARM）
+        qconfig: 量化后端（x86/fbgemm用于x86, qnnpack用于ARM），为空时按本机指令集选择
         artifacts_dir: 产物目录
+        num_workers: 数据加载进程数（进程在epoch之间保留），为空时使用 Config.CALIB_WORKERS，0为主进程读取
+        freeze_observer_epoch: 从该轮（0起）开始冻结量化观察器，为空时为训练轮数的一半
+        freeze_bn_epoch: 从该轮开始冻结BN统计量，为空时与冻结观察器同一轮
+        early_stop_patience: 验证精度连续多少轮没有提升时提前结束（需要验证集），为空不早停
+        max_steps: 优化步数上限，达到后结束训练
+        val_max_batches: 每轮只用前N个验证批次估计精度，为空使用全部
 
     Returns:
         包含训练状态和精度的字典
     """
+    result = _run_qat(model, train_data_dir=train_data_dir, val_data_dir=val_data_dir, epochs=epochs,
+                      batch_size=batch_size, lr=lr, qconfig=qconfig, artifacts_dir=artifacts_dir,
+                      num_workers=num_workers, freeze_observer_epoch=freeze_observer_epoch,
+                      freeze_bn_epoch=freeze_bn_epoch, early_stop_patience=early_stop_patience,
+                      max_steps=max_steps, val_max_batches=val_max_batches)
+    return result[1]
+
+
+def _run_qat(model: Any, *, train_data_dir: str, val_data_dir: Optional[str], epochs: int, batch_size: int,
+             lr: float, qconfig: Optional[str], artifacts_dir: Optional[str], num_workers: Optional[int],
+             freeze_observer_epoch: Optional[int], freeze_bn_epoch: Optional[int],
+             early_stop_patience: Optional[int], max_steps: Optional[int],
+             val_max_batches: Optional[int]) -> tuple[Optional[Any], Dict[str, Any]]:
+    """QAT训练主流程，返回 (量化后的模型或None, 报告)"""
     try:
+        import copy
+        import itertools
+        import time
         import torch
         from torch import nn
-        from torch.utils.data import DataLoader
-        from torchvision import datasets, transforms
-        import torch.quantization as quant
+        from utils.calibration import get_calibration_set
     except ImportError:
         rep = {"status": "skipped", "reason": "missing dependencies"}
         write_report(artifacts_dir, rep, "qat_report.json")
-        return rep
+        return None, rep
 
     if not os.path.exists(train_data_dir):
         rep = {"status": "error", "reason": "train_data_dir not found"}
         write_report(artifacts_dir, rep, "qat_report.json")
-        return rep
+        return None, rep
 
     try:
-        # 准备数据
-        transform = transforms.Compose([
-            transforms.Resize(256),
-            transforms.CenterCrop(224),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
+        epochs = int(epochs)
+        workers = _default_workers() if num_workers is None else max(0, int(num_workers))
+        freeze_observer_epoch = epochs // 2 if freeze_observer_epoch is None else int(freeze_observer_epoch)
+        freeze_bn_epoch = freeze_observer_epoch if freeze_bn_epoch is None else int(freeze_bn_epoch)
 
-        train_dataset = datasets.ImageFolder(train_data_dir, transform=transform)
-        train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, num_workers=0)
+        # 准备数据（解码结果缓存到磁盘，与int8_static/TensorRT校准共用；工作进程预取并在epoch之间保留）
+        train_set = get_calibration_set(train_data_dir)
+        train_loader = train_set.loader(batch_size=batch_size, shuffle=True, workers=workers, persistent=epochs > 1)
 
         val_loader = None
         if val_data_dir and os.path.exists(val_data_dir):
-            val_dataset = datasets.ImageFolder(val_data_dir, transform=transform)
-            val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False, num_workers=0)
-
-        # 配置QAT
-        model.train()
-        model.qconfig = quant.get_default_qat_qconfig(qconfig)
+            val_loader = get_calibration_set(val_data_dir).loader(batch_size=batch_size)
 
-        # 准备QAT模型
-        model_prepared = quant.prepare_qat(model, inplace=False)
+        # 配置QAT（qconfig与量化引擎使用同一后端）
+        qconfig = activate_backend(select_backend(qconfig))
+        example, _ = next(iter(train_set.loader(batch_size=1, workers=0)))
+        model_prepared, mode = _prepare_qat(model, qconfig, example)
 
         # 训练
         optimizer = torch.optim.Adam(model_prepared.parameters(), lr=lr)
@@ -89,9 +174,22 @@ def quantization_aware_training(
 
         train_losses = []
         val_accuracies = []
+        steps = 0
+        best_acc, best_epoch, best_state = None, None, None
+        stale_epochs = 0
+        stopped = None
+        observers_frozen = bn_frozen = False
+        started = time.perf_counter()
 
         for epoch in range(epochs):
             model_prepared.train()
+            if epoch >= freeze_observer_epoch and not observers_frozen:
+                _set_observers(model_prepared, False)
+                observers_frozen = True
+            if epoch >= freeze_bn_epoch:
+                bn_frozen = True
+            if bn_frozen:
+                _freeze_bn(model_prepared)
             epoch_loss = 0.0
             num_batches = 0
 
@@ -102,24 +200,45 @@ def quantization_aware_training(
 
                 loss = criterion(outputs, labels)
 
-                optimizer.zero_grad()
+                optimizer.zero_grad(set_to_none=True)
                 loss.backward()
                 optimizer.step()
 
                 epoch_loss += loss.item()
                 num_batches += 1
+                steps += 1
+                if max_steps and steps >= int(max_steps):
+                    stopped = "max_steps"
+                    break
 
             avg_loss = epoch_loss / num_batches if num_batches > 0 else 0
             train_losses.append(avg_loss)
 
-            # 验证
+            # 验证（关闭观察器，避免验证数据改变量化参数）
             if val_loader:
-                val_acc = evaluate_accuracy(model_prepared, val_loader)
+                _set_observers(model_prepared, False)
+                batches = itertools.islice(val_loader, int(val_max_batches)) if val_max_batches else val_loader
+                val_acc = evaluate_accuracy(model_prepared, batches)
+                if not observers_frozen:
+                    _set_observers(model_prepared, True)
                 val_accuracies.append(val_acc)
+                if best_acc is None or val_acc > best_acc + _EARLY_STOP_MIN_DELTA:
+                    best_acc, best_epoch, stale_epochs = val_acc, epoch, 0
+                    if early_stop_patience:
+                        best_state = copy.deepcopy(model_prepared.state_dict())
+                else:
+                    stale_epochs += 1
+                    if early_stop_patience and stale_epochs >= int(early_stop_patience):
+                        stopped = "early_stop"
+            if stopped:
+                break
+
+        # 早停时回到验证精度最高的一轮
+        if stopped == "early_stop" and best_state is not None:
+            model_prepared.load_state_dict(best_state)
 
         # 转换为量化模型
-        model_prepared.eval()
-        model_quantized = quant.convert(model_prepared, inplace=False)
+        model_quantized = _convert_qat(model_prepared, mode)
 
         # 保存量化模型
         if artifacts_dir:
@@ -130,20 +249,30 @@ def quantization_aware_training(
         rep = {
             "status": "ok",
             "method": "qat",
+            "qat_mode": mode,
             "epochs": epochs,
+            "epochs_run": len(train_losses),
+            "steps": steps,
+            "stopped": stopped,
             "qconfig": qconfig,
+            "backend": qconfig,
+            "data_workers": workers,
+            "freeze_observer_epoch": freeze_observer_epoch,
+            "freeze_bn_epoch": freeze_bn_epoch,
+            "best_epoch": best_epoch,
+            "train_seconds": round(time.perf_counter() - started, 2),
             "final_train_loss": train_losses[-1] if train_losses else None,
             "final_val_accuracy": val_accuracies[-1] if val_accuracies else None,
             "train_losses": train_losses,
             "val_accuracies": val_accuracies,
         }
         write_report(artifacts_dir, rep, "qat_report.json")
-        return rep
+        return model_quantized, rep
 
     except Exception as e:
         rep = {"status": "error", "reason": str(e)}
         write_report(artifacts_dir, rep, "qat_report.json")
-        return rep
+        return None, rep
 
 
 def apply_qat(model: Any, qc: Dict[str, Any]) -> tuple[Any, Dict[str, Any]]:
@@ -162,12 +291,14 @@ def apply_qat(model: Any, qc: Dict[str, Any]) -> tuple[Any, Dict[str, Any]]:
     if not train_data_dir:
         try:
             import torch
+            backend = activate_backend(select_backend(qc.get("qconfig") or qc.get("target_backend")))
             quantized_model = torch.quantization.quantize_dynamic(
                 model, {torch.nn.Linear}, dtype=torch.qint8
             )
             result = {
                 "status": "fallback",
                 "method": "int8_dynamic",
+                "backend": backend,
                 "reason": "QAT requires train_data_dir, fallback to int8_dynamic"
             }
 
@@ -184,13 +315,13 @@ def apply_qat(model: Any, qc: Dict[str, Any]) -> tuple[Any, Dict[str, Any]]:
             return model, {"status": "error", "reason": f"QAT fallback failed: {str(e)}"}
 
     val_data_dir = qc.get("val_data_dir")
-    epochs = qc.get("epochs", 10)
-    batch_size = qc.get("batch_size", 32)
-    lr = qc.get("lr", 1e-4)
-    qconfig = qc.get("qconfig", "fbgemm")
+    epochs = qc.get("epochs") or 10
+    batch_size = qc.get("batch_size") or 32
+    lr = qc.get("lr") or 1e-4
+    qconfig = qc.get("qconfig") or qc.get("target_backend")
     artifacts_dir = qc.get("artifacts_dir")
 
-    result = quantization_aware_training(
+    quantized_model, result = _run_qat(
         model,
         train_data_dir=train_data_dir,
         val_data_dir=val_data_dir,
@@ -198,7 +329,13 @@ def apply_qat(model: Any, qc: Dict[str, Any]) -> tuple[Any, Dict[str, Any]]:
         batch_size=batch_size,
         lr=lr,
         qconfig=qconfig,
-        artifacts_dir=artifacts_dir
+        artifacts_dir=artifacts_dir,
+        num_workers=qc.get("num_workers"),
+        freeze_observer_epoch=qc.get("freeze_observer_epoch"),
+        freeze_bn_epoch=qc.get("freeze_bn_epoch"),
+        early_stop_patience=qc.get("early_stop_patience"),
+        max_steps=qc.get("max_steps"),
+        val_max_batches=qc.get("val_max_batches"),
     )
 
     # 添加 outputs 字段
@@ -207,6 +344,6 @@ def apply_qat(model: Any, qc: Dict[str, Any]) -> tuple[Any, Dict[str, Any]]:
         if os.path.exists(model_path):
             result["outputs"] = [model_path]
 
-    return model, result
+    return (quantized_model if quantized_model is not None else model), result
 
 
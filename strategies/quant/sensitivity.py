@@ -0,0 +1,205 @@
+"""逐层敏感度分析的混合精度量化
+
+步骤：
+1. 在一小批校准数据上记录FP32模型输出；
+2. 逐层模拟INT8（权重按输出通道对称量化、输入按张量仿射量化），其余层保持FP32，
+   以模型输出的相对L2误差作为该层的敏感度；
+3. 按敏感度从高到低把层保留为FP32，直到其余层误差之和不超过 max_error
+   （最多保留 max_fp32_ratio 比例的层）；
+4. 其余层做INT8静态量化（FX，按模块名关闭FP32层的qconfig）；无法FX追踪时对未保留的Linear做动态量化。
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from .backend import activate_backend, select_backend
+except ImportError:
+    from strategies.quant.backend import activate_backend, select_backend
+
+try:
+    from strategies.fuse import fuse_conv_bn, strip_identity
+except ImportError:
+    fuse_conv_bn = strip_identity = None
+
+try:
+    from ..common import flatten_outputs
+except ImportError:
+    from strategies.common import flatten_outputs
+
+try:
+    from utils.calibration import get_calibration_set
+except ImportError:
+    get_calibration_set = None
+
+DEFAULT_MAX_ERROR = 0.02
+DEFAULT_MAX_FP32_RATIO = 0.25
+DEFAULT_SENSITIVITY_SAMPLES = 8
+
+
+def output_error(reference: Sequence[Any], output: Any) -> float:
+    """输出相对L2误差 ||y_q - y|| / ||y||"""
+    import torch
+
+    outputs = flatten_outputs(output)
+    if len(outputs) != len(reference) or not reference:
+        return float("inf")
+    num = sum(float(torch.linalg.vector_norm(o.float() - r)) ** 2 for o, r in zip(outputs, reference))
+    den = sum(float(torch.linalg.vector_norm(r)) ** 2 for r in reference)
+    return math.sqrt(num / den) if den > 0 else math.sqrt(num)
+
+
+def _fake_quant_weight(weight: Any) -> Any:
+    """按输出通道对称INT8量化后反量化"""
+    import torch
+
+    flat = weight.detach().reshape(weight.shape[0], -1)
+    scale = flat.abs().amax(dim=1).clamp(min=1e-12) / 127.0
+    q = torch.clamp(torch.round(flat / scale[:, None]), -127, 127)
+    return (q * scale[:, None]).reshape(weight.shape).to(weight.dtype)
+
+
+def _fake_quant_activation(x: Any) -> Any:
+    """按张量的uint8仿射量化后反量化（范围取当前批次的min/max，对应MinMax观察器）"""
+    import torch
+
+    lo = min(float(x.min()), 0.0)
+    hi = max(float(x.max()), 0.0)
+    scale = (hi - lo) / 255.0 or 1e-8
+    zero_point = round(-lo / scale)
+    q = torch.clamp(torch.round(x / scale) + zero_point, 0, 255)
+    return ((q - zero_point) * scale).to(x.dtype)
+
+
+def quantizable_layers(model: Any) -> List[Tuple[str, Any]]:
+    """参与敏感度分析的层（Conv2d、Linear）"""
+    import torch.nn as nn
+
+    return [(name, m) for name, m in model.named_modules()
+            if name and type(m) in (nn.Conv2d, nn.Linear)]
+
+
+def layer_sensitivity(model: Any, inputs: Any) -> Tuple[Dict[str, float], List[Any]]:
+    """逐层模拟INT8，返回 ({层名: 输出相对误差}, FP32参考输出)"""
+    import torch
+
+    model.eval()
+    with torch.no_grad():
+        reference = flatten_outputs(model(inputs))
+        if not reference:
+            raise ValueError("Model output contains no floating point tensors")
+
+        errors: Dict[str, float] = {}
+        for name, module in quantizable_layers(model):
+            original = module.weight.data
+            module.weight.data = _fake_quant_weight(original)
+            handle = module.register_forward_pre_hook(
+                lambda _m, args: (_fake_quant_activation(args[0]),) + tuple(args[1:]))
+            try:
+                errors[name] = output_error(reference, model(inputs))
+            finally:
+                handle.remove()
+                module.weight.data = original
+    return errors, reference
+
+
+def select_fp32_layers(errors: Dict[str, float], max_error: float, max_fp32_ratio: float) -> Tuple[List[str], float]:
+    """从最敏感的层开始保留FP32，直到其余层误差之和 <= max_error 或达到保留上限
+
+    返回 (保留FP32的层名, 估计误差)；误差按各层误差相加近似
+    """
+    ranked = sorted(errors.items(), key=lambda kv: kv[1], reverse=True)
+    limit = int(math.ceil(len(ranked) * max(0.0, min(1.0, max_fp32_ratio))))
+    remaining = sum(err for _, err in ranked if math.isfinite(err))
+    keep: List[str] = []
+    for name, err in ranked:
+        if (remaining <= max_error and math.isfinite(err)) or len(keep) >= limit:
+            break
+        keep.append(name)
+        if math.isfinite(err):
+            remaining -= err
+    return keep, max(0.0, remaining)
+
+
+def _calibration_batches(calib_dir: Optional[str], calib_num: Optional[int], shape: Tuple[int, ...],
+                         info: Dict[str, Any]) -> List[Any]:
+    """校准批次：有校准数据时读取（共用解码缓存），否则使用随机输入"""
+    import torch
+
+    if calib_dir and get_calibration_set is not None:
+        try:
+            calib_set = get_calibration_set(calib_dir, input_shape=shape, max_samples=calib_num or 64)
+            info.update(calib_set.info())
+            return list(calib_set.batches())
+        except Exception as e:
+            info["calibration_error"] = str(e)
+    info["calibration"] = "random_data"
+    return [torch.randn(DEFAULT_SENSITIVITY_SAMPLES, *shape[1:]) for _ in range(2)]
+
+
+def apply_mixed_precision(
+    model: Any,
+    calib_dir: Optional[str] = None,
+    calib_num: Optional[int] = None,
+    input_shape: Sequence[int] = (1, 3, 224, 224),
+    backend: Optional[str] = None,
+    max_error: Optional[float] = None,
+    max_fp32_ratio: Optional[float] = None,
+) -> Tuple[Any, Dict[str, Any]]:
+    """敏感度驱动的混合精度INT8量化，返回 (量化后的模型, 信息)"""
+    import torch
+
+    max_error = float(DEFAULT_MAX_ERROR if max_error is None else max_error)
+    max_fp32_ratio = float(DEFAULT_MAX_FP32_RATIO if max_fp32_ratio is None else max_fp32_ratio)
+    shape = tuple(int(v) for v in (input_shape or (1, 3, 224, 224)))
+    info: Dict[str, Any] = {"precision": "mixed_int8", "max_error": max_error, "max_fp32_ratio": max_fp32_ratio}
+    info["backend"] = backend = activate_backend(backend or select_backend())
+
+    if fuse_conv_bn is not None and any(isinstance(m, torch.nn.BatchNorm2d) for m in model.modules()):
+        # 敏感度按融合后的卷积计算，与最终量化的图一致；在副本上融合，失败时调用方回退用的仍是原模型
+        import copy
+        fused, fuse_info = fuse_conv_bn(copy.deepcopy(model))
+        if fuse_info:
+            model = strip_identity(fused)
+            info.update(fuse_info)
+    batches = _calibration_batches(calib_dir, calib_num, shape, info)
+    probe = torch.cat(batches)[:DEFAULT_SENSITIVITY_SAMPLES]
+    errors, reference = layer_sensitivity(model, probe)
+    fp32_layers, estimated = select_fp32_layers(errors, max_error, max_fp32_ratio)
+    top = sorted(errors.items(), key=lambda kv: kv[1], reverse=True)[:10]
+    info.update({
+        "fp32_layers": fp32_layers,
+        "quantized_layers": len(errors) - len(fp32_layers),
+        "estimated_error": round(estimated, 6),
+        "sensitivity_top": {name: round(err, 6) for name, err in top},
+    })
+
+    try:
+        from torch.ao.quantization import get_default_qconfig_mapping
+        from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+        qconfig_mapping = get_default_qconfig_mapping(backend)
+        for name in fp32_layers:
+            qconfig_mapping.set_module_name(name, None)
+        prepared = prepare_fx(model, qconfig_mapping, example_inputs=(probe[:1],))
+        with torch.no_grad():
+            for images in batches:
+                prepared(images)
+        quantized = convert_fx(prepared)
+        info["mode"] = "static"
+    except Exception as e:
+        # 无法FX追踪（如含动态控制流）：只对未保留的Linear做动态量化
+        import torch.nn as nn
+        linear_names = {name for name, m in quantizable_layers(model) if isinstance(m, nn.Linear)}
+        targets = linear_names - set(fp32_layers)
+        if not targets:
+            raise RuntimeError(f"Static quantization failed and no Linear layers to quantize: {e}")
+        quantized = torch.quantization.quantize_dynamic(model, targets, dtype=torch.qint8)
+        info["mode"] = "dynamic"
+        info["static_error"] = str(e)
+
+    with torch.no_grad():
+        info["measured_error"] = round(output_error(reference, quantized(probe)), 6)
+    return quantized, info
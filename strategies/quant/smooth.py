@@ -0,0 +1,148 @@
+"""SmoothQuant 激活平滑 + Transformer/ViT INT8静态量化
+
+Transformer 中 LayerNorm 输出的少数通道存在幅值很大的离群值，按张量量化激活时其它通道几乎只剩零，
+因此这类模型原先只能做Linear的动态量化。SmoothQuant 用校准数据统计每个通道的激活最大值 a_j，
+取 s_j = a_j^alpha / w_j^(1-alpha)（w_j 为后续Linear第j列权重的最大值），
+把 LayerNorm 的 weight/bias 除以 s、后续 Linear 的权重列乘以 s，数学上等价，但激活更平滑、更易量化。
+
+- 只平滑输出全部直接进入Linear的 LayerNorm（pre-norm 结构：ViT、timm Block 等）；
+  输出同时进入残差的 LayerNorm（post-norm）无法平滑，保持不变
+- nn.MultiheadAttention 先拆成 q/k/v/out 四个 Linear（SplitMultiheadAttention），
+  FX静态量化才能覆盖注意力中的投影矩阵乘；注意力本身仍为浮点
+- 只静态量化 Linear（输入按校准得到的固定scale量化，输出反量化），残差流、LayerNorm、GELU 保持浮点：
+  残差流的离群值无法平滑，全部量化时误差会放大数倍
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import torch
+import torch.nn as nn
+
+try:
+    from .backend import activate_backend, select_backend
+    from .sensitivity import _calibration_batches, output_error
+except ImportError:
+    from strategies.quant.backend import activate_backend, select_backend
+    from strategies.quant.sensitivity import _calibration_batches, output_error
+
+try:
+    from ..attention import split_attention
+    from ..common import flatten_outputs
+except ImportError:
+    from strategies.attention import split_attention
+    from strategies.common import flatten_outputs
+
+DEFAULT_SMOOTH_ALPHA = 0.5
+# 平滑系数的下限，避免全零通道产生无穷大的缩放
+_MIN_SCALE = 1e-5
+
+
+def smoothing_groups(gm: Any) -> List[Tuple[str, List[str]]]:
+    """(LayerNorm名称, [后续Linear名称])：LayerNorm只被调用一次，且输出的所有使用者都是输入维度匹配的Linear"""
+    modules = dict(gm.named_modules())
+    calls = Counter(n.target for n in gm.graph.nodes if n.op == "call_module")
+    groups = []
+    for node in gm.graph.nodes:
+        norm = modules.get(node.target) if node.op == "call_module" else None
+        if not isinstance(norm, nn.LayerNorm) or not norm.elementwise_affine or calls[node.target] != 1:
+            continue
+        users = list(node.users)
+        linears = [u.target for u in users if u.op == "call_module" and type(modules.get(u.target)) is nn.Linear]
+        if not users or len(linears) != len(users):
+            continue
+        if any(calls[name] != 1 or modules[name].in_features != norm.weight.numel() for name in linears):
+            continue
+        groups.append((node.target, linears))
+    return groups
+
+
+def _activation_absmax(model: nn.Module, names: Sequence[str], batches: Sequence[Any]) -> Dict[str, Any]:
+    """在校准批次上统计指定LayerNorm输出每个通道的绝对值最大值"""
+    modules = dict(model.named_modules())
+    stats: Dict[str, Any] = {}
+
+    def hook(name: str):
+        def record(_module: Any, _inputs: Any, output: Any) -> None:
+            amax = output.detach().abs().reshape(-1, output.shape[-1]).amax(dim=0)
+            stats[name] = amax if name not in stats else torch.maximum(stats[name], amax)
+        return record
+
+    handles = [modules[name].register_forward_hook(hook(name)) for name in names]
+    try:
+        with torch.no_grad():
+            for batch in batches:
+                model(batch)
+    finally:
+        for handle in handles:
+            handle.remove()
+    return stats
+
+
+def smooth_layernorm_linears(model: nn.Module, gm: Any, batches: Sequence[Any],
+                             alpha: float = DEFAULT_SMOOTH_ALPHA) -> Dict[str, Any]:
+    """对可平滑的 LayerNorm→Linear 组做 SmoothQuant 缩放（原地修改 model 的参数），返回统计信息"""
+    groups = smoothing_groups(gm)
+    stats = _activation_absmax(model, [norm for norm, _ in groups], batches)
+    ratios = []
+    with torch.no_grad():
+        for norm_name, linear_names in groups:
+            if norm_name not in stats:
+                continue
+            norm = model.get_submodule(norm_name)
+            linears = [model.get_submodule(name) for name in linear_names]
+            act = stats[norm_name].float().clamp(min=_MIN_SCALE)
+            weight = torch.stack([lin.weight.abs().amax(dim=0) for lin in linears]).amax(dim=0).clamp(min=_MIN_SCALE)
+            scale = (act.pow(alpha) / weight.pow(1 - alpha)).clamp(min=_MIN_SCALE)
+            norm.weight.div_(scale)
+            if norm.bias is not None:
+                norm.bias.div_(scale)
+            for lin in linears:
+                lin.weight.mul_(scale.view(1, -1))
+            ratios.append(float(act.max() / act.median()))
+    return {"smoothed_layernorms": len(ratios), "smooth_alpha": alpha,
+            "max_outlier_ratio": round(max(ratios), 2) if ratios else None}
+
+
+def apply_int8_smoothquant(
+    model: Any,
+    calib_dir: Optional[str] = None,
+    calib_num: Optional[int] = None,
+    input_shape: Sequence[int] = (1, 3, 224, 224),
+    backend: Optional[str] = None,
+    alpha: Optional[float] = None,
+) -> Tuple[Any, Dict[str, Any]]:
+    """SmoothQuant平滑后对全部Linear做FX INT8静态量化，返回 (量化后的模型, 信息)"""
+    import torch.fx as fx
+    from torch.ao.quantization import QConfigMapping, get_default_qconfig
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    alpha = float(DEFAULT_SMOOTH_ALPHA if alpha is None else alpha)
+    if not 0.0 <= alpha <= 1.0:
+        raise ValueError(f"smooth_alpha must be within [0, 1], got {alpha}")
+    shape = tuple(int(v) for v in (input_shape or (1, 3, 224, 224)))
+    info: Dict[str, Any] = {"precision": "int8_static", "strategy": "smoothquant"}
+    info["backend"] = backend = activate_backend(backend or select_backend())
+
+    model.eval()
+    fx.symbolic_trace(model)  # 无法追踪时在修改模型之前失败
+    info["split_attention"] = split_attention(model)
+    gm = fx.symbolic_trace(model)
+    batches = _calibration_batches(calib_dir, calib_num, shape, info)
+    with torch.no_grad():
+        reference = flatten_outputs(model(batches[0]))
+    info.update(smooth_layernorm_linears(model, gm, batches, alpha))
+    if not info["smoothed_layernorms"]:
+        raise ValueError("No LayerNorm->Linear groups to smooth (post-norm or untraceable attention blocks)")
+
+    qconfig_mapping = QConfigMapping().set_object_type(nn.Linear, get_default_qconfig(backend))
+    prepared = prepare_fx(model, qconfig_mapping, example_inputs=(batches[0][:1],))
+    with torch.no_grad():
+        for batch in batches:
+            prepared(batch)
+    quantized = convert_fx(prepared)
+    with torch.no_grad():
+        info["measured_error"] = round(output_error(reference, quantized(batches[0])), 6)
+    return quantized, info
@@ -0,0 +1,213 @@
+"""仅权重分组量化（weight-only INT8/INT4）
+
+nn.Linear 的权重按输入维度每 group_size 个元素一组做非对称量化（每组一个fp16 scale和一个零点），
+INT4 两个值打包进一个字节（零点同样打包）。WeightOnlyLinear 在前向时反量化权重再做FP32矩阵乘，
+激活保持浮点，因此可以导出ONNX。这是存储压缩：文件和常驻权重约为FP32的1/4（INT8）或1/8（INT4），
+但每次前向都会反量化出完整的FP32权重，推理不会比FP32更快（没有融合反量化的矩阵乘kernel）。
+
+产物：完整模型 .pt 之外另写 <name>.woq.safetensors（头部 __metadata__ 记录位宽、分组和被量化的层），
+load_weight_only_model 可把它加载到原始FP32结构中。
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+try:
+    from utils.checkpoint import load_safetensors, read_safetensors_metadata, save_safetensors
+except ImportError:
+    load_safetensors = read_safetensors_metadata = save_safetensors = None
+
+WOQ_FORMAT = "ccs-woq-v1"
+WOQ_SUFFIX = ".woq.safetensors"
+WEIGHT_ONLY_BITS = (4, 8)
+DEFAULT_GROUP_SIZE = 128
+
+
+def pack_int4(q: torch.Tensor) -> torch.Tensor:
+    """最后一维两两打包为uint8（低4位在前），最后一维长度需为偶数"""
+    q = q.to(torch.uint8)
+    return q[..., 0::2] | (q[..., 1::2] << 4)
+
+
+def unpack_int4(packed: torch.Tensor, size: int) -> torch.Tensor:
+    """pack_int4 的逆操作，返回最后一维长度为size的张量（用整数除法拆分，便于导出ONNX）"""
+    packed = packed.to(torch.int32)
+    high = packed // 16
+    low = packed - high * 16
+    return torch.stack((low, high), dim=-1).flatten(-2)[..., :size]
+
+
+def quantize_groups(weight: torch.Tensor, bits: int, group_size: int) -> Dict[str, torch.Tensor]:
+    """按 [out, in/group_size] 分组非对称量化，返回 qweight/scales/zeros（INT4时qweight、zeros已打包）"""
+    out_features, in_features = weight.shape
+    groups = -(-in_features // group_size)
+    padded = groups * group_size
+    w = weight.detach().float()
+    if padded != in_features:
+        w = F.pad(w, (0, padded - in_features))
+    w = w.reshape(out_features, groups, group_size)
+
+    qmax = (1 << bits) - 1
+    w_min = w.amin(dim=2).clamp(max=0.0)
+    w_max = w.amax(dim=2).clamp(min=0.0)
+    scales = ((w_max - w_min) / qmax).half()
+    scales = torch.where(scales > 0, scales, torch.ones_like(scales))  # 全零组或fp16下溢
+    zeros = torch.clamp(torch.round(-w_min / scales.float()), 0, qmax)
+    q = torch.clamp(torch.round(w / scales.float()[..., None]) + zeros[..., None], 0, qmax)
+    q = q.reshape(out_features, padded).to(torch.uint8)
+    zeros = zeros.to(torch.uint8)
+    if bits == 4:
+        q = pack_int4(q)
+        if groups % 2:
+            zeros = F.pad(zeros, (0, 1))
+        zeros = pack_int4(zeros)
+    return {"qweight": q, "scales": scales, "zeros": zeros}
+
+
+def effective_group_size(group_size: int, in_features: int) -> int:
+    """输入维度小于group_size时整行为一组（取偶数，保证INT4可打包）"""
+    return min(int(group_size), in_features + in_features % 2)
+
+
+class WeightOnlyLinear(nn.Module):
+    """权重以分组INT8/INT4存储、前向时反量化的Linear"""
+
+    def __init__(self, in_features: int, out_features: int, bits: int = 8,
+                 group_size: int = DEFAULT_GROUP_SIZE, bias: bool = True):
+        super().__init__()
+        if bits not in WEIGHT_ONLY_BITS:
+            raise ValueError(f"Unsupported bits: {bits}, expected one of {WEIGHT_ONLY_BITS}")
+        self.in_features = in_features
+        self.out_features = out_features
+        self.bits = bits
+        self.group_size = group_size
+        groups = -(-in_features // group_size)
+        padded = groups * group_size
+        per_byte = 8 // bits
+        self.register_buffer("qweight", torch.zeros(out_features, padded // per_byte, dtype=torch.uint8))
+        self.register_buffer("scales", torch.ones(out_features, groups, dtype=torch.float16))
+        self.register_buffer("zeros", torch.zeros(out_features, -(-groups // per_byte), dtype=torch.uint8))
+        if bias:
+            self.register_buffer("bias", torch.zeros(out_features))
+        else:
+            self.bias = None
+
+    @classmethod
+    def from_linear(cls, linear: nn.Linear, bits: int = 8, group_size: int = DEFAULT_GROUP_SIZE) -> "WeightOnlyLinear":
+        group_size = effective_group_size(group_size, linear.in_features)
+        module = cls(linear.in_features, linear.out_features, bits=bits, group_size=group_size,
+                     bias=linear.bias is not None)
+        packed = quantize_groups(linear.weight, bits, group_size)
+        module.qweight.copy_(packed["qweight"])
+        module.scales.copy_(packed["scales"])
+        module.zeros.copy_(packed["zeros"])
+        if linear.bias is not None:
+            module.bias.copy_(linear.bias.detach().float())
+        return module.to(linear.weight.device)
+
+    def dequantize(self) -> torch.Tensor:
+        """还原FP32权重 [out_features, in_features]"""
+        groups = self.scales.shape[1]
+        q = self.qweight
+        zeros = self.zeros
+        if self.bits == 4:
+            q = unpack_int4(q, groups * self.group_size)
+            zeros = unpack_int4(zeros, groups)
+        w = (q.reshape(self.out_features, groups, self.group_size).float() - zeros.float()[..., None]) \
+            * self.scales.float()[..., None]
+        return w.reshape(self.out_features, -1)[:, :self.in_features]
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        # 每次调用临时反量化（不缓存FP32权重，否则常驻内存回到FP32大小）
+        weight = self.dequantize().to(x.dtype)
+        bias = self.bias.to(x.dtype) if self.bias is not None else None
+        return F.linear(x, weight, bias)
+
+    def extra_repr(self) -> str:
+        return (f"in_features={self.in_features}, out_features={self.out_features}, "
+                f"bits={self.bits}, group_size={self.group_size}, bias={self.bias is not None}")
+
+
+def _set_module(model: nn.Module, name: str, module: nn.Module) -> None:
+    parent = model
+    parts = name.split(".")
+    for part in parts[:-1]:
+        parent = getattr(parent, part)
+    setattr(parent, parts[-1], module)
+
+
+def _target_linears(model: nn.Module) -> List[Tuple[str, nn.Linear]]:
+    """只替换普通nn.Linear（MultiheadAttention的out_proj等子类直接读取weight，保持不变）"""
+    return [(name, m) for name, m in model.named_modules() if name and type(m) is nn.Linear]
+
+
+def apply_weight_only(model: Any, bits: int = 8, group_size: Optional[int] = None) -> Tuple[Any, Dict[str, Any]]:
+    """把模型中的nn.Linear替换为WeightOnlyLinear，返回 (模型, 信息)"""
+    bits = int(bits or 8)
+    if bits not in WEIGHT_ONLY_BITS:
+        raise ValueError(f"Unsupported bits for weight-only quantization: {bits}, expected one of {WEIGHT_ONLY_BITS}")
+    group_size = int(group_size or DEFAULT_GROUP_SIZE)
+    if group_size <= 0 or group_size % 2:
+        raise ValueError(f"group_size must be a positive even number, got {group_size}")
+
+    targets = _target_linears(model)
+    if not targets:
+        raise ValueError("Model has no nn.Linear layers for weight-only quantization")
+    bytes_before = bytes_after = 0
+    layers = []
+    with torch.no_grad():
+        for name, linear in targets:
+            module = WeightOnlyLinear.from_linear(linear, bits=bits, group_size=group_size)
+            bytes_before += linear.weight.numel() * linear.weight.element_size()
+            bytes_after += sum(t.numel() * t.element_size() for t in (module.qweight, module.scales, module.zeros))
+            _set_module(model, name, module)
+            layers.append(name)
+    model._weight_only = {"bits": bits, "group_size": group_size, "layers": layers}
+    return model, {
+        "precision": f"weight_only_int{bits}",
+        "bits": bits,
+        "group_size": group_size,
+        "layers_quantized": len(layers),
+        "weight_mb_before": round(bytes_before / (1024 * 1024), 4),
+        "weight_mb_after": round(bytes_after / (1024 * 1024), 4),
+    }
+
+
+def save_weight_only_model(model: Any, path: str) -> Dict[str, Any]:
+    """把 apply_weight_only 处理后的模型保存为safetensors（被量化的层只保存qweight/scales/zeros/bias）"""
+    spec = getattr(model, "_weight_only", None)
+    if not spec:
+        raise ValueError("Model was not quantized with apply_weight_only")
+    tensors = {k: v.detach().cpu().contiguous() for k, v in model.state_dict().items()}
+    metadata = {"format": WOQ_FORMAT, "bits": str(spec["bits"]), "group_size": str(spec["group_size"]),
+                "layers": json.dumps(spec["layers"]),
+                "model_class": f"{type(model).__module__}.{type(model).__qualname__}"}
+    save_safetensors(path, tensors, metadata)
+    return {"woq_path": path, "woq_bits": spec["bits"], "woq_group_size": spec["group_size"]}
+
+
+def load_weight_only_model(path: str, model: Any) -> Any:
+    """把 .woq.safetensors 加载到给定的原始FP32结构中（先替换对应的Linear再加载state_dict）"""
+    meta = read_safetensors_metadata(path) or {}
+    if meta.get("format") != WOQ_FORMAT:
+        raise ValueError(f"Not a weight-only artifact: {path}")
+    bits = int(meta["bits"])
+    group_size = int(meta["group_size"])
+    layers = json.loads(meta.get("layers") or "[]")
+    modules = dict(model.named_modules())
+    for name in layers:
+        linear = modules.get(name)
+        if not isinstance(linear, nn.Linear):
+            raise ValueError(f"Layer {name} is not an nn.Linear in the given model")
+        _set_module(model, name, WeightOnlyLinear(linear.in_features, linear.out_features, bits=bits,
+                                                  group_size=effective_group_size(group_size, linear.in_features),
+                                                  bias=linear.bias is not None))
+    model.load_state_dict(load_safetensors(path))
+    model._weight_only = {"bits": bits, "group_size": group_size, "layers": layers}
+    return model
@@ -0,0 +1,93 @@
+"""检查点嗅探：不反序列化张量读取pickle中的类名和键名"""
+import pytest
+
+from utils.checkpoint import model_class_names, sniff_checkpoint
+
+torch = pytest.importorskip("torch")
+
+
+class TinyNet(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.conv = torch.nn.Conv2d(3, 4, 3)
+        self.bn = torch.nn.BatchNorm2d(4)
+        self.fc = torch.nn.Linear(4, 2)
+
+
+@pytest.mark.parametrize("zip_format", [True, False])
+def test_sniff_full_model(tmp_path, zip_format):
+    path = str(tmp_path / "model.pt")
+    torch.save(TinyNet(), path, _use_new_zipfile_serialization=zip_format)
+    sniffed = sniff_checkpoint(path)
+    names = model_class_names(sniffed["globals"])
+    assert names[0].endswith("TinyNet")
+    assert {"Conv2d", "BatchNorm2d", "Linear"} <= set(names)
+
+
+def test_sniff_state_dict_keys(tmp_path):
+    path = str(tmp_path / "weights.pth")
+    torch.save(TinyNet().state_dict(), path)
+    sniffed = sniff_checkpoint(path)
+    assert {"conv.weight", "bn.running_mean", "fc.bias"} <= set(sniffed["strings"])
+    assert not any(name.endswith("TinyNet") for name in model_class_names(sniffed["globals"]))
+
+
+def test_sniff_unreadable_files(tmp_path):
+    assert sniff_checkpoint(str(tmp_path / "missing.pt")) is None
+    path = tmp_path / "garbage.pt"
+    path.write_bytes(b"not a pickle")
+    assert sniff_checkpoint(str(path)) is None
+
+
+def test_model_class_names_filters_torch_internals():
+    names = model_class_names([
+        "torch._utils._rebuild_tensor_v2", "torch.FloatStorage", "collections.OrderedDict",
+        "torch.nn.modules.conv.Conv2d", "torchvision.models.resnet.ResNet", "torch.nn.modules.conv.Conv2d",
+    ])
+    assert names == ["Conv2d", "torchvision.models.resnet.ResNet"]
+
+
+def _detect(tmp_path, obj, name="model"):
+    from adapters.registry import get_adapter
+
+    model_dir = tmp_path / name
+    model_dir.mkdir()
+    torch.save(obj, str(model_dir / "weights.pt"))
+    adapter = get_adapter("pytorch", "generic")(model_dir=str(model_dir), artifacts_dir=str(tmp_path / "out"),
+                                                 family="generic")
+    return adapter._detect_from_checkpoint()
+
+
+def _module_class(module_name, class_name, build):
+    """在指定模块路径下定义模型类（pickle按 模块.类名 记录）"""
+    import sys
+    import types
+
+    module = sys.modules.setdefault(module_name, types.ModuleType(module_name))
+    cls = type(class_name, (torch.nn.Module,), {"__init__": build, "__module__": module_name})
+    setattr(module, class_name, cls)
+    return cls
+
+
+def test_detect_matches_top_level_class_name(tmp_path):
+    def build(self):
+        torch.nn.Module.__init__(self)
+        self.fc = torch.nn.Linear(2, 2)
+
+    assert _detect(tmp_path, _module_class("sniff_models", "ResNetLike", build)()) == "resnet"
+
+
+def test_detect_ignores_module_path_and_helper_classes(tmp_path):
+    def build(self):
+        torch.nn.Module.__init__(self)
+        self.encoder = torch.nn.LSTM(4, 4)
+        self.head = torch.nn.Linear(4, 2)
+
+    net = _module_class("vanilla_cnn", "Net", build)()
+    assert _detect(tmp_path, net) is None
+
+
+def test_detect_state_dict_key_signatures(tmp_path):
+    torchvision = pytest.importorskip("torchvision")
+    assert _detect(tmp_path, torchvision.models.resnet18().state_dict()) == "resnet"
+    assert _detect(tmp_path, torchvision.models.vgg11().state_dict(), name="vgg") is None
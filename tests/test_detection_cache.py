@@ -0,0 +1,85 @@
+"""模型识别缓存：目录指纹与LRU/持久化"""
+import os
+
+import pytest
+
+# services.model 通过适配器注册表导入torch
+pytest.importorskip("torch")
+
+from services.model import DetectionCache, model_dir_fingerprint  # noqa: E402
+
+DETECTION = {"framework": "pytorch", "family": "resnet", "original_format": "pt", "adapter": object()}
+
+
+def _write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def test_fingerprint_stable_and_sensitive_to_changes(tmp_path):
+    _write(tmp_path / "model.pt", b"abc")
+    first = model_dir_fingerprint(str(tmp_path))
+    assert model_dir_fingerprint(str(tmp_path)) == first
+
+    _write(tmp_path / "model.pt", b"abcd")
+    changed = model_dir_fingerprint(str(tmp_path))
+    assert changed != first
+
+    os.makedirs(tmp_path / "sub")
+    _write(tmp_path / "sub" / "extra.json", b"{}")
+    assert model_dir_fingerprint(str(tmp_path)) != changed
+
+
+def test_fingerprint_depends_on_directory(tmp_path):
+    for name in ("a", "b"):
+        os.makedirs(tmp_path / name)
+    assert model_dir_fingerprint(str(tmp_path / "a")) != model_dir_fingerprint(str(tmp_path / "b"))
+
+
+def test_cache_keeps_only_detection_fields(tmp_path):
+    cache = DetectionCache(max_entries=4, path=str(tmp_path / "cache.json"), persist=False)
+    cache.put("k", DETECTION)
+    entry = cache.get("k")
+    assert entry == {"framework": "pytorch", "family": "resnet", "original_format": "pt"}
+    entry["family"] = "vgg"
+    assert cache.get("k")["family"] == "resnet"
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = DetectionCache(max_entries=2, path=str(tmp_path / "cache.json"), persist=False)
+    cache.put("a", DETECTION)
+    cache.put("b", DETECTION)
+    cache.get("a")
+    cache.put("c", DETECTION)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_cache_persists_to_disk(tmp_path):
+    path = str(tmp_path / "cache.json")
+    DetectionCache(max_entries=4, path=path, persist=True).put("k", DETECTION)
+    assert DetectionCache(max_entries=4, path=path, persist=True).get("k")["family"] == "resnet"
+    assert DetectionCache(max_entries=4, path=path, persist=False).get("k") is None
+
+
+def test_detect_from_dir_skips_caching_failed_loads(tmp_path, monkeypatch):
+    import services.model
+    from services.model import ModelDetector
+
+    cache = DetectionCache(max_entries=4, path=str(tmp_path / "cache.json"), persist=False)
+    monkeypatch.setattr(services.model, "_detection_cache", cache)
+    model_dir = tmp_path / "model"
+    model_dir.mkdir()
+    _write(model_dir / "weights.pt", b"not a checkpoint")
+
+    detection = ModelDetector().detect_from_dir(str(model_dir))
+    assert detection["family"] == "generic"
+    assert cache.get(model_dir_fingerprint(str(model_dir))) is None
+
+    torchvision = pytest.importorskip("torchvision")
+    import torch
+    torch.save(torchvision.models.resnet18().state_dict(), str(model_dir / "weights.pt"))
+    family = ModelDetector().detect_from_dir(str(model_dir))["family"]
+    assert family != "generic"
+    assert cache.get(model_dir_fingerprint(str(model_dir)))["family"] == family
+    assert ModelDetector().detect_from_dir(str(model_dir))["detection_method"] == "cache"
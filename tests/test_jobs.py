@@ -0,0 +1,116 @@
+"""异步任务：有界队列、进程池重启、历史记录持久化与 GET /jobs/<job_id>"""
+import os
+import time
+
+import pytest
+
+# services包导入时加载模型识别（通过适配器注册表依赖torch）
+pytest.importorskip("torch")
+
+from services.jobs import JOB_FAILED, JOB_SUCCEEDED, JobManager  # noqa: E402
+from utils.error import APIError, ErrorCode  # noqa: E402
+from utils.file import read_json_list  # noqa: E402
+
+
+def _echo(payload):
+    return {"result_dir": payload.get("res_dir"), "metrics": {"value": payload.get("value")}}
+
+
+def _fail(payload):
+    return {"error": "compression failed", "error_code": ErrorCode.COMPRESSION_FAILED}
+
+
+def _wait_on_file(payload):
+    deadline = time.time() + 30
+    while not os.path.exists(payload["release"]) and time.time() < deadline:
+        time.sleep(0.05)
+    return {}
+
+
+def _crash(payload):
+    os._exit(1)
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = JobManager(max_workers=1, max_pending=1, start_method="fork", history_limit=3)
+    manager.jobs_db = str(tmp_path / "jobs_db.json")
+    yield manager
+    manager.shutdown(wait=True)
+
+
+def _wait(manager, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job["status"] in (JOB_SUCCEEDED, JOB_FAILED):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_job_result_is_recorded(manager):
+    job = manager.submit("optimize", _echo, {"res_dir": "/tmp/out", "value": 3})
+    assert job["status"] == "queued" and job["job_id"].startswith("j_optimize_")
+    done = _wait(manager, job["job_id"])
+    assert done["status"] == JOB_SUCCEEDED
+    assert done["result_dir"] == "/tmp/out" and done["metrics"] == {"value": 3}
+    assert done["started_at"] <= done["finished_at"]
+
+
+def test_job_error_marks_failed(manager):
+    done = _wait(manager, manager.submit("compile", _fail, {})["job_id"])
+    assert done["status"] == JOB_FAILED
+    assert done["error"] == "compression failed"
+    assert done["error_code"] == ErrorCode.COMPRESSION_FAILED
+
+
+def test_queue_full_raises_service_unavailable(manager, tmp_path):
+    release = str(tmp_path / "release")
+    job = manager.submit("optimize", _wait_on_file, {"release": release})
+    with pytest.raises(APIError) as exc:
+        manager.submit("optimize", _echo, {})
+    assert exc.value.code == ErrorCode.SERVICE_UNAVAILABLE == 503
+    open(release, "w").close()
+    _wait(manager, job["job_id"])
+    _wait(manager, manager.submit("optimize", _echo, {})["job_id"])
+
+
+def test_pool_restarts_after_worker_crash(manager):
+    crashed = _wait(manager, manager.submit("optimize", _crash, {})["job_id"])
+    assert crashed["status"] == JOB_FAILED and "Worker process failed" in crashed["error"]
+    done = _wait(manager, manager.submit("optimize", _echo, {"value": 1})["job_id"])
+    assert done["status"] == JOB_SUCCEEDED
+
+
+def test_finished_jobs_are_persisted_and_evicted(manager):
+    job_ids = [_wait(manager, manager.submit("optimize", _echo, {"value": i})["job_id"])["job_id"]
+               for i in range(5)]
+    records = read_json_list(manager.jobs_db)
+    assert [r["job_id"] for r in records] == job_ids[-3:]
+    assert len(manager._jobs) == 3
+
+    restarted = JobManager(max_workers=1, history_limit=3)
+    restarted.jobs_db = manager.jobs_db
+    assert restarted.get(job_ids[-1])["metrics"] == {"value": 4}
+    assert restarted.get(job_ids[0]) is None
+
+
+def test_get_job_endpoint(manager, monkeypatch):
+    import flask
+    import api.jobs
+
+    monkeypatch.setattr(api.jobs, "get_job_manager", lambda: manager)
+    app = flask.Flask(__name__)
+    app.register_blueprint(api.jobs.jobs_api_bp)
+    client = app.test_client()
+
+    job_id = _wait(manager, manager.submit("convert", _echo, {"value": 7})["job_id"])["job_id"]
+    response = client.get(f"/jobs/{job_id}")
+    assert response.status_code == 200
+    assert response.json["data"]["status"] == JOB_SUCCEEDED
+    assert response.json["data"]["metrics"] == {"value": 7}
+
+    missing = client.get("/jobs/j_missing")
+    assert missing.status_code == 404
+    assert missing.json["code"] == ErrorCode.NOT_FOUND
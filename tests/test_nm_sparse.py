@@ -0,0 +1,47 @@
+"""N:M 半结构化稀疏：模式解析与掩码"""
+import pytest
+
+from strategies.prune.nm_sparse import parse_nm
+
+
+@pytest.mark.parametrize("pattern, expected", [("2:4", (2, 4)), ("1:4", (1, 4)), (" 4 : 8 ", (4, 8)), (None, (2, 4))])
+def test_parse_nm_valid(pattern, expected):
+    assert parse_nm(pattern) == expected
+
+
+def test_parse_nm_separate_values():
+    assert parse_nm(None, n=1, m=2) == (1, 2)
+
+
+@pytest.mark.parametrize("pattern", ["4:2", "2:2", "0:4", "2-4", "2:4:8", "a:4", "2:x", "-1:4"])
+def test_parse_nm_invalid(pattern):
+    with pytest.raises(ValueError):
+        parse_nm(pattern)
+
+
+def test_nm_mask_keeps_largest_n_per_group():
+    torch = pytest.importorskip("torch")
+    from strategies.prune.nm_sparse import nm_mask
+
+    weight = torch.tensor([[0.1, -4.0, 3.0, 0.2, 5.0, 0.0, -0.3, 1.0]])
+    mask = nm_mask(weight, 2, 4)
+    assert mask.tolist() == [[0, 1, 1, 0, 1, 0, 0, 1]]
+
+
+def test_nm_mask_rejects_indivisible_input_dim():
+    torch = pytest.importorskip("torch")
+    from strategies.prune.nm_sparse import nm_mask
+
+    assert nm_mask(torch.randn(4, 6), 2, 4) is None
+
+
+def test_apply_nm_sparsity_skips_indivisible_layers():
+    torch = pytest.importorskip("torch")
+    from strategies.prune.nm_sparse import apply_nm_sparsity
+
+    model = torch.nn.Sequential(torch.nn.Linear(8, 6), torch.nn.Linear(6, 4))
+    info = apply_nm_sparsity(model, 2, 4)
+    assert info["layers_pruned"] == 1 and info["layers_skipped"] == 1
+    groups = model[0].weight.reshape(6, -1, 4)
+    assert ((groups != 0).sum(-1) <= 2).all()
+    assert apply_nm_sparsity(torch.nn.Sequential(torch.nn.Linear(6, 4)), 2, 4) is None
@@ -0,0 +1,31 @@
+"""混合精度：按敏感度选择保留FP32的层"""
+import math
+
+from strategies.quant.sensitivity import select_fp32_layers
+
+
+def test_keeps_most_sensitive_until_error_budget_met():
+    errors = {"a": 0.05, "b": 0.5, "c": 0.01, "d": 0.2}
+    keep, estimated = select_fp32_layers(errors, max_error=0.1, max_fp32_ratio=1.0)
+    assert keep == ["b", "d"]
+    assert math.isclose(estimated, 0.06)
+
+
+def test_nothing_kept_when_within_budget():
+    keep, estimated = select_fp32_layers({"a": 0.01, "b": 0.02}, max_error=0.1, max_fp32_ratio=1.0)
+    assert keep == []
+    assert math.isclose(estimated, 0.03)
+
+
+def test_fp32_ratio_caps_kept_layers():
+    errors = {f"l{i}": 1.0 for i in range(10)}
+    keep, estimated = select_fp32_layers(errors, max_error=0.0, max_fp32_ratio=0.2)
+    assert len(keep) == 2
+    assert math.isclose(estimated, 8.0)
+
+
+def test_non_finite_errors_are_kept_first():
+    keep, estimated = select_fp32_layers({"nan": float("nan"), "inf": float("inf"), "ok": 0.01},
+                                         max_error=0.1, max_fp32_ratio=1.0)
+    assert "inf" in keep and "ok" not in keep
+    assert math.isclose(estimated, 0.01)
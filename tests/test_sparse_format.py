@@ -0,0 +1,84 @@
+"""稀疏产物：编码/解码往返"""
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from utils.sparse_format import (  # noqa: E402
+    decode_sparse_tensors, encode_sparse_state_dict, is_sparse_artifact, load_sparse_state_dict, save_sparse_model,
+)
+
+
+def _sparse(shape, density=0.2, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    dense = torch.randn(*shape, generator=generator)
+    return dense * (torch.rand(*shape, generator=generator) < density)
+
+
+def _nm_sparse(shape, n=2, m=4, seed=0):
+    from strategies.prune.nm_sparse import nm_mask
+
+    weight = torch.randn(*shape, generator=torch.Generator().manual_seed(seed))
+    return weight * nm_mask(weight, n, m)
+
+
+def _state_dict():
+    return {"fc.weight": _sparse((16, 32)), "conv.weight": _sparse((8, 4, 3, 3), seed=1),
+            "fc.bias": torch.randn(16), "bn.num_batches_tracked": torch.tensor(3)}
+
+
+@pytest.mark.parametrize("layout", ["bitmask", "csr"])
+def test_roundtrip_fp32_is_exact(layout):
+    state_dict = _state_dict()
+    tensors, encodings = encode_sparse_state_dict(state_dict, layout=layout)
+    assert {"fc.weight", "conv.weight"} <= set(encodings)
+    decoded = decode_sparse_tensors(tensors, encodings)
+    assert set(decoded) == set(state_dict)
+    for name, tensor in state_dict.items():
+        assert decoded[name].dtype == tensor.dtype
+        assert torch.equal(decoded[name], tensor), name
+
+
+@pytest.mark.parametrize("layout", ["bitmask", "csr"])
+def test_roundtrip_int8_values(layout):
+    state_dict = _state_dict()
+    decoded = decode_sparse_tensors(*encode_sparse_state_dict(state_dict, layout=layout, values="int8"))
+    for name in ("fc.weight", "conv.weight"):
+        original = state_dict[name]
+        assert not decoded[name][original == 0].any()
+        row_max = original.reshape(original.shape[0], -1).abs().amax(1)
+        err = (decoded[name] - original).reshape(original.shape[0], -1).abs().amax(1)
+        assert (err <= row_max / 127 + 1e-6).all()
+
+
+def test_roundtrip_nm_layout():
+    state_dict = {"fc.weight": _nm_sparse((8, 16)), "conv.weight": _nm_sparse((8, 8, 3, 3), seed=1),
+                  "first.weight": torch.randn(8, 3, 3, 3)}
+    tensors, encodings = encode_sparse_state_dict(state_dict, layout="nm", nm=(2, 4))
+    assert set(encodings) == {"fc.weight", "conv.weight"}
+    decoded = decode_sparse_tensors(tensors, encodings)
+    for name, tensor in state_dict.items():
+        assert torch.equal(decoded[name], tensor), name
+
+
+def test_dense_tensors_are_left_unencoded():
+    tensors, encodings = encode_sparse_state_dict({"w": torch.randn(8, 8)})
+    assert encodings == {} and torch.equal(tensors["w"], decode_sparse_tensors(tensors, encodings)["w"])
+
+
+def test_invalid_options():
+    with pytest.raises(ValueError):
+        encode_sparse_state_dict(_state_dict(), layout="coo")
+    with pytest.raises(ValueError):
+        encode_sparse_state_dict(_state_dict(), values="int4")
+    with pytest.raises(ValueError):
+        encode_sparse_state_dict(_state_dict(), layout="nm", nm=(4, 2))
+
+
+def test_save_and_load_artifact(tmp_path):
+    state_dict = _state_dict()
+    path = str(tmp_path / "model.sparse.safetensors")
+    info = save_sparse_model(state_dict, path, layout="csr")
+    assert info["sparse_tensors"] == 2 and is_sparse_artifact(path)
+    loaded = load_sparse_state_dict(path)
+    for name, tensor in state_dict.items():
+        assert torch.equal(loaded[name], tensor), name
@@ -0,0 +1,351 @@
+"""校准/训练图像数据管道
+
+把 calibration_data / train_data 目录中的图片解码、Resize+CenterCrop 后以 uint8 (N,C,H,W)
+写入磁盘缓存（numpy memmap），key 为 (目录指纹, 预处理参数, 输入形状, 样本数)。
+同一份数据被 int8_static、QAT、TensorRT INT8 校准重复使用时只解码一次，
+之后按批次从memmap读取并归一化，多个工作进程共享page cache。
+
+- 首次解码使用多进程 DataLoader（Config.CALIB_WORKERS）
+- 训练（QAT）可用 loader(workers=..., persistent=True) 让工作进程预取批次并在epoch之间保留
+- 目录支持 ImageFolder 结构（子目录为类别，标签随缓存保存）或平铺的图片
+- 数据量超过 Config.CALIB_CACHE_MAX_MB 时不落盘，直接用多进程 DataLoader 流式读取
+- 缓存目录总大小超过 Config.CALIB_CACHE_TOTAL_MB 时按最近使用时间（命中时刷新mtime）淘汰旧缓存
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config.settings import Config
+except ImportError:
+    Config = None
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff", ".ppm", ".pgm")
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+_build_lock = threading.Lock()
+
+
+def _setting(name: str, default: Any) -> Any:
+    return getattr(Config, name, default) if Config else default
+
+
+def evict_calib_cache(cache_dir: str, max_bytes: int, keep: Sequence[str] = ()) -> int:
+    """按最近使用时间淘汰缓存（图片与标签成对删除），直到总大小不超过max_bytes，返回删除的条目数
+
+    已被其它任务mmap打开的文件删除后仍可读取，直到映射关闭；未完成的临时文件不处理
+    """
+    if max_bytes <= 0 or not os.path.isdir(cache_dir):
+        return 0
+    entries: Dict[str, List[Any]] = {}
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".npy") or ".tmp" in name:
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entry = entries.setdefault(name.split(".", 1)[0], [0.0, 0, []])
+        entry[0] = max(entry[0], stat.st_mtime)
+        entry[1] += stat.st_size
+        entry[2].append(path)
+    total = sum(entry[1] for entry in entries.values())
+    removed = 0
+    for key, (_, size, paths) in sorted(entries.items(), key=lambda item: item[1][0]):
+        if total <= max_bytes:
+            break
+        if key in keep:
+            continue
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        total -= size
+        removed += 1
+    if removed:
+        logger.info(f"Calibration cache evicted {removed} entries from {cache_dir}")
+    return removed
+
+
+def list_images(data_dir: str) -> Tuple[List[str], List[int]]:
+    """收集图片路径和标签（ImageFolder结构按子目录名排序编号，平铺图片标签为0）"""
+    root = os.path.abspath(data_dir)
+    classes = sorted(d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d)))
+    paths: List[str] = []
+    labels: List[int] = []
+    for name in sorted(os.listdir(root)):
+        if name.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(os.path.join(root, name)):
+            paths.append(os.path.join(root, name))
+            labels.append(0)
+    for index, cls in enumerate(classes):
+        for dirpath, dirnames, filenames in os.walk(os.path.join(root, cls)):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.append(os.path.join(dirpath, name))
+                    labels.append(index)
+    return paths, labels
+
+
+def data_dir_fingerprint(paths: Sequence[str]) -> str:
+    """图片列表指纹（路径、大小、修改时间），文件有增删改时缓存失效"""
+    entries = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((path, st.st_size, st.st_mtime_ns))
+    return hashlib.sha1(json.dumps(entries, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class _ImageFileDataset:
+    """解码单张图片为 uint8 CHW 张量（DataLoader工作进程中执行）"""
+
+    def __init__(self, paths: Sequence[str], labels: Sequence[int], size: Tuple[int, int], resize: int, channels: int):
+        self.paths = list(paths)
+        self.labels = list(labels)
+        self.size = size
+        self.resize = resize
+        self.channels = channels
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __getitem__(self, index: int) -> Tuple[Any, int]:
+        from PIL import Image
+        from torchvision import transforms
+
+        with Image.open(self.paths[index]) as img:
+            img = img.convert("L" if self.channels == 1 else "RGB")
+            img = transforms.Resize(self.resize)(img)
+            img = transforms.CenterCrop(self.size)(img)
+            tensor = transforms.PILToTensor()(img)
+        return tensor, self.labels[index]
+
+
+class _CachedDataset:
+    """从磁盘缓存读取单个样本（工作进程中按路径惰性打开memmap，避免把整个数组序列化给子进程）"""
+
+    def __init__(self, images_path: str, labels: Any):
+        self.images_path = images_path
+        self.labels = labels
+        self._images: Any = None
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def __getitem__(self, index: int) -> Tuple[Any, int]:
+        import numpy as np
+        import torch
+
+        if self._images is None:
+            self._images = np.load(self.images_path, mmap_mode="r")
+        return torch.from_numpy(np.ascontiguousarray(self._images[index])), int(self.labels[index])
+
+
+class _CachedBatches:
+    """可重复迭代的批次加载器（每次迭代为一个epoch），产出 (images, labels)"""
+
+    def __init__(self, owner: "CalibrationSet", batch_size: int, shuffle: bool, drop_last: bool):
+        self.owner = owner
+        self.batch_size = max(1, int(batch_size))
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+
+    def __len__(self) -> int:
+        n = len(self.owner)
+        return n // self.batch_size if self.drop_last else -(-n // self.batch_size)
+
+    def __iter__(self) -> Iterator[Tuple[Any, Any]]:
+        import torch
+
+        n = len(self.owner)
+        order = torch.randperm(n) if self.shuffle else torch.arange(n)
+        for start in range(0, n, self.batch_size):
+            index = order[start:start + self.batch_size]
+            if self.drop_last and len(index) < self.batch_size:
+                break
+            yield self.owner._read(index)
+
+
+class CalibrationSet:
+    """带磁盘缓存的图像数据集（校准、QAT训练、TensorRT校准共用）"""
+
+    def __init__(
+        self,
+        data_dir: str,
+        input_shape: Sequence[int] = (1, 3, 224, 224),
+        max_samples: Optional[int] = None,
+        resize: Optional[int] = None,
+        mean: Sequence[float] = IMAGENET_MEAN,
+        std: Sequence[float] = IMAGENET_STD,
+        workers: Optional[int] = None,
+        cache_dir: Optional[str] = None,
+    ):
+        shape = tuple(int(v) for v in input_shape)
+        if len(shape) != 4 or shape[1] not in (1, 3):
+            raise ValueError(f"input_shape must be NCHW with 1 or 3 channels, got {input_shape}")
+        self.data_dir = os.path.abspath(data_dir)
+        self.channels = shape[1]
+        self.size = (shape[2], shape[3])
+        self.resize = int(resize or round(min(self.size) * 256 / 224))
+        self.mean = tuple(float(v) for v in mean)[:self.channels]
+        self.std = tuple(float(v) for v in std)[:self.channels]
+        self.workers = int(workers if workers is not None else _setting("CALIB_WORKERS", 4))
+        self.cache_dir = str(cache_dir or _setting("CALIB_CACHE_DIR", os.path.join("storage", "calib_cache")))
+
+        paths, labels = list_images(self.data_dir)
+        if max_samples:
+            paths, labels = paths[:int(max_samples)], labels[:int(max_samples)]
+        if not paths:
+            raise ValueError(f"No images found in {data_dir}")
+        self.paths = paths
+        self.labels = labels
+
+        spec = {"fingerprint": data_dir_fingerprint(paths), "size": list(self.size), "resize": self.resize,
+                "channels": self.channels, "count": len(paths)}
+        self.key = hashlib.sha1(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()[:20]
+        self.cache_status = "disabled"
+        self._images: Any = None
+        self._labels: Any = None
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    @property
+    def _cache_paths(self) -> Tuple[str, str]:
+        base = os.path.join(self.cache_dir, self.key)
+        return f"{base}.npy", f"{base}.labels.npy"
+
+    def prepare(self) -> "CalibrationSet":
+        """打开已有缓存，或解码全部图片并写入缓存（超出大小上限时保持流式读取）"""
+        import numpy as np
+
+        if self._images is not None:
+            return self
+        images_path, labels_path = self._cache_paths
+        nbytes = len(self.paths) * self.channels * self.size[0] * self.size[1]
+        if nbytes > int(_setting("CALIB_CACHE_MAX_MB", 4096)) * 1024 * 1024:
+            self.cache_status = "disabled"
+            return self
+
+        with _build_lock:
+            if not (os.path.exists(images_path) and os.path.exists(labels_path)):
+                self._build(images_path, labels_path)
+                self.cache_status = "miss"
+            else:
+                self.cache_status = "hit"
+                try:
+                    os.utime(images_path)  # 刷新最近使用时间（atime在noatime挂载下不可靠）
+                except OSError:
+                    pass
+            evict_calib_cache(self.cache_dir, int(_setting("CALIB_CACHE_TOTAL_MB", 16384)) * 1024 * 1024,
+                              keep=(self.key,))
+        self._images = np.load(images_path, mmap_mode="r")
+        self._labels = np.load(labels_path)
+        return self
+
+    def _build(self, images_path: str, labels_path: str) -> None:
+        """多进程解码图片写入memmap（先写临时文件，完成后原子替换，避免并发任务读到半成品）"""
+        import numpy as np
+        from numpy.lib.format import open_memmap
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_images = f"{images_path}.{os.getpid()}.tmp"
+        array = open_memmap(tmp_images, mode="w+", dtype=np.uint8,
+                            shape=(len(self.paths), self.channels, self.size[0], self.size[1]))
+        offset = 0
+        for images, _ in self._file_loader(batch_size=64, shuffle=False):
+            array[offset:offset + len(images)] = images.numpy()
+            offset += len(images)
+        array.flush()
+        del array
+        tmp_labels = f"{labels_path}.{os.getpid()}.tmp.npy"
+        np.save(tmp_labels, np.asarray(self.labels, dtype=np.int64))
+        os.replace(tmp_images, images_path)
+        os.replace(tmp_labels, labels_path)
+        logger.info(f"Calibration cache built: {images_path} ({offset} images)")
+
+    def _file_loader(self, batch_size: int, shuffle: bool, drop_last: bool = False,
+                     workers: Optional[int] = None, persistent: bool = False, dataset: Any = None) -> Any:
+        """多进程 DataLoader（产出uint8张量），默认直接从图片文件解码"""
+        from torch.utils.data import DataLoader
+
+        if dataset is None:
+            dataset = _ImageFileDataset(self.paths, self.labels, self.size, self.resize, self.channels)
+        workers = max(0, int(self.workers if workers is None else workers))
+        return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle, drop_last=drop_last,
+                          num_workers=workers, persistent_workers=persistent and workers > 0)
+
+    def _normalize(self, images: Any) -> Any:
+        import torch
+
+        mean = torch.tensor(self.mean).view(1, -1, 1, 1)
+        std = torch.tensor(self.std).view(1, -1, 1, 1)
+        return (images.float() / 255.0 - mean) / std
+
+    def _read(self, index: Any) -> Tuple[Any, Any]:
+        import numpy as np
+        import torch
+
+        idx = np.sort(index.numpy())  # memmap按顺序读取更快，图片与标签同步排序
+        images = torch.from_numpy(np.ascontiguousarray(self._images[idx]))
+        labels = torch.from_numpy(self._labels[idx])
+        return self._normalize(images), labels
+
+    def loader(self, batch_size: Optional[int] = None, shuffle: bool = False, drop_last: bool = False,
+               workers: Optional[int] = None, persistent: bool = False) -> Any:
+        """返回可重复迭代的 (images, labels) 批次加载器，images已归一化为float32
+
+        workers 为空时：命中缓存在主进程按批读取memmap，流式模式使用 Config.CALIB_WORKERS 个进程解码；
+        workers > 0 时缓存同样由工作进程预取。persistent=True 时工作进程在epoch之间保留（多轮训练使用）
+        """
+        batch_size = int(batch_size or _setting("CALIB_BATCH_SIZE", 32))
+        self.prepare()
+        if self._images is not None:
+            if not workers:
+                return _CachedBatches(self, batch_size, shuffle, drop_last)
+            dataset = _CachedDataset(self._cache_paths[0], self._labels)
+            return _NormalizedLoader(self, self._file_loader(batch_size, shuffle, drop_last, workers=workers,
+                                                             persistent=persistent, dataset=dataset))
+        return _NormalizedLoader(self, self._file_loader(batch_size, shuffle, drop_last, workers=workers,
+                                                         persistent=persistent))
+
+    def batches(self, batch_size: Optional[int] = None, drop_last: bool = False) -> Iterator[Any]:
+        """按顺序产出归一化后的图片批次（用于校准）"""
+        for images, _ in self.loader(batch_size=batch_size, drop_last=drop_last):
+            yield images
+
+    def info(self) -> Dict[str, str]:
+        return {"calibration": "real_data", "calibration_samples": str(len(self)),
+                "calibration_cache": self.cache_status}
+
+
+class _NormalizedLoader:
+    """流式模式：在 DataLoader 产出的uint8批次上做归一化"""
+
+    def __init__(self, owner: CalibrationSet, loader: Any):
+        self.owner = owner
+        self.loader = loader
+
+    def __len__(self) -> int:
+        return len(self.loader)
+
+    def __iter__(self) -> Iterator[Tuple[Any, Any]]:
+        for images, labels in self.loader:
+            yield self.owner._normalize(images), labels
+
+
+def get_calibration_set(data_dir: str, input_shape: Sequence[int] = (1, 3, 224, 224),
+                        max_samples: Optional[int] = None, **kwargs: Any) -> CalibrationSet:
+    """构建并准备数据集（命中缓存时只打开memmap）"""
+    return CalibrationSet(data_dir, input_shape=input_shape, max_samples=max_samples, **kwargs).prepare()
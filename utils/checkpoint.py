@@ -0,0 +1,245 @@
+"""PyTorch检查点工具
+
+- sniff_checkpoint：只解析 .pt/.pth 文件中的pickle流（zip格式的 data.pkl 或旧格式的连续pickle），
+  提取GLOBAL类名和字符串（state_dict键名等），不反序列化、不读取张量存储
+- load_torch_checkpoint / load_safetensors：内存映射加载，张量页按需读入，多个进程共享page cache
+- save_safetensors / read_safetensors_metadata：不依赖safetensors包的写入和头部元数据读取
+"""
+import io
+import json
+import logging
+import mmap
+import os
+import pickletools
+import struct
+import zipfile
+from typing import Any, Dict, IO, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 旧格式（_use_new_zipfile_serialization=False）依次写入：魔数、协议版本、sys_info、对象本身
+_LEGACY_PICKLE_COUNT = 4
+
+# 不属于模型结构的GLOBAL（存储、dtype、重建函数等）
+_IGNORED_GLOBAL_MODULES = ("collections", "builtins", "__builtin__", "copyreg", "_codecs",
+                           "torch._", "torch.serialization", "numpy")
+_IGNORED_GLOBAL_NAMES = ("Storage", "dtype", "device", "Size", "OrderedDict")
+
+_STRING_OPS = {"STRING", "BINSTRING", "SHORT_BINSTRING", "UNICODE",
+               "BINUNICODE", "SHORT_BINUNICODE", "BINUNICODE8"}
+_MEMO_PUT_OPS = {"PUT", "BINPUT", "LONG_BINPUT"}
+_MEMO_GET_OPS = {"GET", "BINGET", "LONG_BINGET"}
+
+
+def is_zip_checkpoint(path: str) -> bool:
+    """是否为torch新版zip格式检查点"""
+    try:
+        return zipfile.is_zipfile(path)
+    except OSError:
+        return False
+
+
+def _iter_ops(stream: IO[bytes], max_ops: int) -> Iterator[Tuple[str, Any]]:
+    """逐个读取pickle操作码（遇到STOP结束当前pickle）"""
+    count = 0
+    for opcode, arg, _pos in pickletools.genops(stream):
+        count += 1
+        if count > max_ops:
+            raise ValueError("pickle stream too long")
+        yield opcode.name, arg
+
+
+def _scan_pickle(stream: IO[bytes], globals_: List[str], strings: List[str], max_ops: int) -> None:
+    """扫描单个pickle，收集GLOBAL（含STACK_GLOBAL）和字符串常量"""
+    memo: Dict[int, Any] = {}
+    recent: List[Any] = []
+    memo_count = 0
+    for name, arg in _iter_ops(stream, max_ops):
+        if name in _STRING_OPS:
+            value = arg.decode("latin-1") if isinstance(arg, bytes) else arg
+            strings.append(value)
+            recent = (recent + [value])[-2:]
+        elif name == "GLOBAL":
+            module, _, qualname = str(arg).partition(" ")
+            globals_.append(f"{module}.{qualname}")
+            recent = []
+        elif name == "STACK_GLOBAL":
+            if len(recent) == 2 and all(isinstance(v, str) for v in recent):
+                globals_.append(f"{recent[0]}.{recent[1]}")
+            recent = []
+        elif name == "MEMOIZE":
+            memo[memo_count] = recent[-1] if recent else None
+            memo_count += 1
+        elif name in _MEMO_PUT_OPS:
+            memo[arg] = recent[-1] if recent else None
+        elif name in _MEMO_GET_OPS:
+            recent = (recent + [memo.get(arg)])[-2:]
+        else:
+            recent = []
+
+
+def sniff_checkpoint(path: str, max_ops: int = 2_000_000) -> Optional[Dict[str, List[str]]]:
+    """读取检查点的pickle流，返回 {"globals": [...], "strings": [...]}
+
+    不支持的格式或解析失败时返回None（由调用方回退到完整加载）
+    """
+    if not path or not os.path.isfile(path):
+        return None
+    globals_: List[str] = []
+    strings: List[str] = []
+    try:
+        if is_zip_checkpoint(path):
+            with zipfile.ZipFile(path) as zf:
+                member = next((n for n in zf.namelist() if n.endswith("data.pkl")), None)
+                if member is None:
+                    return None
+                with zf.open(member) as f:
+                    _scan_pickle(io.BufferedReader(f), globals_, strings, max_ops)
+        else:
+            with open(path, "rb") as f:
+                for _ in range(_LEGACY_PICKLE_COUNT):
+                    _scan_pickle(f, globals_, strings, max_ops)
+    except Exception:
+        return None
+    return {"globals": globals_, "strings": strings}
+
+
+def model_class_names(global_names: List[str]) -> List[str]:
+    """从GLOBAL中筛选模型结构相关的类名
+
+    torch.nn 内置层只保留类名（如 Conv2d），自定义/第三方模型保留完整路径
+    （如 torchvision.models.resnet.ResNet），顺序与出现顺序一致并去重
+    """
+    names: List[str] = []
+    seen: Set[str] = set()
+    for full in global_names:
+        module, _, name = full.rpartition(".")
+        if not name or module.startswith(_IGNORED_GLOBAL_MODULES) or name.endswith(_IGNORED_GLOBAL_NAMES):
+            continue
+        if module == "torch" and not name[:1].isupper():
+            continue
+        if module == "torch" or module.startswith("torch.nn"):
+            full = name
+        if full not in seen:
+            seen.add(full)
+            names.append(full)
+    return names
+
+
+def load_torch_checkpoint(path: str, weights_only: bool = False, pickle_module: Any = None) -> Any:
+    """加载 .pt/.pth 检查点到CPU
+
+    zip格式使用 mmap=True（私有映射，写时复制，原文件不会被修改）；
+    旧格式或不支持mmap的torch版本回退为普通加载。反序列化异常直接抛出，由调用方处理
+    """
+    import torch
+
+    kwargs: Dict[str, Any] = {"map_location": "cpu", "weights_only": weights_only}
+    if pickle_module is not None:
+        kwargs["pickle_module"] = pickle_module
+    if is_zip_checkpoint(path):
+        try:
+            return torch.load(path, mmap=True, **kwargs)
+        except TypeError:
+            pass  # 旧版torch不支持mmap参数
+    try:
+        return torch.load(path, **kwargs)
+    except TypeError:
+        kwargs.pop("weights_only", None)
+        return torch.load(path, **kwargs)
+
+
+# safetensors dtype -> torch dtype名称
+_SAFETENSORS_DTYPES = {
+    "F64": "float64", "F32": "float32", "F16": "float16", "BF16": "bfloat16",
+    "I64": "int64", "I32": "int32", "I16": "int16", "I8": "int8", "U8": "uint8", "BOOL": "bool",
+}
+
+
+def read_safetensors_metadata(path: str) -> Optional[Dict[str, str]]:
+    """只读取 .safetensors 头部的 __metadata__（文件无效时返回None）"""
+    try:
+        with open(path, "rb") as f:
+            header_len = struct.unpack("<Q", f.read(8))[0]
+            if header_len > 100 * 1024 * 1024:
+                return None
+            header = json.loads(f.read(header_len))
+    except Exception:
+        return None
+    meta = header.get("__metadata__") if isinstance(header, dict) else None
+    return meta if isinstance(meta, dict) else {}
+
+
+def save_safetensors(path: str, tensors: Dict[str, Any], metadata: Optional[Dict[str, str]] = None) -> str:
+    """按safetensors格式写入张量（8字节头长度 + JSON头 + 连续数据区）
+
+    张量按元素字节数从大到小排列，头部补齐到8字节，保证各张量偏移按自身dtype对齐，
+    写出的文件可以被 load_safetensors 零拷贝映射，也可以被官方 safetensors 包读取
+    """
+    import torch
+
+    dtype_names = {getattr(torch, v): k for k, v in _SAFETENSORS_DTYPES.items()}
+    items = sorted(tensors.items(), key=lambda kv: -kv[1].element_size())
+    header: Dict[str, Any] = {}
+    if metadata:
+        header["__metadata__"] = {str(k): str(v) for k, v in metadata.items()}
+    offset = 0
+    blobs: List[Any] = []
+    for name, tensor in items:
+        if tensor.dtype not in dtype_names:
+            raise ValueError(f"Unsupported dtype for safetensors: {name} ({tensor.dtype})")
+        data = tensor.detach().cpu().contiguous().reshape(-1).view(torch.uint8).numpy().tobytes() \
+            if tensor.numel() else b""
+        header[name] = {"dtype": dtype_names[tensor.dtype], "shape": list(tensor.shape),
+                        "data_offsets": [offset, offset + len(data)]}
+        offset += len(data)
+        blobs.append(data)
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    header_bytes += b" " * (-len(header_bytes) % 8)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for data in blobs:
+            f.write(data)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _mmap_safetensors(path: str) -> Dict[str, Any]:
+    """直接基于mmap构造张量（ACCESS_COPY：页按需读入，写入时才复制）"""
+    import torch
+
+    with open(path, "rb") as f:
+        header_len = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_len))
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    base = 8 + header_len
+    tensors: Dict[str, Any] = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = getattr(torch, _SAFETENSORS_DTYPES[info["dtype"]])
+        start, end = info["data_offsets"]
+        shape = info["shape"]
+        numel = 1
+        for dim in shape:
+            numel *= dim
+        if numel == 0:
+            tensors[name] = torch.empty(shape, dtype=dtype)
+            continue
+        tensor = torch.frombuffer(mm, dtype=dtype, count=numel, offset=base + start)
+        tensors[name] = tensor.reshape(shape)
+    return tensors
+
+
+def load_safetensors(path: str) -> Dict[str, Any]:
+    """加载 .safetensors（零拷贝mmap；dtype不支持或偏移未对齐时回退到 safe_open）"""
+    try:
+        return _mmap_safetensors(path)
+    except Exception as e:
+        logger.debug(f"mmap safetensors load failed, falling back to safe_open: {e}")
+    from safetensors import safe_open
+    with safe_open(path, framework="pt", device="cpu") as f:
+        return {k: f.get_tensor(k) for k in f.keys()}
@@ -0,0 +1,161 @@
+"""已加载state_dict缓存
+
+进程内LRU缓存，key为权重文件指纹（绝对路径、大小、修改时间）+ 加载选项，
+按张量字节数计算占用，超出预算时淘汰最久未使用的条目。
+只缓存纯state_dict（值为张量/标量的嵌套dict），张量保持mmap映射，命中时返回新的dict结构、共享同一批张量，
+由各适配器 load_state_dict 复制进新建的网络；完整模型对象不缓存（调用方会原地剪枝/量化，
+深拷贝又会把mmap张量变成私有内存），每次都走loader的mmap加载。默认关闭（MODEL_CACHE_MAX_MB=0）
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config.settings import Config
+except ImportError:
+    Config = None
+
+
+def object_nbytes(obj: Any) -> int:
+    """统计对象中张量占用的字节数（nn.Module 的参数和缓冲区、dict/list 中的张量）"""
+    seen = set()
+
+    def _tensor_bytes(t: Any) -> int:
+        if id(t) in seen:
+            return 0
+        seen.add(id(t))
+        try:
+            return int(t.numel() * t.element_size())
+        except Exception:
+            return 0
+
+    def _walk(o: Any, depth: int) -> int:
+        if depth > 8:
+            return 0
+        if hasattr(o, "numel") and hasattr(o, "element_size"):
+            return _tensor_bytes(o)
+        if hasattr(o, "parameters") and hasattr(o, "buffers"):
+            try:
+                return sum(_tensor_bytes(t) for t in list(o.parameters()) + list(o.buffers()))
+            except Exception:
+                return 0
+        if isinstance(o, dict):
+            return sum(_walk(v, depth + 1) for v in o.values())
+        if isinstance(o, (list, tuple)):
+            return sum(_walk(v, depth + 1) for v in o)
+        return 0
+
+    return _walk(obj, 0)
+
+
+def _is_state_dict(obj: Any, depth: int = 0) -> bool:
+    """值全部为张量、标量或满足同样条件的dict（不含nn.Module等可被原地修改的对象）"""
+    if not isinstance(obj, dict) or depth > 4:
+        return False
+    for v in obj.values():
+        if isinstance(v, dict):
+            if not _is_state_dict(v, depth + 1):
+                return False
+        elif not (hasattr(v, "numel") and hasattr(v, "element_size")) \
+                and not isinstance(v, (int, float, str, bool, type(None))):
+            return False
+    return True
+
+
+def _copy_structure(obj: Any) -> Any:
+    """复制dict结构（张量共享），调用方增删键不影响缓存"""
+    if isinstance(obj, dict):
+        return type(obj)((k, _copy_structure(v)) for k, v in obj.items())
+    return obj
+
+
+class ModelCache:
+    """已加载state_dict的LRU缓存（按字节预算淘汰）"""
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        if max_bytes is None:
+            max_mb = Config.MODEL_CACHE_MAX_MB if Config else 0
+            max_bytes = int(max_mb) * 1024 * 1024
+        self.max_bytes = max(0, int(max_bytes))
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Tuple[Any, int]]" = OrderedDict()
+        self._total = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def fingerprint(path: str, *options: Any) -> Tuple:
+        """权重文件指纹：绝对路径、大小、修改时间 + 加载选项"""
+        st = os.stat(path)
+        return (os.path.abspath(path), st.st_size, st.st_mtime_ns) + tuple(options)
+
+    def get_or_load(self, path: str, loader: Callable[[], Any], *options: Any) -> Any:
+        """命中时返回缓存state_dict的新dict结构；未命中时直接返回loader结果，是state_dict时一并缓存"""
+        if not self.enabled:
+            return loader()
+        try:
+            key = self.fingerprint(path, *options)
+        except OSError:
+            return loader()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None:
+            logger.debug(f"Model cache hit: {path}")
+            return _copy_structure(entry[0])
+
+        obj = loader()
+        if not _is_state_dict(obj):
+            return obj
+        size = object_nbytes(obj)
+        if 0 < size <= self.max_bytes:
+            self._put(key, _copy_structure(obj), size)
+        return obj
+
+    def _put(self, key: Tuple, obj: Any, size: int) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total -= old[1]
+            # 同一文件的旧版本（文件已被修改）直接移除
+            for stale in [k for k in self._entries if k[0] == key[0] and k[1:3] != key[1:3]]:
+                self._total -= self._entries.pop(stale)[1]
+            while self._entries and self._total + size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._total -= evicted
+            self._entries[key] = (obj, size)
+            self._total += size
+            logger.debug(f"Model cached: {key[0]} ({size / (1024 * 1024):.1f}MB, total {self._total / (1024 * 1024):.1f}MB)")
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._total = 0
+
+    def stats(self) -> dict:
+        """缓存使用情况"""
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._total, "max_bytes": self.max_bytes}
+
+
+# 全局单例
+_cache_instance: Optional[ModelCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_model_cache() -> ModelCache:
+    """获取模型缓存单例"""
+    global _cache_instance
+    with _cache_lock:
+        if _cache_instance is None:
+            _cache_instance = ModelCache()
+        return _cache_instance
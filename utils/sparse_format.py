@@ -0,0 +1,371 @@
+"""稀疏权重产物格式
+
+非结构化剪枝后的权重仍是稠密张量，直接保存时文件大小不变。这里把稀疏的Linear/Conv权重
+编码后写入safetensors容器（头部 __metadata__ 记录编码方式），其余张量原样保存：
+
+- bitmask：按位打包的非零掩码（uint8）+ 非零值
+- csr：按输出通道展开为二维后的 crow/col 索引 + 非零值
+- nm：N:M半结构化稀疏（如2:4），每M个连续输入元素保留N个值 + 按位打包的组内下标（每个下标 ceil(log2 M) 位）；
+  Conv权重按 (O, kh, kw, C) 顺序沿输入通道分组（与NHWC隐式GEMM的K维一致），不满足N:M的张量按稠密保存
+- 非零值可选 int8（逐输出通道对称量化，附带float32 scale）
+
+每个张量只在编码后字节数小于稠密存储时才编码。load_sparse_state_dict 还原为稠密state_dict，
+load_sparse_model 可额外把Linear替换为稀疏kernel实现（N:M权重在CUDA半精度上用 to_sparse_semi_structured，
+其余为基于 torch.sparse 的 SparseLinear）
+"""
+import json
+import logging
+import math
+from typing import Any, Dict, Optional, Tuple
+
+from utils.checkpoint import load_safetensors, read_safetensors_metadata, save_safetensors
+
+logger = logging.getLogger(__name__)
+
+SPARSE_FORMAT = "ccs-sparse-v1"
+SPARSE_LAYOUTS = ("bitmask", "csr", "nm")
+SPARSE_VALUE_TYPES = ("fp32", "int8")
+SPARSE_SUFFIX = ".sparse.safetensors"
+
+# 稀疏率低于该值的张量按稠密保存
+DEFAULT_MIN_SPARSITY = 0.1
+DEFAULT_NM = (2, 4)
+
+
+def _pack_bits(mask: Any) -> Any:
+    """bool张量按位打包为uint8（高位在前）"""
+    import torch
+
+    flat = mask.reshape(-1).to(torch.uint8)
+    pad = (-flat.numel()) % 8
+    if pad:
+        flat = torch.cat([flat, flat.new_zeros(pad)])
+    weights = torch.tensor([128, 64, 32, 16, 8, 4, 2, 1], dtype=torch.uint8)
+    return (flat.view(-1, 8) * weights).sum(1, dtype=torch.int32).to(torch.uint8)
+
+
+def _unpack_bits(packed: Any, numel: int) -> Any:
+    """_pack_bits 的逆操作，返回长度为numel的bool张量"""
+    import torch
+
+    shifts = torch.arange(7, -1, -1, dtype=torch.uint8)
+    bits = (packed.reshape(-1, 1) >> shifts) & 1
+    return bits.reshape(-1)[:numel].bool()
+
+
+def _pack_indices(indices: Any, bits: int) -> Any:
+    """把组内下标（每个bits位，高位在前）按位打包为uint8"""
+    import torch
+
+    shifts = torch.arange(bits - 1, -1, -1, dtype=torch.uint8)
+    return _pack_bits((indices.reshape(-1, 1).to(torch.uint8) >> shifts) & 1)
+
+
+def _unpack_indices(packed: Any, count: int, bits: int) -> Any:
+    """_pack_indices 的逆操作，返回count个int64下标"""
+    import torch
+
+    bits_flat = _unpack_bits(packed, count * bits).reshape(count, bits).long()
+    return (bits_flat << torch.arange(bits - 1, -1, -1)).sum(1)
+
+
+def nm_matrix(tensor: Any, m: int) -> Optional[Any]:
+    """按N:M分组顺序展开的二维权重 (O, K)：Linear为 (O, I)，Conv为 (O, kh*kw*C)；输入维不能被m整除时返回None"""
+    if tensor.dim() == 2 and tensor.shape[1] % m == 0:
+        return tensor
+    if tensor.dim() == 4 and tensor.shape[1] % m == 0:
+        return tensor.permute(0, 2, 3, 1).reshape(tensor.shape[0], -1)
+    return None
+
+
+def nm_restore(matrix: Any, shape: Any) -> Any:
+    """nm_matrix 的逆操作"""
+    if len(shape) == 4:
+        out_ch, in_ch, kh, kw = shape
+        return matrix.reshape(out_ch, kh, kw, in_ch).permute(0, 3, 1, 2).contiguous()
+    return matrix.reshape(shape)
+
+
+def _index_bits(m: int) -> int:
+    return max(1, math.ceil(math.log2(m)))
+
+
+def _quantize_rows(values: Any, rows: Any, num_rows: int) -> Tuple[Any, Any]:
+    """按所在行（输出通道）对称量化非零值，返回 (int8值, 每行scale)"""
+    import torch
+
+    absmax = torch.zeros(num_rows, dtype=torch.float32)
+    if values.numel():
+        absmax = absmax.scatter_reduce(0, rows, values.abs().float(), reduce="amax", include_self=True)
+    scale = torch.where(absmax > 0, absmax / 127.0, torch.ones_like(absmax))
+    q = torch.clamp(torch.round(values.float() / scale[rows]), -127, 127).to(torch.int8)
+    return q, scale
+
+
+def _encoded_nbytes(layout: str, values: str, numel: int, nnz: int, rows: int, elem: int,
+                    nm: Tuple[int, int] = DEFAULT_NM) -> int:
+    """估算编码后的字节数，用于和稠密存储比较（nm布局的nnz为保留的值个数 numel*N/M）"""
+    value_bytes = nnz * (1 if values == "int8" else elem) + (rows * 4 if values == "int8" else 0)
+    if layout == "nm":
+        return value_bytes + math.ceil(nnz * _index_bits(nm[1]) / 8)
+    if layout == "bitmask":
+        return value_bytes + math.ceil(numel / 8)
+    cols = numel // max(rows, 1)
+    return value_bytes + (rows + 1) * 4 + nnz * (2 if cols <= 32767 else 4)
+
+
+def _encode_nm(name: str, tensor: Any, nm: Tuple[int, int], values: str,
+               tensors: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """按N:M布局编码单个张量（写入tensors），张量不满足N:M或不能分组时返回None"""
+    import torch
+
+    n, m = nm
+    matrix = nm_matrix(tensor, m)
+    if matrix is None:
+        return None
+    rows = matrix.shape[0]
+    groups = matrix.reshape(rows, -1, m)
+    if int((groups != 0).sum(-1).max()) > n:
+        return None
+    if _encoded_nbytes("nm", values, tensor.numel(), tensor.numel() // m * n, rows, tensor.element_size(), nm) \
+            >= tensor.numel() * tensor.element_size():
+        return None
+    indices = groups.abs().topk(n, dim=-1).indices.sort(dim=-1).values
+    kept = groups.gather(-1, indices).reshape(-1)
+    tensors[f"{name}.meta"] = _pack_indices(indices, _index_bits(m))
+    if values == "int8":
+        row_index = torch.arange(rows).repeat_interleave(kept.numel() // rows)
+        q, scale = _quantize_rows(kept, row_index, rows)
+        tensors[f"{name}.values"] = q
+        tensors[f"{name}.scale"] = scale
+    else:
+        tensors[f"{name}.values"] = kept.contiguous()
+    return {"layout": "nm", "n": n, "m": m, "values": values, "shape": list(tensor.shape),
+            "dtype": str(tensor.dtype).replace("torch.", ""), "nnz": int((tensor != 0).sum())}
+
+
+def encode_sparse_state_dict(state_dict: Dict[str, Any], layout: str = "bitmask", values: str = "fp32",
+                             min_sparsity: float = DEFAULT_MIN_SPARSITY,
+                             nm: Tuple[int, int] = DEFAULT_NM) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """编码state_dict，返回 (待写入的张量, 每个编码张量的描述)"""
+    import torch
+
+    if layout not in SPARSE_LAYOUTS:
+        raise ValueError(f"Unsupported sparse layout: {layout}, expected one of {SPARSE_LAYOUTS}")
+    if values not in SPARSE_VALUE_TYPES:
+        raise ValueError(f"Unsupported sparse values: {values}, expected one of {SPARSE_VALUE_TYPES}")
+    if layout == "nm" and not 0 < nm[0] < nm[1] <= 256:
+        raise ValueError(f"Invalid N:M pattern: {nm[0]}:{nm[1]}")
+
+    tensors: Dict[str, Any] = {}
+    encodings: Dict[str, Any] = {}
+    for name, tensor in state_dict.items():
+        if not isinstance(tensor, torch.Tensor):
+            raise ValueError(f"Non-tensor entry in state_dict: {name} ({type(tensor).__name__})")
+        tensor = tensor.detach().cpu()
+        if tensor.is_quantized or tensor.is_sparse:
+            raise ValueError(f"Unsupported tensor for sparse export: {name}")
+        numel = tensor.numel()
+        if tensor.dim() < 2 or not tensor.is_floating_point() or numel == 0:
+            tensors[name] = tensor.contiguous()
+            continue
+        if layout == "nm":
+            info = _encode_nm(name, tensor, nm, values, tensors)
+            if info is None:
+                tensors[name] = tensor.contiguous()
+            else:
+                encodings[name] = info
+            continue
+
+        mask = tensor != 0
+        nnz = int(mask.sum())
+        rows = tensor.shape[0]
+        dense_bytes = numel * tensor.element_size()
+        if 1.0 - nnz / numel < min_sparsity or \
+                _encoded_nbytes(layout, values, numel, nnz, rows, tensor.element_size()) >= dense_bytes:
+            tensors[name] = tensor.contiguous()
+            continue
+
+        matrix = tensor.reshape(rows, -1)
+        info: Dict[str, Any] = {"layout": layout, "values": values, "shape": list(tensor.shape),
+                                "dtype": str(tensor.dtype).replace("torch.", ""), "nnz": nnz}
+        if layout == "bitmask":
+            nz_values = matrix[mask.reshape(rows, -1)]
+            row_index = torch.repeat_interleave(torch.arange(rows), mask.reshape(rows, -1).sum(1))
+            tensors[f"{name}.mask"] = _pack_bits(mask)
+        else:
+            csr = matrix.to_sparse_csr()
+            crow, col = csr.crow_indices(), csr.col_indices()
+            nz_values = csr.values()
+            row_index = torch.repeat_interleave(torch.arange(rows), crow[1:] - crow[:-1])
+            tensors[f"{name}.crow"] = crow.to(torch.int32)
+            tensors[f"{name}.col"] = col.to(torch.int16 if matrix.shape[1] <= 32767 else torch.int32)
+
+        if values == "int8":
+            q, scale = _quantize_rows(nz_values, row_index, rows)
+            tensors[f"{name}.values"] = q
+            tensors[f"{name}.scale"] = scale
+        else:
+            tensors[f"{name}.values"] = nz_values.contiguous()
+        encodings[name] = info
+    return tensors, encodings
+
+
+def _decode_values(tensors: Dict[str, Any], name: str, info: Dict[str, Any], row_index: Any) -> Any:
+    import torch
+
+    dtype = getattr(torch, info["dtype"])
+    values = tensors[f"{name}.values"]
+    if info["values"] == "int8":
+        return (values.float() * tensors[f"{name}.scale"][row_index]).to(dtype)
+    return values.to(dtype)
+
+
+def decode_sparse_tensors(tensors: Dict[str, Any], encodings: Dict[str, Any]) -> Dict[str, Any]:
+    """把编码后的张量还原为稠密state_dict"""
+    import torch
+
+    encoded_keys = set()
+    state_dict: Dict[str, Any] = {}
+    for name, info in encodings.items():
+        shape = info["shape"]
+        rows = shape[0]
+        numel = 1
+        for dim in shape:
+            numel *= dim
+        cols = numel // rows
+        dtype = getattr(torch, info["dtype"])
+        if info["layout"] == "nm":
+            n, m = int(info["n"]), int(info["m"])
+            count = numel // m * n
+            indices = _unpack_indices(tensors[f"{name}.meta"], count, _index_bits(m)).reshape(rows, -1, n)
+            row_index = torch.arange(rows).repeat_interleave(count // rows)
+            kept = _decode_values(tensors, name, info, row_index).reshape(rows, -1, n)
+            groups = torch.zeros(rows, indices.shape[1], m, dtype=dtype).scatter_(-1, indices, kept)
+            state_dict[name] = nm_restore(groups.reshape(rows, -1), shape)
+            encoded_keys.update({f"{name}.meta", f"{name}.values", f"{name}.scale"})
+            continue
+        if info["layout"] == "bitmask":
+            mask = _unpack_bits(tensors[f"{name}.mask"], numel).reshape(rows, cols)
+            row_index = torch.repeat_interleave(torch.arange(rows), mask.sum(1))
+            dense = torch.zeros(rows, cols, dtype=dtype)
+            dense[mask] = _decode_values(tensors, name, info, row_index)
+            encoded_keys.update({f"{name}.mask", f"{name}.values", f"{name}.scale"})
+        else:
+            crow = tensors[f"{name}.crow"].long()
+            col = tensors[f"{name}.col"].long()
+            row_index = torch.repeat_interleave(torch.arange(rows), crow[1:] - crow[:-1])
+            dense = torch.zeros(rows, cols, dtype=dtype)
+            dense[row_index, col] = _decode_values(tensors, name, info, row_index)
+            encoded_keys.update({f"{name}.crow", f"{name}.col", f"{name}.values", f"{name}.scale"})
+        state_dict[name] = dense.reshape(shape)
+    for key, tensor in tensors.items():
+        if key not in encoded_keys:
+            state_dict[key] = tensor
+    return state_dict
+
+
+def save_sparse_model(model: Any, path: str, layout: str = "bitmask", values: str = "fp32",
+                      min_sparsity: float = DEFAULT_MIN_SPARSITY, model_class: Optional[str] = None,
+                      nm: Tuple[int, int] = DEFAULT_NM) -> Dict[str, Any]:
+    """把模型（或state_dict）保存为稀疏产物，返回编码统计"""
+    state_dict = model if isinstance(model, dict) else model.state_dict()
+    tensors, encodings = encode_sparse_state_dict(state_dict, layout=layout, values=values, min_sparsity=min_sparsity,
+                                                  nm=nm)
+    metadata = {"format": SPARSE_FORMAT, "layout": layout, "values": values, "encodings": json.dumps(encodings)}
+    if layout == "nm":
+        metadata["nm"] = f"{nm[0]}:{nm[1]}"
+    if model_class is None and not isinstance(model, dict):
+        model_class = f"{type(model).__module__}.{type(model).__qualname__}"
+    if model_class:
+        metadata["model_class"] = model_class
+    save_safetensors(path, tensors, metadata)
+    return {"sparse_path": path, "sparse_layout": layout, "sparse_values": values,
+            "sparse_tensors": len(encodings)}
+
+
+def is_sparse_artifact(path: str) -> bool:
+    """是否为本模块写出的稀疏产物"""
+    if not str(path).lower().endswith(".safetensors"):
+        return False
+    meta = read_safetensors_metadata(path)
+    return bool(meta) and meta.get("format") == SPARSE_FORMAT
+
+
+def load_sparse_state_dict(path: str) -> Dict[str, Any]:
+    """读取稀疏产物并还原为稠密state_dict"""
+    meta = read_safetensors_metadata(path)
+    if not meta or meta.get("format") != SPARSE_FORMAT:
+        raise ValueError(f"Not a sparse artifact: {path}")
+    return decode_sparse_tensors(load_safetensors(path), json.loads(meta.get("encodings") or "{}"))
+
+
+def _sparse_linear_class():
+    import torch
+    import torch.nn as nn
+
+    class SparseLinear(nn.Module):
+        """权重以CSR存储的Linear，前向使用 torch.sparse.mm"""
+
+        def __init__(self, weight: Any, bias: Optional[Any] = None):
+            super().__init__()
+            self.in_features = weight.shape[1]
+            self.out_features = weight.shape[0]
+            self.register_buffer("weight", weight.to_sparse_csr())
+            self.register_buffer("bias", bias.detach().clone() if bias is not None else None)
+
+        def forward(self, x: Any) -> Any:
+            flat = x.reshape(-1, self.in_features)
+            out = torch.sparse.mm(self.weight, flat.t().to(self.weight.dtype)).t()
+            if self.bias is not None:
+                out = out + self.bias
+            return out.reshape(*x.shape[:-1], self.out_features).to(x.dtype)
+
+    return SparseLinear
+
+
+def _to_semi_structured(module: Any) -> bool:
+    """把2:4稀疏的Linear权重转换为 torch 半结构化稀疏张量（需CUDA + fp16/bf16，cuSPARSELt/CUTLASS kernel）"""
+    import torch
+    import torch.nn as nn
+
+    weight = module.weight
+    if not weight.is_cuda or weight.dtype not in (torch.float16, torch.bfloat16):
+        return False
+    try:
+        from torch.sparse import to_sparse_semi_structured
+        module.weight = nn.Parameter(to_sparse_semi_structured(weight.detach()), requires_grad=False)
+        return True
+    except Exception as e:
+        logger.debug(f"Semi-structured sparse kernel unavailable: {e}")
+        return False
+
+
+def load_sparse_model(path: str, model: Any, sparse_linear: bool = False) -> Any:
+    """把稀疏产物加载到给定结构的模型中
+
+    sparse_linear=True 时把已编码的 nn.Linear 替换为稀疏kernel实现：
+    2:4 编码的权重在模型位于CUDA且为fp16/bf16时（先 model.cuda().half() 再加载）转换为半结构化稀疏张量，
+    其余替换为 SparseLinear（CSR权重 + torch.sparse.mm），CPU上通常在70%以上稀疏率才有收益
+    """
+    import torch.nn as nn
+
+    state_dict = load_sparse_state_dict(path)
+    model.load_state_dict(state_dict)
+    if not sparse_linear:
+        return model
+
+    encodings = json.loads((read_safetensors_metadata(path) or {}).get("encodings") or "{}")
+    sparse_linear_cls = _sparse_linear_class()
+    for name, module in list(model.named_modules()):
+        info = encodings.get(f"{name}.weight")
+        if not isinstance(module, nn.Linear) or info is None:
+            continue
+        if info.get("layout") == "nm" and (info.get("n"), info.get("m")) == (2, 4) and _to_semi_structured(module):
+            continue
+        parent = model
+        parts = name.split(".")
+        for part in parts[:-1]:
+            parent = getattr(parent, part)
+        setattr(parent, parts[-1], sparse_linear_cls(module.weight.detach(), module.bias))
+    return model